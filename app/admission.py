@@ -0,0 +1,231 @@
+"""
+Контроль допуска запросов и сброс нагрузки.
+
+Под перегрузкой приложение не должно принимать работу, которую все равно
+не успеет сделать: лучше сразу ответить 503 с Retry-After, чтобы клиент
+повторил запрос позже (или балансировщик отправил его в другой под).
+
+- Число запросов в обработке ограничено отдельно для каждого класса
+  маршрутов: чтение, запись и тяжелые массовые операции (импорт, выгрузка,
+  пакетные запросы), чтобы выгрузка не вытесняла чтение по id.
+- Фоновая задача измеряет задержку event loop (насколько позже срока
+  просыпается asyncio.sleep). Если она выше max_lag, новые запросы
+  отклоняются: loop уже не успевает обслуживать принятые.
+- /readyz отвечает 503, пока задержка выше порога или исчерпан лимит
+  чтения или записи. Занятые массовые операции под не выводят: их
+  лимит защищает только новые массовые запросы (503 на них самих).
+
+Проверки здоровья, метрики и профилирование (PROBE_PATHS) не
+ограничиваются никогда.
+"""
+
+import asyncio
+import json
+import time
+from typing import Dict, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import Settings
+
+# Маршруты проб, метрик и профилирования: должны отвечать и под перегрузкой
+PROBE_PATHS = {
+    "/health",
+    "/healthz",
+    "/readyz",
+    "/metrics",
+    "/stats/admission",
+    "/debug/profile",
+}
+
+# Классы, исчерпанный лимит которых снимает под с балансировщика
+READINESS_CLASSES = ("read", "write")
+
+# Массовые операции: долгие и тяжелые по CPU и памяти
+BULK_ROUTES = {
+    ("POST", "/api/v1/users:batch"),
+    ("POST", "/api/v1/users/import"),
+    ("GET", "/api/v1/users/export"),
+}
+
+# Чтения методом POST (список id в теле, а не в строке запроса)
+READ_ROUTES = {("POST", "/api/v1/users:batchGet")}
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+ROUTE_CLASSES = ("read", "write", "bulk")
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """Класс маршрута запроса; None - запрос не ограничивается."""
+    if path in PROBE_PATHS:
+        return None
+    if (method, path) in BULK_ROUTES:
+        return "bulk"
+    if method in READ_METHODS or (method, path) in READ_ROUTES:
+        return "read"
+    return "write"
+
+
+class LoopLagMonitor:
+    """
+    Измерение задержки event loop фоновой задачей.
+
+    Каждые interval секунд задача засыпает и замеряет, насколько позже
+    срока проснулась. Рост задержки учитывается сразу, спад - плавно
+    (экспоненциальное сглаживание), чтобы сброс нагрузки и /readyz не
+    переключались на каждом замере. Пока loop заблокирован, задача
+    проснуться не может, поэтому lag учитывает и текущее опоздание.
+    """
+
+    def __init__(self, interval: float = 0.05, smoothing: float = 0.2):
+        self.interval = interval
+        self.smoothing = smoothing
+        self.last = 0.0
+        self._due: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def lag(self) -> float:
+        """Задержка event loop в секундах."""
+        if self._due is None:
+            return self.last
+        return max(self.last, time.monotonic() - self._due)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(max(0.0, self._due - time.monotonic()))
+            sample = max(0.0, time.monotonic() - self._due)
+            if sample < self.last:
+                sample = self.last + (sample - self.last) * self.smoothing
+            self.last = sample
+            self._due = time.monotonic() + self.interval
+
+    def start(self) -> None:
+        """Запуск замеров (в работающем event loop)."""
+        if self._task is None:
+            self._due = time.monotonic() + self.interval
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.last, self._due = 0.0, None
+
+
+class AdmissionController:
+    """
+    Лимиты запросов в обработке по классам маршрутов и порог задержки loop.
+
+    - **limits**: класс маршрута -> максимум запросов в обработке (0 - без лимита)
+    - **max_lag**: порог задержки event loop, секунды (0 - не проверять)
+    - **lag_interval**: период замера задержки, секунды
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, int],
+        max_lag: float = 0.5,
+        lag_interval: float = 0.05,
+    ):
+        self.limits = limits
+        self.max_lag = max_lag
+        self.monitor = LoopLagMonitor(lag_interval)
+        self.in_flight: Dict[str, int] = dict.fromkeys(ROUTE_CLASSES, 0)
+        self.rejected: Dict[str, int] = dict.fromkeys(ROUTE_CLASSES, 0)
+
+    def _lagging(self) -> bool:
+        return bool(self.max_lag) and self.monitor.lag > self.max_lag
+
+    def try_acquire(self, route_class: str) -> bool:
+        """Допуск запроса; счетчики меняются только из event loop."""
+        limit = self.limits.get(route_class, 0)
+        if (limit and self.in_flight[route_class] >= limit) or self._lagging():
+            self.rejected[route_class] += 1
+            return False
+        self.in_flight[route_class] += 1
+        return True
+
+    def release(self, route_class: str) -> None:
+        self.in_flight[route_class] -= 1
+
+    def overload_reason(self) -> Optional[str]:
+        """
+        Причина перегрузки для /readyz или None. Несколько долгих выгрузок
+        не должны выводить под из балансировки, поэтому лимит массовых
+        операций здесь не учитывается.
+        """
+        if self._lagging():
+            return f"event loop lag {self.monitor.lag * 1000:.0f} ms"
+        for route_class in READINESS_CLASSES:
+            limit = self.limits.get(route_class, 0)
+            if limit and self.in_flight[route_class] >= limit:
+                return f"{route_class} requests at limit ({limit})"
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "loop_lag_ms": round(self.monitor.lag * 1000, 1),
+            "in_flight": dict(self.in_flight),
+            "rejected": dict(self.rejected),
+        }
+
+
+def create_admission_controller(settings: Settings) -> AdmissionController:
+    """Создание контроллера допуска по настройкам."""
+    return AdmissionController(
+        limits={
+            "read": settings.admission_read_limit,
+            "write": settings.admission_write_limit,
+            "bulk": settings.admission_bulk_limit,
+        },
+        max_lag=settings.admission_max_lag,
+        lag_interval=settings.admission_lag_interval,
+    )
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware: 503 с Retry-After вместо обработки запроса, если
+    лимит класса маршрута исчерпан или event loop не успевает.
+    """
+
+    def __init__(
+        self, app: ASGIApp, controller: AdmissionController, retry_after: int = 1
+    ):
+        self.app = app
+        self.controller = controller
+        self.body = json.dumps(
+            {"detail": "Сервис перегружен, повторите запрос позже"},
+            ensure_ascii=False,
+        ).encode()
+        self.headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(self.body)).encode()),
+            (b"retry-after", str(retry_after).encode()),
+        ]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route_class = classify(scope["method"], scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not self.controller.try_acquire(route_class):
+            await send(
+                {"type": "http.response.start", "status": 503, "headers": self.headers}
+            )
+            await send({"type": "http.response.body", "body": self.body})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route_class)
@@ -0,0 +1,78 @@
+"""
+Ограниченный LRU кеш с необязательным TTL.
+Используется только из event loop, поэтому блокировки не нужны.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+# Признак отсутствия ключа (None - допустимое значение для негативного кеша)
+MISSING = object()
+
+
+class LRUCache:
+    """
+    LRU кеш на OrderedDict.
+
+    - **maxsize**: максимум записей, при превышении вытесняется самая старая
+    - **ttl**: время жизни записи в секундах (0 - без ограничения)
+    """
+
+    def __init__(self, maxsize: int, ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Any:
+        """Значение по ключу или MISSING (просроченные записи удаляются)."""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Сохранение значения с вытеснением самых старых записей."""
+        expires_at: Optional[float] = None
+        if self.ttl:
+            expires_at = time.monotonic() + self.ttl
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        """Удаление ключа, если он есть."""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Удаление всех записей (счетчики сохраняются)."""
+        self._data.clear()
+
+    def stats(self) -> dict:
+        """Счетчики для настройки размера и TTL."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
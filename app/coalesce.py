@@ -0,0 +1,62 @@
+"""
+Объединение одинаковых одновременных чтений (single flight).
+
+Когда сотни клиентов одновременно запрашивают одного пользователя или
+первую страницу списка, хранилище нужно спросить один раз: первый запрос
+запускает вычисление (чтение + сериализация), остальные ждут его и
+получают те же байты. Закешированного результата нет - после завершения
+вычисления следующий запрос снова идет в хранилище, поэтому устаревших
+данных не бывает дольше, чем длится одно чтение.
+
+Чтобы запрос, пришедший после записи, не получил результат чтения,
+начатого до нее, записи вызывают forget(): новые запросы больше не
+присоединяются к уже начатым вычислениям.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Вычисления по ключу, общие для одновременных запросов.
+
+    Вычисление выполняется отдельной задачей: отмена одного из ожидающих
+    (клиент отключился) не отменяет его для остальных.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Результат fn() - свой или уже выполняющегося вычисления с тем же key."""
+        task = self._flights.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.get_running_loop().create_task(fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda done: self._done(key, done))
+        else:
+            self.followers += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        # После forget() под ключом может быть уже новое вычисление
+        if self._flights.get(key) is task:
+            del self._flights[key]
+
+    def forget(self) -> None:
+        """Новые запросы не присоединяются к уже начатым вычислениям."""
+        self._flights.clear()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "followers": self.followers,
+        }
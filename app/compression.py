@@ -0,0 +1,223 @@
+"""
+Сжатие HTTP ответов с согласованием по Accept-Encoding.
+
+ASGI middleware сжимает ответы в brotli (если установлен пакет brotli)
+или gzip. Не сжимаются:
+
+- ответы меньше minimum_size байт и несжимаемые типы (картинки и т.п.);
+- ответы, у которых уже есть Content-Encoding (например, выгрузка
+  пользователей, которая сама сжимает поток);
+- маршруты с зависимостью skip_compression.
+
+Потоковые ответы сжимаются по мере поступления: каждый кусок
+досылается клиенту сразу (sync flush), без накопления всего тела.
+"""
+
+import zlib
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli - необязательная зависимость
+    brotli = None
+
+# Ключ scope, которым маршрут отключает сжатие своего ответа
+SKIP_COMPRESSION = "skip_compression"
+
+# Поддерживаемые кодировки в порядке предпочтения сервера
+ENCODINGS: Tuple[str, ...] = ("br", "gzip") if brotli else ("gzip",)
+
+GZIP_LEVELS = range(1, 10)
+BROTLI_QUALITIES = range(0, 12)
+
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/javascript",
+    "application/x-ndjson",
+    "application/xml",
+    "image/svg+xml",
+}
+
+# Статусы, тело которых не сжимаем (нет тела или частичный ответ)
+UNCOMPRESSED_STATUSES = {204, 206, 304}
+
+
+def skip_compression(request: Request) -> None:
+    """FastAPI зависимость: ответ маршрута отдается без сжатия."""
+    request.scope[SKIP_COMPRESSION] = True
+
+
+def is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return (
+        media_type.startswith("text/")
+        or media_type in COMPRESSIBLE_TYPES
+        or media_type.endswith(("+json", "+xml"))
+    )
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Кодировки из Accept-Encoding с их весами (q)."""
+    weights: Dict[str, float] = {}
+    for item in header.split(","):
+        name, *params = item.split(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name] = weight
+    return weights
+
+
+def negotiate(header: str, available: Tuple[str, ...]) -> Optional[str]:
+    """
+    Выбор кодировки: наибольший q, при равных - порядок available
+    (сервер предпочитает br). q=0 запрещает кодировку.
+    """
+    weights = parse_accept_encoding(header)
+    default = weights.get("*", 0.0)
+    best, best_weight = None, 0.0
+    for encoding in available:
+        weight = weights.get(encoding, default)
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class GzipEncoder:
+    def __init__(self, level: int):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        mode = zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+        return self.compressor.compress(data) + self.compressor.flush(mode)
+
+
+class BrotliEncoder:
+    def __init__(self, quality: int):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        data = self.compressor.process(data)
+        return data + (self.compressor.finish() if final else self.compressor.flush())
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware сжатия ответов.
+
+    - **minimum_size**: ответы меньше этого размера не сжимаются
+    - **gzip_level**: уровень gzip (1-9); на страницах списка уровень 6
+      сжимает лишь на доли процента лучше 1, а CPU тратит вдвое больше
+    - **brotli_quality**: качество brotli (0-11)
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1000,
+        gzip_level: int = 1,
+        brotli_quality: int = 4,
+    ):
+        if gzip_level not in GZIP_LEVELS:
+            raise ValueError(f"Уровень gzip вне диапазона 1-9: {gzip_level}")
+        if brotli_quality not in BROTLI_QUALITIES:
+            raise ValueError(f"Качество brotli вне диапазона 0-11: {brotli_quality}")
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _encoder(self, encoding: str):
+        if encoding == "br":
+            return BrotliEncoder(self.brotli_quality)
+        return GzipEncoder(self.gzip_level)
+
+    def _should_compress(self, scope: Scope, message: Message) -> bool:
+        headers = Headers(raw=message["headers"])
+        if message["status"] in UNCOMPRESSED_STATUSES or message["status"] < 200:
+            return False
+        if scope.get(SKIP_COMPRESSION) or "content-encoding" in headers:
+            return False
+        if not is_compressible(headers.get("content-type", "")):
+            return False
+        length = headers.get("content-length")
+        return length is None or int(length) >= self.minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), ENCODINGS)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        encoder = None
+        passthrough = False
+
+        def start_compressed(length: Optional[int]) -> Message:
+            headers = MutableHeaders(raw=list(start["headers"]))
+            headers["Content-Encoding"] = encoding
+            headers.add_vary_header("Accept-Encoding")
+            if length is None:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(length)
+            # Сжатое тело - другое представление, сильный ETag стал бы неверным
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+            return {**start, "headers": headers.raw}
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, encoder, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                if self._should_compress(scope, message):
+                    start = message  # Решение откладывается до первого куска тела
+                else:
+                    passthrough = True
+                    await send(message)
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                if not more_body:
+                    # Тело целиком: порог применяется к его размеру
+                    if len(body) < self.minimum_size:
+                        passthrough = True
+                        await send(start)
+                        await send(message)
+                        return
+                    data = self._encoder(encoding).compress(body, final=True)
+                    await send(start_compressed(len(data)))
+                    await send({**message, "body": data})
+                    return
+                encoder = self._encoder(encoding)
+                await send(start_compressed(None))
+
+            data = encoder.compress(body, final=not more_body)
+            await send(
+                {"type": "http.response.body", "body": data, "more_body": more_body}
+            )
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,161 @@
+"""
+Настройки приложения.
+Значения по умолчанию переопределяются переменными окружения
+с тем же именем в верхнем регистре (например, USER_STORE_BACKEND).
+"""
+
+import os
+from functools import lru_cache
+
+from pydantic import BaseModel, Field
+
+
+class Settings(BaseModel):
+    """Настройки приложения."""
+
+    user_store_backend: str = Field(
+        default="memory",
+        description="Хранилище пользователей: memory, compact, shared или sqlite",
+    )
+    sqlite_path: str = Field(default="users.db", description="Путь к файлу SQLite")
+    sqlite_pool_size: int = Field(
+        default=5, ge=1, description="Максимум соединений в пуле SQLite"
+    )
+    sqlite_timeout: float = Field(
+        default=30.0, gt=0, description="Ожидание блокировки/соединения, секунды"
+    )
+    shared_store_path: str = Field(
+        default="/dev/shm/teachme_users",
+        description="Файл общего для воркеров хранилища (USER_STORE_BACKEND=shared)",
+    )
+    shared_store_size_mb: int = Field(
+        default=256, ge=1, description="Размер файла общего хранилища, МБ"
+    )
+    wal_dir: str = Field(
+        default="",
+        description="Каталог журнала и снимков для memory/compact (пусто - без WAL)",
+    )
+    wal_fsync: str = Field(
+        default="interval",
+        description="Политика fsync журнала: always, interval или never",
+    )
+    wal_flush_interval: float = Field(
+        default=1.0, gt=0, description="Период сброса журнала (interval/never), секунды"
+    )
+    wal_snapshot_every: int = Field(
+        default=100_000, ge=1, description="Изменений в журнале между снимками"
+    )
+    user_cache_size: int = Field(
+        default=10000, ge=0, description="Записей в кеше чтения (0 - кеш выключен)"
+    )
+    user_cache_ttl: float = Field(
+        default=60.0, ge=0, description="Время жизни записи кеша, секунды (0 - без TTL)"
+    )
+    compression_min_size: int = Field(
+        default=1000, ge=0, description="Ответы меньше этого размера не сжимаются"
+    )
+    compression_gzip_level: int = Field(
+        default=1, ge=1, le=9, description="Уровень сжатия gzip (1 - как у nginx)"
+    )
+    compression_brotli_quality: int = Field(
+        default=4, ge=0, le=11, description="Качество сжатия brotli"
+    )
+    static_in_memory: bool = Field(
+        default=True,
+        description="UI из памяти с готовыми gzip/ETag (False - StaticFiles с диска)",
+    )
+    admission_read_limit: int = Field(
+        default=512,
+        ge=0,
+        description="Максимум запросов чтения в обработке (0 - без лимита)",
+    )
+    admission_write_limit: int = Field(
+        default=128,
+        ge=0,
+        description="Максимум запросов записи в обработке (0 - без лимита)",
+    )
+    admission_bulk_limit: int = Field(
+        default=4,
+        ge=0,
+        description="Максимум импортов, выгрузок и пакетных запросов (0 - без лимита)",
+    )
+    admission_max_lag: float = Field(
+        default=0.5,
+        ge=0,
+        description="Порог задержки event loop, секунды (0 - не проверять)",
+    )
+    admission_lag_interval: float = Field(
+        default=0.05, gt=0, description="Период замера задержки event loop, секунды"
+    )
+    admission_retry_after: int = Field(
+        default=1, ge=0, description="Retry-After в ответе 503 при перегрузке, секунды"
+    )
+    rate_limit_backend: str = Field(
+        default="off",
+        description="Хранилище лимитов частоты: memory, redis или off (выключено)",
+    )
+    rate_limit_redis_url: str = Field(
+        default="redis://localhost:6379/0",
+        description="Redis для RATE_LIMIT_BACKEND=redis",
+    )
+    rate_limit_read: float = Field(
+        default=100.0,
+        ge=0,
+        description="Запросов чтения в секунду на клиента и маршрут",
+    )
+    rate_limit_write: float = Field(
+        default=20.0, ge=0, description="Запросов записи в секунду на клиента и маршрут"
+    )
+    rate_limit_bulk: float = Field(
+        default=1.0,
+        ge=0,
+        description="Массовых операций в секунду на клиента и маршрут",
+    )
+    rate_limit_burst: float = Field(
+        default=10.0, gt=0, description="Емкость корзины в секундах лимита (всплеск)"
+    )
+    rate_limit_max_buckets: int = Field(
+        default=1_000_000, ge=1, description="Максимум корзин в памяти процесса"
+    )
+    rate_limit_api_key_header: str = Field(
+        default="X-API-Key", description="Заголовок API ключа для определения клиента"
+    )
+    rate_limit_api_keys: str = Field(
+        default="",
+        description="Известные API ключи через запятую: только у них своя корзина",
+    )
+    debug_profile_token: str = Field(
+        default="",
+        description="Токен X-Debug-Token для /debug/profile (пусто - выключен)",
+    )
+    debug_profile_max_seconds: float = Field(
+        default=60.0, gt=0, description="Максимальная длительность профиля, секунды"
+    )
+    debug_profile_interval: float = Field(
+        default=0.01, gt=0, description="Период снимков стека профилировщика, секунды"
+    )
+    password_hash_rounds: int = Field(
+        default=12, ge=4, le=31, description="Сложность bcrypt (log2 итераций)"
+    )
+    password_hash_workers: int = Field(
+        default=0, ge=0, description="Процессов для хеширования (0 - число CPU)"
+    )
+    password_hash_max_pending: int = Field(
+        default=1024, ge=1, description="Максимум паролей в очереди хеширования"
+    )
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """Создание настроек из переменных окружения."""
+        values = {
+            name: os.environ[name.upper()]
+            for name in cls.model_fields
+            if name.upper() in os.environ
+        }
+        return cls(**values)
+
+
+@lru_cache
+def get_settings() -> Settings:
+    """Получение настроек приложения (читаются из окружения один раз)."""
+    return Settings.from_env()
@@ -0,0 +1,41 @@
+"""
+ETag и условные GET запросы для ресурсов пользователей.
+
+ETag пользователя строится из id и версии записи, ETag списка - из
+поколения хранилища. id, версии и поколение начинаются заново в новом
+процессе и после clear(), поэтому в оба ETag входит идентификатор набора
+данных (UserStore.store_id): иначе после перезапуска или от другого
+воркера клиент получил бы ложный 304. Если клиент прислал совпадающий
+If-None-Match, отвечаем 304 без сериализации тела.
+"""
+
+from typing import Optional
+
+from fastapi import Request, Response, status
+
+
+def user_etag(store_id: str, user: dict) -> str:
+    """ETag пользователя: меняется при каждом обновлении записи."""
+    return f'"{store_id}-u{user["id"]}-v{user["version"]}"'
+
+
+def generation_etag(store_id: str, generation: int) -> str:
+    """ETag списка: меняется при любом изменении хранилища."""
+    return f'"{store_id}-g{generation}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Проверка If-None-Match (слабое сравнение, как требует RFC 9110)."""
+    header: Optional[str] = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Response:
+    """Ответ 304 Not Modified."""
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
@@ -0,0 +1,62 @@
+"""
+Потоковая выгрузка пользователей в NDJSON и CSV.
+Генераторы читают хранилище страницами и сразу отдают байты,
+поэтому расход памяти не зависит от размера таблицы.
+"""
+
+import csv
+import io
+import zlib
+from typing import AsyncIterator, Iterable, Optional
+
+from app.models import UserResponse
+from app.serialization import dump_user
+from app.storage import UserStore
+
+# Публичные поля пользователя (без hashed_password) в порядке колонок CSV
+EXPORT_FIELDS = list(UserResponse.model_fields)
+
+# Количество пользователей, читаемых из хранилища за один раз
+EXPORT_CHUNK_SIZE = 1000
+
+
+def export_row(user: dict) -> dict:
+    """Публичные поля пользователя в виде, готовом для JSON/CSV."""
+    row = {field: user[field] for field in EXPORT_FIELDS}
+    row["created_at"] = row["created_at"].isoformat()
+    return row
+
+
+async def ndjson_chunks(
+    store: UserStore, chunk_size: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """NDJSON: по одному JSON объекту на строку."""
+    async for page in store.iter_pages(chunk_size or EXPORT_CHUNK_SIZE):
+        yield b"".join(dump_user(user) + b"\n" for user in page)
+
+
+def _csv_bytes(rows: Iterable[list]) -> bytes:
+    """Форматирование строк CSV в байты."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+
+async def csv_chunks(
+    store: UserStore, chunk_size: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """CSV с заголовком из EXPORT_FIELDS."""
+    yield _csv_bytes([EXPORT_FIELDS])
+    async for page in store.iter_pages(chunk_size or EXPORT_CHUNK_SIZE):
+        rows = (export_row(user).values() for user in page)
+        yield _csv_bytes(rows)
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Сжатие потока в gzip на лету."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
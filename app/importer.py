@@ -0,0 +1,271 @@
+"""
+Потоковый разбор NDJSON и CSV для импорта пользователей.
+Тело запроса (и файл внутри multipart/form-data) читается кусками и
+разбирается построчно, поэтому файл целиком в памяти не держится.
+"""
+
+import csv
+import json
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import multipart
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import parse_options_header
+from pydantic import ValidationError
+
+from app.models import UserCreate
+
+# Количество строк, которые валидируются и сохраняются за один раз
+IMPORT_CHUNK_SIZE = 500
+
+# Строка файла: (номер строки, данные или None, текст ошибки разбора или None)
+ParsedRow = Tuple[int, Optional[dict], Optional[str]]
+
+# Строка файла после декодирования: (текст, None) или (None, текст ошибки)
+Line = Tuple[Optional[str], Optional[str]]
+
+# Предел длины строки (и записи CSV): без него файл без переводов строк
+# целиком оказался бы в памяти
+MAX_LINE_BYTES = 2**20
+
+ENCODING_ERROR = "Некорректная кодировка UTF-8"
+LINE_TOO_LONG = f"Строка длиннее {MAX_LINE_BYTES // 1024} КиБ"
+RECORD_TOO_LONG = f"Запись CSV длиннее {MAX_LINE_BYTES // 1024} КиБ"
+
+
+def is_csv(content_type: str, filename: str = "") -> bool:
+    """Определение формата по Content-Type или имени файла (иначе NDJSON)."""
+    return "csv" in content_type or filename.lower().endswith(".csv")
+
+
+class MultipartUpload:
+    """
+    Файл из поля multipart/form-data, читаемый по мере поступления тела.
+
+    В отличие от request.form(), файл не сохраняется целиком во временный
+    файл: потоковый парсер python-multipart отдает содержимое кусками.
+    Остальные поля формы пропускаются.
+
+    - **content_type**: заголовок Content-Type запроса (с boundary)
+    - **chunks**: тело запроса
+    - **field**: имя поля с файлом
+    """
+
+    def __init__(
+        self, content_type: str, chunks: AsyncIterator[bytes], field: str = "file"
+    ):
+        _, params = parse_options_header(content_type)
+        self.boundary: Optional[bytes] = params.get(b"boundary")
+        self.chunks = chunks.__aiter__()
+        self.field = field.encode()
+        self.filename = ""
+        self.content_type = ""
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_name = b""
+        self._header_value = b""
+        self._current = False  # Разбирается поле с файлом
+        self._found = False
+        self._finished = False
+        self._data: List[bytes] = []
+        self.parser = multipart.MultipartParser(
+            self.boundary or b"-",
+            {
+                "on_part_begin": self._on_part_begin,
+                "on_header_field": self._on_header_field,
+                "on_header_value": self._on_header_value,
+                "on_header_end": self._on_header_end,
+                "on_headers_finished": self._on_headers_finished,
+                "on_part_data": self._on_part_data,
+                "on_part_end": self._on_part_end,
+            },
+        )
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name, self._header_value = b"", b""
+
+    def _on_headers_finished(self) -> None:
+        if self._found:
+            return
+        _, options = parse_options_header(
+            self._headers.get(b"content-disposition", b"")
+        )
+        if options.get(b"name") == self.field and b"filename" in options:
+            self._current = self._found = True
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+            self.content_type = self._headers.get(b"content-type", b"").decode(
+                "latin-1"
+            )
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._current:
+            self._data.append(data[start:end])
+
+    def _on_part_end(self) -> None:
+        if self._current:
+            self._current, self._finished = False, True
+
+    async def _feed(self) -> bool:
+        """Передача парсеру следующего куска тела; False - тело кончилось."""
+        chunk = await anext(self.chunks, None)
+        if chunk is None:
+            return False
+        self.parser.write(chunk)
+        return True
+
+    async def open(self) -> bool:
+        """
+        Разбор тела до заголовков поля с файлом; False, если его нет.
+        Ошибки формата - MultipartParseError.
+        """
+        if self.boundary is None:
+            raise MultipartParseError("Missing boundary in multipart.")
+        while not self._found:
+            if not await self._feed():
+                return False
+        return True
+
+    async def read(self) -> AsyncIterator[bytes]:
+        """Содержимое файла кусками по мере разбора тела."""
+        while True:
+            if self._data:
+                data, self._data = b"".join(self._data), []
+                yield data
+            if self._finished or not await self._feed():
+                return
+
+
+async def iter_lines(
+    chunks: AsyncIterator[bytes], max_line: int = MAX_LINE_BYTES
+) -> AsyncIterator[Line]:
+    """
+    Разбиение потока байтов на строки (перевод строки в UTF-8 однобайтовый).
+
+    Делится только новый кусок, части незаконченной строки копятся в
+    списке. На каждую строку файла - ровно один элемент: строка, которая
+    не декодируется как UTF-8 или длиннее max_line байт, отдается ошибкой
+    (остаток слишком длинной строки пропускается до перевода строки).
+    """
+    parts: List[bytes] = []
+    size, skipping = 0, False
+    async for chunk in chunks:
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            piece = chunk[start:] if end < 0 else chunk[start:end]
+            if not skipping:
+                size += len(piece)
+                if size > max_line:
+                    parts, skipping = [], True
+                    yield None, LINE_TOO_LONG
+                elif end >= 0:
+                    parts.append(piece)
+                    yield _decode_line(b"".join(parts))
+                    parts = []
+                elif piece:
+                    parts.append(piece)
+            if end < 0:
+                break
+            size, skipping = 0, False
+            start = end + 1
+    if parts:
+        yield _decode_line(b"".join(parts))
+
+
+def _decode_line(line: bytes) -> Line:
+    try:
+        return line.decode("utf-8-sig").rstrip("\r"), None
+    except UnicodeDecodeError:
+        return None, ENCODING_ERROR
+
+
+async def ndjson_rows(lines: AsyncIterator[Line]) -> AsyncIterator[ParsedRow]:
+    """Разбор NDJSON: один JSON объект на строку, пустые строки пропускаются."""
+    line_number = 0
+    async for line, error in lines:
+        line_number += 1
+        if line is None:
+            yield line_number, None, error
+            continue
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, None, "Некорректный JSON"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, "Ожидается JSON объект"
+            continue
+        yield line_number, row, None
+
+
+async def csv_rows(
+    lines: AsyncIterator[Line], max_record: int = MAX_LINE_BYTES
+) -> AsyncIterator[ParsedRow]:
+    """
+    Разбор CSV с заголовком.
+
+    Поле в кавычках может содержать перевод строки, поэтому строки файла
+    накапливаются, пока число кавычек не станет четным (четность
+    считается по каждой новой строке). Запись длиннее max_record символов
+    или с ошибочной строкой отбрасывается с ошибкой, и разбор продолжается
+    со следующей строки - незакрытая кавычка не тянет в память весь файл.
+    Пустые значения считаются отсутствующими.
+    """
+    header: Optional[List[str]] = None
+    record: List[str] = []
+    record_start, size, odd_quotes, line_number = 0, 0, False, 0
+    async for line, error in lines:
+        line_number += 1
+        if not record:
+            record_start, size, odd_quotes = line_number, 0, False
+        if line is None:
+            yield record_start, None, error
+            record = []
+            continue
+        record.append(line)
+        size += len(line) + 1
+        odd_quotes ^= bool(line.count('"') % 2)
+        if size > max_record:
+            yield record_start, None, RECORD_TOO_LONG
+            record = []
+            continue
+        if odd_quotes:
+            continue
+
+        values = next(csv.reader(["\n".join(record)]), [])
+        record = []
+        if not values:
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield record_start, None, "Число колонок не совпадает с заголовком"
+            continue
+        yield record_start, {k: v for k, v in zip(header, values) if v != ""}, None
+
+    if record:
+        yield record_start, None, "Незакрытая кавычка в CSV"
+
+
+def validate_row(row: dict) -> Tuple[Optional[UserCreate], Optional[List[str]]]:
+    """Валидация строки как UserCreate: модель или список ошибок."""
+    try:
+        return UserCreate.model_validate(row), None
+    except ValidationError as exc:
+        errors = [
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+            for error in exc.errors()
+        ]
+        return None, errors
@@ -0,0 +1,220 @@
+"""
+Метрики HTTP запросов в формате Prometheus.
+
+ASGI middleware считает запросы, запросы в обработке, время ответа и
+размер тела по шаблону маршрута (/api/v1/users/{user_id}, а не сырой путь).
+Все изменения делаются из event loop, поэтому блокировки не нужны;
+каждый воркер uvicorn отдает свои собственные значения.
+"""
+
+import sys
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Границы корзин гистограмм (как у prometheus_client, плюс быстрые запросы)
+DURATION_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# Метка для путей без маршрута (404): сырые пути раздули бы число рядов
+UNMATCHED_ROUTE = "unmatched"
+
+# Ключ scope с шаблоном маршрута: внутренние middleware (лимит частоты)
+# берут его отсюда, а не сопоставляют путь с маршрутами повторно
+ROUTE_TEMPLATE = "route_template"
+
+# Starlette сам добавит "; charset=utf-8"
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (счетчики не накопительные)."""
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class RouteMetrics:
+    """Метрики одного маршрута и метода."""
+
+    __slots__ = ("in_progress", "statuses", "duration", "size")
+
+    def __init__(self):
+        self.in_progress = 0
+        self.statuses: Dict[int, int] = {}
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+
+
+class MetricsRegistry:
+    """Хранилище метрик HTTP запросов по (метод, шаблон маршрута)."""
+
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        # Трассировка медленных запросов профилировщиком (app/profiling.py):
+        # получает кадр, метод, шаблон и длительность каждого запроса
+        self.tracer = None
+
+    def route(self, method: str, template: str) -> RouteMetrics:
+        key = (method, template)
+        metrics = self.routes.get(key)
+        if metrics is None:
+            metrics = self.routes[key] = RouteMetrics()
+        return metrics
+
+    def clear(self) -> None:
+        self.routes.clear()
+
+    def render(self) -> str:
+        """Текстовый формат экспозиции Prometheus."""
+        items = sorted(self.routes.items())
+        lines = [
+            "# HELP http_requests_total Total HTTP requests.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route), metrics in items:
+            for status, count in sorted(metrics.statuses.items()):
+                labels = _labels(method=method, route=route, status=str(status))
+                lines.append(f"http_requests_total{{{labels}}} {count}")
+
+        lines += [
+            "# HELP http_requests_in_progress HTTP requests being processed.",
+            "# TYPE http_requests_in_progress gauge",
+        ]
+        for (method, route), metrics in items:
+            labels = _labels(method=method, route=route)
+            lines.append(f"http_requests_in_progress{{{labels}}} {metrics.in_progress}")
+
+        histograms = (
+            ("http_request_duration_seconds", "HTTP request latency.", "duration"),
+            ("http_response_size_bytes", "HTTP response body size.", "size"),
+        )
+        for name, help_text, attr in histograms:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for (method, route), metrics in items:
+                lines += _render_histogram(
+                    name, _labels(method=method, route=route), getattr(metrics, attr)
+                )
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels: str) -> str:
+    return ",".join(
+        '{}="{}"'.format(
+            name,
+            value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels.items()
+    )
+
+
+def _render_histogram(name: str, labels: str, histogram: Histogram) -> List[str]:
+    lines = []
+    cumulative = 0
+    bounds = [repr(float(bound)) for bound in histogram.bounds] + ["+Inf"]
+    for bound, count in zip(bounds, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+    lines.append(f"{name}_count{{{labels}}} {cumulative}")
+    return lines
+
+
+class RouteMatcher:
+    """
+    Определение шаблона маршрута по пути и методу.
+
+    Сравниваются только скомпилированные регулярные выражения путей в
+    порядке маршрутов роутера: route.matches() Starlette заметно дороже,
+    т.к. еще конвертирует параметры и собирает дочерний scope.
+    """
+
+    def __init__(self, routes: list):
+        self.routes = [
+            (route.path_regex.match, getattr(route, "methods", None), route.path)
+            for route in routes
+            if hasattr(route, "path_regex")
+        ]
+
+    def template(self, method: str, path: str) -> str:
+        partial: Optional[str] = None
+        for match, methods, template in self.routes:
+            if match(path):
+                if methods is None or method in methods:
+                    return template
+                # Путь совпал, а метод нет (405)
+                partial = partial or template
+        return partial or UNMATCHED_ROUTE
+
+
+registry = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """ASGI middleware, собирающее метрики HTTP запросов."""
+
+    def __init__(self, app: ASGIApp, registry: MetricsRegistry = registry):
+        self.app = app
+        self.registry = registry
+        self.matcher: Optional[RouteMatcher] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if self.matcher is None:
+            # Маршруты известны только после сборки приложения
+            self.matcher = RouteMatcher(scope["app"].router.routes)
+        method = scope["method"]
+        template = scope[ROUTE_TEMPLATE] = self.matcher.template(method, scope["path"])
+        metrics = self.registry.route(method, template)
+        status_code = 500
+        size = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        tracer = self.registry.tracer
+        request = id(sys._getframe()) if tracer is not None else 0
+        metrics.in_progress += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            if tracer is not None:
+                tracer.finish(request, method, template, duration)
+            metrics.duration.observe(duration)
+            metrics.size.observe(size)
+            metrics.statuses[status_code] = metrics.statuses.get(status_code, 0) + 1
+            metrics.in_progress -= 1
@@ -4,10 +4,16 @@
 """
 
 from datetime import datetime
-from typing import Optional
+from typing import Annotated, List, Literal, Optional, Union
 
 from pydantic import BaseModel, EmailStr, Field
 
+# Максимальное количество операций в одном пакетном запросе
+MAX_BATCH_OPERATIONS = 1000
+
+# Максимальное количество id в одном запросе users:batchGet
+MAX_BATCH_GET_IDS = 1000
+
 
 class UserBase(BaseModel):
     """Базовая модель пользователя."""
@@ -51,6 +57,93 @@ class UserInDB(UserResponse):
     hashed_password: str
 
 
+class UserBatchCreate(BaseModel):
+    """Операция создания пользователя в пакете."""
+
+    op: Literal["create"]
+    user: UserCreate
+
+
+class UserBatchUpdate(BaseModel):
+    """Операция обновления пользователя в пакете."""
+
+    op: Literal["update"]
+    id: int = Field(..., description="ID пользователя")
+    user: UserUpdate
+
+
+class UserBatchDelete(BaseModel):
+    """Операция удаления пользователя в пакете."""
+
+    op: Literal["delete"]
+    id: int = Field(..., description="ID пользователя")
+
+
+UserBatchOperation = Annotated[
+    Union[UserBatchCreate, UserBatchUpdate, UserBatchDelete],
+    Field(discriminator="op"),
+]
+
+
+class UserBatchRequest(BaseModel):
+    """Пакет операций над пользователями, применяемый атомарно."""
+
+    operations: List[UserBatchOperation] = Field(
+        ..., min_length=1, max_length=MAX_BATCH_OPERATIONS
+    )
+
+
+class UserBatchResult(BaseModel):
+    """Результат одной операции пакета."""
+
+    index: int = Field(..., description="Номер операции в пакете")
+    op: str = Field(..., description="Тип операции")
+    status: int = Field(..., description="HTTP статус операции")
+    user: Optional[UserResponse] = None
+    detail: Optional[str] = None
+
+
+class UserBatchResponse(BaseModel):
+    """Результат пакетного запроса."""
+
+    applied: bool = Field(..., description="Применен ли пакет целиком")
+    results: List[UserBatchResult]
+
+
+class UserBatchGetRequest(BaseModel):
+    """Id пользователей для чтения одним запросом."""
+
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_GET_IDS)
+
+
+class UserBatchGetResponse(BaseModel):
+    """Найденные пользователи и id, которых нет."""
+
+    users: List[UserResponse]
+    missing: List[int] = Field(..., description="Id отсутствующих пользователей")
+
+
+class UserImportRowError(BaseModel):
+    """Ошибка одной строки импорта."""
+
+    row: int = Field(..., description="Номер строки файла (с 1)")
+    errors: List[str]
+
+
+class UserImportSummary(BaseModel):
+    """Прогресс и итог импорта пользователей."""
+
+    import_id: str = Field(..., description="Идентификатор импорта")
+    status: Literal["running", "completed", "failed"] = "running"
+    processed: int = Field(default=0, description="Обработано строк")
+    created: int = Field(default=0, description="Создано пользователей")
+    failed: int = Field(default=0, description="Отклонено строк")
+    errors: List[UserImportRowError] = Field(default_factory=list)
+    errors_truncated: bool = Field(
+        default=False, description="Список ошибок обрезан до лимита"
+    )
+
+
 class MessageResponse(BaseModel):
     """Стандартная модель ответа с сообщением."""
 
@@ -0,0 +1,206 @@
+"""
+Статистическое профилирование работающего воркера по запросу.
+
+Таймер setitimer(ITIMER_PROF) раз в interval секунд процессорного
+времени присылает SIGPROF; обработчик выполняется в главном потоке (в нем
+работает event loop uvicorn) и получает прерванный кадр, так что снимок
+показывает код, который действительно занимал процессор, а не точку, где
+loop отпустил GIL. Одинаковые стеки считаются; результат - свернутые
+стеки (collapsed stacks: "корень;...;функция число"), которые читают
+flamegraph.pl, speedscope и inferno. Снимок стека стоит десятки
+микросекунд, поэтому при 100 снимках в секунду процессорного времени
+loop теряет меньше 1%, а без активного профиля профилировщик не стоит
+ничего.
+
+Режим трассировки медленных запросов: снимки, сделанные внутри запроса,
+копятся отдельно (запрос узнается по кадру MetricsMiddleware.__call__ в
+стеке), и если запрос выполнялся дольше порога, его стеки получают корень
+"slow GET /api/v1/users/{user_id}" - на flamegraph медленные запросы
+видны отдельно по маршрутам.
+
+Профилируется только воркер, получивший запрос /debug/profile.
+"""
+
+import asyncio
+import hmac
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from app.config import Settings
+from app.metrics import MetricsMiddleware, MetricsRegistry, registry
+
+# Кадр запроса для трассировки: MetricsMiddleware - внешнее middleware
+REQUEST_CODE = MetricsMiddleware.__call__.__code__
+
+
+class ProfilerUnavailableError(Exception):
+    """Профиль сейчас снять нельзя (уже снимается или нет SIGPROF)."""
+
+
+class StackSampler:
+    """Сбор стеков главного потока по сигналу SIGPROF."""
+
+    def __init__(self, interval: float = 0.01, slow_threshold: Optional[float] = None):
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        # Стек: объекты кода от внутреннего кадра к корню (и метка запроса)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+        self.slow_requests = 0
+        # Снимки еще не завершившихся запросов по id кадра запроса
+        self._pending: Dict[int, Counter] = {}
+        self._request_code = REQUEST_CODE if slow_threshold is not None else None
+        self._previous_handler = None
+
+    def start(self) -> None:
+        if not hasattr(signal, "setitimer"):
+            raise ProfilerUnavailableError("SIGPROF недоступен на этой платформе")
+        if threading.current_thread() is not threading.main_thread():
+            raise ProfilerUnavailableError("Event loop работает не в главном потоке")
+        self._previous_handler = signal.signal(signal.SIGPROF, self._handle)
+        # Системные вызовы, прерванные сигналом, перезапускаются
+        signal.siginterrupt(signal.SIGPROF, False)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self) -> None:
+        """Остановка; снимки незавершенных запросов идут в общие стеки."""
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+        for samples in self._pending.values():
+            self.stacks.update(samples)
+        self._pending.clear()
+
+    def _handle(self, signum, frame) -> None:
+        self.sample(frame)
+
+    def sample(self, frame) -> None:
+        """Учет стека, заканчивающегося кадром frame."""
+        request_code = self._request_code
+        request = None
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            if code is request_code:
+                request = id(frame)
+            stack.append(code)
+            frame = frame.f_back
+        self.samples += 1
+        if request is None:
+            self.stacks[tuple(stack)] += 1
+        else:
+            samples = self._pending.get(request)
+            if samples is None:
+                samples = self._pending[request] = Counter()
+            samples[tuple(stack)] += 1
+
+    def finish(self, request: int, method: str, template: str, duration: float):
+        """Запрос с кадром request завершился (вызывает MetricsMiddleware)."""
+        samples = self._pending.pop(request, None)
+        if duration < self.slow_threshold:
+            if samples:
+                self.stacks.update(samples)
+            return
+        self.slow_requests += 1
+        if samples:
+            root = f"slow {method} {template}"
+            for stack, count in samples.items():
+                self.stacks[stack + (root,)] += count
+
+    def collapsed(self) -> str:
+        """Свернутые стеки, самые частые первыми."""
+        labels: Dict[object, str] = {}
+        lines = []
+        for stack, count in self.stacks.most_common():
+            frames = []
+            for code in reversed(stack):
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _label(code)
+                frames.append(label)
+            lines.append(f"{';'.join(frames)} {count}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+def _label(code) -> str:
+    """Метка кадра: "Class.method (app/metrics.py:220)"."""
+    if isinstance(code, str):
+        return code.replace(";", ",")
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _short_path(filename: str) -> str:
+    """Путь относительно самого длинного подходящего каталога sys.path."""
+    best = ""
+    for path in sys.path:
+        path = os.path.join(os.path.abspath(path or "."), "")
+        if filename.startswith(path) and len(path) > len(best):
+            best = path
+    return filename[len(best) :]
+
+
+class DebugProfiler:
+    """
+    Профилирование воркера через /debug/profile: доступ по токену и не
+    больше одного профиля одновременно.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        max_seconds: float = 60.0,
+        interval: float = 0.01,
+        metrics_registry: MetricsRegistry = registry,
+    ):
+        self.token = token
+        self.max_seconds = max_seconds
+        self.interval = interval
+        self.registry = metrics_registry
+        self.running = False
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return token is not None and hmac.compare_digest(
+            token.encode(), self.token.encode()
+        )
+
+    async def profile(
+        self,
+        seconds: float,
+        interval: Optional[float] = None,
+        slow_threshold: Optional[float] = None,
+    ) -> StackSampler:
+        """Профиль главного потока (event loop) за seconds секунд."""
+        if self.running:
+            raise ProfilerUnavailableError("Профиль уже снимается")
+        sampler = StackSampler(interval or self.interval, slow_threshold)
+        sampler.start()
+        self.running = True
+        if slow_threshold is not None:
+            self.registry.tracer = sampler
+        started = time.perf_counter()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            if self.registry.tracer is sampler:
+                self.registry.tracer = None
+            sampler.stop()
+            sampler.elapsed = time.perf_counter() - started
+            self.running = False
+        return sampler
+
+
+def create_debug_profiler(settings: Settings) -> Optional[DebugProfiler]:
+    """Профилировщик по настройкам; None - DEBUG_PROFILE_TOKEN не задан."""
+    if not settings.debug_profile_token:
+        return None
+    return DebugProfiler(
+        settings.debug_profile_token,
+        max_seconds=settings.debug_profile_max_seconds,
+        interval=settings.debug_profile_interval,
+    )
@@ -0,0 +1,313 @@
+"""
+Ограничение частоты запросов (token bucket) по клиенту и маршруту.
+
+У каждой пары (клиент, маршрут) своя корзина токенов: она пополняется со
+скоростью rate токенов в секунду до capacity, каждый запрос забирает один
+токен. Пустая корзина - ответ 429 с Retry-After. Клиент - API ключ, если
+он передан и входит в список известных (RATE_LIMIT_API_KEYS), иначе IP
+адрес: произвольные значения заголовка не дают новых корзин, иначе
+клиент обходил бы лимит, меняя ключ на каждом запросе. За прокси uvicorn
+берет IP из X-Forwarded-For только от адресов FORWARDED_ALLOW_IPS.
+Маршрут - шаблон пути (/api/v1/users/{user_id}), скорость задается по
+классу маршрута.
+
+Каждый ответ получает заголовки RateLimit-Limit, RateLimit-Remaining,
+RateLimit-Reset и RateLimit-Policy (draft-ietf-httpapi-ratelimit-headers).
+
+Корзины хранятся в памяти процесса (InMemoryRateLimitBackend) или в
+Redis (RedisRateLimitBackend, общий лимит для всех воркеров и подов).
+"""
+
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.admission import classify
+from app.config import Settings
+from app.metrics import ROUTE_TEMPLATE, RouteMatcher
+
+try:
+    from redis import asyncio as aioredis
+except ImportError:  # redis - необязательная зависимость
+    aioredis = None
+
+# Корзин, проверяемых на истечение при создании новой
+EXPIRE_STEP = 2
+
+TOO_MANY_REQUESTS = json.dumps(
+    {"detail": "Слишком много запросов, повторите позже"}, ensure_ascii=False
+).encode()
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    remaining: int
+    reset: float  # секунд до полного восстановления корзины
+    retry_after: float  # секунд до следующего токена (если не allowed)
+
+
+def _result(allowed: bool, tokens: float, rate: float, capacity: int):
+    return RateLimitResult(
+        allowed,
+        int(tokens),
+        (capacity - tokens) / rate,
+        0.0 if allowed else (1 - tokens) / rate,
+    )
+
+
+def _seconds(value: float) -> bytes:
+    """Секунды для заголовка: целое, округленное вверх."""
+    return b"%d" % -(-value // 1)
+
+
+class RateLimitBackend(ABC):
+    """Хранилище корзин токенов."""
+
+    @abstractmethod
+    async def take(self, key: Hashable, rate: float, capacity: int) -> RateLimitResult:
+        """Забрать токен из корзины key (rate токенов/с, не больше capacity)."""
+
+    def stats(self) -> dict:
+        return {}
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """
+    Корзины в памяти процесса: шарды OrderedDict в порядке последнего
+    обращения.
+
+    Корзина, которая к текущему моменту пополнилась бы до capacity, ничем
+    не отличается от новой, поэтому ее можно удалить. Такие корзины
+    удаляются лениво: при создании новой проверяются самые давние в шарде.
+    Сверх max_entries вытесняются самые давние корзины независимо от
+    остатка. Память растет с числом активных клиентов, а не всех.
+
+    Шарды нужны для миллионов клиентов: расширение одного огромного
+    словаря блокирует event loop на время перехеширования всех ключей,
+    а расширение шарда в shards раз короче.
+    """
+
+    def __init__(self, max_entries: int = 1_000_000, shards: int = 64):
+        if shards & (shards - 1):
+            raise ValueError(f"Число шардов должно быть степенью двойки: {shards}")
+        self.mask = shards - 1
+        self.shard_size = max(1, max_entries // shards)
+        # ключ -> (токены, время обновления, время полного восстановления)
+        self.shards: List["OrderedDict[Hashable, Tuple[float, float, float]]"] = [
+            OrderedDict() for _ in range(shards)
+        ]
+        self.expired = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+    def _make_room(self, shard: OrderedDict, now: float) -> None:
+        for _ in range(EXPIRE_STEP):
+            if not shard:
+                return
+            oldest = next(iter(shard))
+            if shard[oldest][2] > now:
+                break
+            del shard[oldest]
+            self.expired += 1
+        while len(shard) >= self.shard_size:
+            shard.popitem(last=False)
+            self.evictions += 1
+
+    async def take(self, key: Hashable, rate: float, capacity: int) -> RateLimitResult:
+        now = time.monotonic()
+        shard = self.shards[hash(key) & self.mask]
+        entry = shard.pop(key, None)
+        if entry is None:
+            self._make_room(shard, now)
+            tokens = capacity
+        elif entry[2] <= now:
+            tokens = capacity
+        else:
+            tokens = entry[0] + (now - entry[1]) * rate
+
+        if tokens < 1:
+            shard[key] = (tokens, now, entry[2])
+            return RateLimitResult(False, 0, entry[2] - now, (1 - tokens) / rate)
+        tokens -= 1
+        # Вставка заново переносит ключ в конец: шард упорядочен по обращениям
+        reset = (capacity - tokens) / rate
+        shard[key] = (tokens, now, now + reset)
+        return RateLimitResult(True, int(tokens), reset, 0.0)
+
+    def stats(self) -> dict:
+        return {
+            "buckets": len(self),
+            "max_buckets": self.shard_size * len(self.shards),
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
+
+
+# Атомарное пополнение и списание в Redis. Время берется у Redis, чтобы
+# расхождение часов между подами не влияло на пополнение корзин.
+REDIS_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+if tokens == nil then
+    tokens = capacity
+else
+    tokens = math.min(capacity, tokens + (now - tonumber(bucket[2])) * rate)
+end
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Корзины в Redis: один лимит на все воркеры и поды.
+
+    Ключ истекает, когда корзина восстановилась бы полностью, так что
+    Redis сам удаляет неактивных клиентов. Если Redis недоступен, запрос
+    пропускается (лимит не должен останавливать API), ошибка считается.
+    """
+
+    def __init__(self, url: str, prefix: str = "ratelimit"):
+        if aioredis is None:
+            raise RuntimeError("Для RATE_LIMIT_BACKEND=redis установите пакет redis")
+        self.client = aioredis.Redis.from_url(url)
+        self.script = self.client.register_script(REDIS_TAKE_SCRIPT)
+        self.prefix = prefix
+        self.errors = 0
+
+    async def take(self, key: Hashable, rate: float, capacity: int) -> RateLimitResult:
+        name = ":".join((self.prefix, *map(str, key)))
+        try:
+            allowed, tokens = await self.script(keys=[name], args=[rate, capacity])
+        except aioredis.RedisError:
+            self.errors += 1
+            return RateLimitResult(True, capacity, 0.0, 0.0)
+        return _result(bool(allowed), float(tokens), rate, capacity)
+
+    def stats(self) -> dict:
+        return {"errors": self.errors}
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def create_rate_limit_backend(settings: Settings) -> Optional[RateLimitBackend]:
+    """Создание хранилища корзин по настройкам (None - лимит выключен)."""
+    if settings.rate_limit_backend == "off":
+        return None
+    if settings.rate_limit_backend == "memory":
+        return InMemoryRateLimitBackend(max_entries=settings.rate_limit_max_buckets)
+    if settings.rate_limit_backend == "redis":
+        return RedisRateLimitBackend(settings.rate_limit_redis_url)
+    raise ValueError(f"Неизвестное хранилище лимитов: {settings.rate_limit_backend}")
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware ограничения частоты запросов.
+
+    - **backend**: хранилище корзин
+    - **rates**: класс маршрута (read/write/bulk) -> запросов в секунду
+      (0 - без лимита); пробы и метрики не ограничиваются
+    - **burst**: емкость корзины в секундах rate (запас на всплеск)
+    - **api_key_header**: заголовок, по которому определяется клиент
+    - **api_keys**: известные API ключи; с другими значениями заголовка
+      клиент определяется по IP
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        backend: RateLimitBackend,
+        rates: Dict[str, float],
+        burst: float = 10.0,
+        api_key_header: str = "X-API-Key",
+        api_keys: Iterable[str] = (),
+    ):
+        self.app = app
+        self.backend = backend
+        self.api_key_header = api_key_header.lower().encode()
+        self.api_keys = {key.encode("latin-1") for key in api_keys}
+        # класс -> (rate, capacity, постоянные заголовки RateLimit-*)
+        self.policies: Dict[str, Tuple[float, int, List[Tuple[bytes, bytes]]]] = {}
+        for route_class, rate in rates.items():
+            if rate:
+                capacity = max(1, int(rate * burst))
+                headers = [
+                    (b"ratelimit-limit", b"%d" % capacity),
+                    (b"ratelimit-policy", f"{capacity};w={capacity / rate:g}".encode()),
+                ]
+                self.policies[route_class] = (rate, capacity, headers)
+        self.matcher: Optional[RouteMatcher] = None
+
+    def _client(self, scope: Scope) -> str:
+        """Известный API ключ ("k:" + значение) или IP адрес клиента."""
+        if self.api_keys:
+            for name, value in scope["headers"]:
+                if name == self.api_key_header and value in self.api_keys:
+                    return "k:" + value.decode("latin-1")
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        policy = self.policies.get(classify(method, scope["path"]))
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        template = scope.get(ROUTE_TEMPLATE)
+        if template is None:
+            if self.matcher is None:
+                # Маршруты известны только после сборки приложения
+                self.matcher = RouteMatcher(scope["app"].router.routes)
+            template = self.matcher.template(method, scope["path"])
+        rate, capacity, policy_headers = policy
+        key = (self._client(scope), method, template)
+        result = await self.backend.take(key, rate, capacity)
+
+        headers = [
+            *policy_headers,
+            (b"ratelimit-remaining", b"%d" % result.remaining),
+            (b"ratelimit-reset", _seconds(result.reset)),
+        ]
+        if not result.allowed:
+            headers += [
+                (b"retry-after", _seconds(result.retry_after)),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(TOO_MANY_REQUESTS)).encode()),
+            ]
+            await send(
+                {"type": "http.response.start", "status": 429, "headers": headers}
+            )
+            await send({"type": "http.response.body", "body": TOO_MANY_REQUESTS})
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message["headers"], *headers]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,59 @@
+"""
+Роутер отладки: профилирование работающего воркера.
+Подключается только если задан DEBUG_PROFILE_TOKEN.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request, status
+from fastapi.responses import PlainTextResponse
+
+from app.profiling import ProfilerUnavailableError
+
+router = APIRouter()
+
+
+@router.get("/debug/profile", response_class=PlainTextResponse)
+async def debug_profile(
+    request: Request,
+    seconds: float = Query(10.0, gt=0),
+    interval_ms: Optional[float] = Query(None, ge=1, le=1000),
+    slow_ms: Optional[float] = Query(None, ge=0),
+    x_debug_token: Optional[str] = Header(None),
+):
+    """
+    Профиль event loop этого воркера за seconds секунд в формате свернутых
+    стеков (flamegraph.pl, speedscope).
+
+    С slow_ms стеки запросов дольше slow_ms миллисекунд получают корень
+    "slow <метод> <маршрут>". Доступ - по заголовку X-Debug-Token.
+    """
+    profiler = request.app.state.profiler
+    if not profiler.authorized(x_debug_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Неверный токен отладки"
+        )
+    if seconds > profiler.max_seconds:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Профиль не длиннее {profiler.max_seconds:g} секунд",
+        )
+
+    try:
+        sampler = await profiler.profile(
+            seconds,
+            interval=interval_ms / 1000 if interval_ms else None,
+            slow_threshold=slow_ms / 1000 if slow_ms is not None else None,
+        )
+    except ProfilerUnavailableError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
+
+    return PlainTextResponse(
+        sampler.collapsed(),
+        headers={
+            "Cache-Control": "no-store",
+            "X-Profile-Samples": str(sampler.samples),
+            "X-Profile-Seconds": f"{sampler.elapsed:.3f}",
+            "X-Profile-Slow-Requests": str(sampler.slow_requests),
+        },
+    )
@@ -4,13 +4,19 @@
 """
 
 
+import asyncio
 import json
 import os
+import time
 from datetime import datetime
+from typing import Optional
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Request, Response
+from starlette.concurrency import run_in_threadpool
 
+from app import metrics
 from app.models import HealthResponse
+from app.storage import CachedUserStore, UserStore, get_user_store
 
 router = APIRouter()
 
@@ -18,21 +24,78 @@ router = APIRouter()
 # Путь к файлу с информацией о деплое
 DEPLOYMENT_INFO_FILE = "/tmp/deployment_info.json"
 
+# Как часто (секунды) проверять, не изменился ли файл деплоя
+DEPLOYMENT_INFO_CHECK_INTERVAL = 1.0
 
-def get_deployment_info():
-    """Получение информации о последнем деплое."""
-    try:
-        if os.path.exists(DEPLOYMENT_INFO_FILE):
-            with open(DEPLOYMENT_INFO_FILE, "r") as f:
-                return json.load(f)
-    except Exception:
-        pass
-    return {
-        "deployed_at": "unknown",
-        "commit_sha": "unknown",
-        "branch": "unknown",
-        "deployed_by": "unknown",
-    }
+UNKNOWN_DEPLOYMENT = {
+    "deployed_at": "unknown",
+    "commit_sha": "unknown",
+    "branch": "unknown",
+    "deployed_by": "unknown",
+}
+
+
+class DeploymentInfoCache:
+    """
+    Информация о деплое, закешированная в памяти.
+
+    Файл перечитывается только если изменились его inode, mtime или размер.
+    stat выполняется не чаще раза в check_interval секунд и в пуле потоков,
+    поэтому в установившемся режиме запрос не трогает файловую систему.
+    Параллельные запросы ждут уже идущую проверку, а не запускают свою.
+    """
+
+    def __init__(self, path: str, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._info: dict = UNKNOWN_DEPLOYMENT
+        self._signature: Optional[tuple] = None
+        self._checked_at: Optional[float] = None
+        self._refreshing: Optional[asyncio.Task] = None
+
+    def _refresh(self) -> None:
+        """Синхронная проверка и перечитывание файла."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            self._signature = None
+            self._info = UNKNOWN_DEPLOYMENT
+            return
+
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return
+        try:
+            with open(self.path, "r") as f:
+                info = json.load(f)
+        except Exception:
+            info = UNKNOWN_DEPLOYMENT
+        self._info, self._signature = info, signature
+
+    async def get(self) -> dict:
+        """Текущая информация о деплое."""
+        now = time.monotonic()
+        if self._refreshing is None and (
+            self._checked_at is None or now - self._checked_at >= self.check_interval
+        ):
+            self._checked_at = now
+            self._refreshing = asyncio.get_running_loop().create_task(
+                run_in_threadpool(self._refresh)
+            )
+            self._refreshing.add_done_callback(self._refreshed)
+        if self._refreshing is not None:
+            # Отмена одного запроса не отменяет проверку для остальных
+            await asyncio.shield(self._refreshing)
+        return self._info
+
+    def _refreshed(self, task: asyncio.Task) -> None:
+        if self._refreshing is task:
+            self._refreshing = None
+
+
+deployment_info_cache = DeploymentInfoCache(
+    DEPLOYMENT_INFO_FILE, check_interval=DEPLOYMENT_INFO_CHECK_INTERVAL
+)
 
 
 @router.get("/health", response_model=HealthResponse)
@@ -55,15 +118,62 @@ async def kubernetes_health():
 
 
 @router.get("/readyz")
-async def kubernetes_ready():
+async def kubernetes_ready(
+    request: Request, response: Response, store: UserStore = Depends(get_user_store)
+):
     """
     Readiness check для Kubernetes readiness probe.
-    Проверяет готовность приложения принимать трафик.
+    Проверяет готовность приложения принимать трафик: пока хранилище
+    пользователей восстанавливается с диска, если оно сломано (например,
+    восстановление не удалось) или приложение перегружено (задержка event
+    loop, исчерпан лимит запросов), отвечает 503.
     """
-    # Здесь можно добавить проверку подключения к БД и другим сервисам
+    admission = getattr(request.app.state, "admission", None)
+    reason = store.failure()
+    if reason is None and not store.is_ready():
+        reason = "store recovering"
+    if reason is None and admission is not None:
+        reason = admission.overload_reason()
+    if reason is not None:
+        response.status_code = 503
+        return {
+            "status": "not ready",
+            "reason": reason,
+            "timestamp": datetime.now().isoformat(),
+        }
     return {"status": "ready", "timestamp": datetime.now().isoformat()}
 
 
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """
+    Метрики HTTP запросов в формате Prometheus.
+    """
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@router.get("/stats/admission")
+async def admission_stats(request: Request):
+    """
+    Задержка event loop, запросы в обработке и отклоненные по классам
+    маршрутов для подбора лимитов ADMISSION_*.
+    """
+    admission = getattr(request.app.state, "admission", None)
+    if admission is None:
+        return {"enabled": False}
+    return {"enabled": True, **admission.stats()}
+
+
+@router.get("/stats/cache")
+async def cache_stats(store: UserStore = Depends(get_user_store)):
+    """
+    Счетчики кеша чтения пользователей для подбора USER_CACHE_SIZE и TTL.
+    """
+    if not isinstance(store, CachedUserStore):
+        return {"enabled": False}
+    return {"enabled": True, **store.stats()}
+
+
 @router.get("/deployment")
 async def deployment_status():
     """
@@ -76,7 +186,7 @@ async def deployment_status():
     - Когда был последний деплой
     - Из какой ветки был деплой
     """
-    deployment_info = get_deployment_info()
+    deployment_info = await deployment_info_cache.get()
 
     return {
         "status": "deployed",
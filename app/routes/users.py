@@ -3,52 +3,90 @@
 CRUD операции для демонстрации функционала API.
 """
 
+import base64
+import binascii
+from collections import OrderedDict
 from datetime import datetime
-from typing import List
+from typing import List, Optional
+from uuid import uuid4
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+
+from app.coalesce import SingleFlight
+from app.compression import negotiate
+from app.etags import etag_matches, generation_etag, not_modified, user_etag
+from app.export import csv_chunks, gzip_chunks, ndjson_chunks
+from app.importer import (
+    IMPORT_CHUNK_SIZE,
+    MultipartParseError,
+    MultipartUpload,
+    ParsedRow,
+    csv_rows,
+    is_csv,
+    iter_lines,
+    ndjson_rows,
+    validate_row,
+)
+from app.models import (
+    MessageResponse,
+    UserBatchCreate,
+    UserBatchDelete,
+    UserBatchGetRequest,
+    UserBatchGetResponse,
+    UserBatchRequest,
+    UserBatchResponse,
+    UserBatchResult,
+    UserBatchUpdate,
+    UserCreate,
+    UserImportRowError,
+    UserImportSummary,
+    UserResponse,
+    UserUpdate,
+)
+from app.security import PasswordHasher, get_password_hasher
+from app.serialization import dump_batch_get, dump_user, dump_users, json_response
+from app.storage import DuplicateUserError, UserStore, get_user_store
+from app.storage.base import BatchOperation, normalize_key
 
-from fastapi import APIRouter, HTTPException, status
+router = APIRouter()
 
-from app.models import MessageResponse, UserCreate, UserResponse, UserUpdate
+# Хранилище пользователей передается в обработчики через зависимость
+# get_user_store (в памяти или SQLite, см. app/storage).
+# Ответы с пользователями сериализуются напрямую из записей хранилища
+# (см. app/serialization), response_model остается для документации OpenAPI.
 
-router = APIRouter()
+# Одновременные одинаковые GET запросы разделяют одно чтение и сериализацию
+# (см. app/coalesce); ключ включает хранилище, так как у каждого приложения
+# оно свое; каждая запись вызывает reads.forget()
+reads = SingleFlight()
 
-# Имитация базы данных (в памяти)
-# В продакшене здесь будет реальная БД (PostgreSQL, MongoDB и т.д.)
-fake_users_db = {}
-user_id_counter = 1
+# Прогресс последних импортов по import_id (старые записи вытесняются)
+MAX_TRACKED_IMPORTS = 100
+MAX_IMPORT_ERRORS = 1000
+import_jobs: "OrderedDict[str, UserImportSummary]" = OrderedDict()
 
 
-@router.post("/users", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def create_user(user: UserCreate):
-    """
-    Создание нового пользователя.
+def not_found(user_id: int) -> HTTPException:
+    """Ошибка 404 для отсутствующего пользователя."""
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Пользователь с ID {user_id} не найден",
+    )
 
-    - **email**: Email адрес пользователя
-    - **username**: Уникальное имя пользователя
-    - **password**: Пароль (будет захеширован)
-    - **full_name**: Полное имя (опционально)
-    """
-    global user_id_counter
 
-    # Проверка на существующий email
-    for existing_user in fake_users_db.values():
-        if existing_user["email"] == user.email:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Пользователь с таким email уже существует",
-            )
-        if existing_user["username"] == user.username:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Пользователь с таким username уже существует",
-            )
+def duplicate_detail(exc: DuplicateUserError, op: str) -> str:
+    """Текст ошибки уникальности для создания или обновления."""
+    if op == "create":
+        return f"Пользователь с таким {exc.field} уже существует"
+    return f"{exc.field.capitalize()} уже используется"
 
-    # Создание пользователя
-    user_dict = user.model_dump()
-    hashed_password = f"hashed_{user_dict.pop('password')}"  # Имитация хеширования
 
-    new_user = {
-        "id": user_id_counter,
+def build_user_record(user: UserCreate, hashed_password: str) -> dict:
+    """Запись нового пользователя (без id) из данных запроса и хеша пароля."""
+    user_dict = user.model_dump(exclude={"password"})
+
+    return {
         "email": user_dict["email"],
         "username": user_dict["username"],
         "full_name": user_dict.get("full_name"),
@@ -57,100 +95,468 @@ async def create_user(user: UserCreate):
         "hashed_password": hashed_password,
     }
 
-    fake_users_db[user_id_counter] = new_user
-    user_id_counter += 1
+
+def build_user_changes(
+    user_update: UserUpdate, hashed_password: Optional[str] = None
+) -> dict:
+    """Изменяемые поля пользователя из данных запроса и хеша нового пароля."""
+    update_data = user_update.model_dump(exclude_unset=True, exclude={"password"})
+
+    if hashed_password is not None:
+        update_data["hashed_password"] = hashed_password
+    return update_data
+
+
+def encode_cursor(user_id: int) -> str:
+    """Кодирование id последнего пользователя страницы в непрозрачный курсор."""
+    return base64.urlsafe_b64encode(f"u:{user_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Декодирование курсора пагинации в id пользователя."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        prefix, _, value = base64.urlsafe_b64decode(padded).decode().partition(":")
+        if prefix != "u":
+            raise ValueError(cursor)
+        return int(value)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор пагинации",
+        )
+
+
+@router.post("/users", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+async def create_user(
+    user: UserCreate,
+    store: UserStore = Depends(get_user_store),
+    hasher: PasswordHasher = Depends(get_password_hasher),
+):
+    """
+    Создание нового пользователя.
+
+    - **email**: Email адрес пользователя
+    - **username**: Уникальное имя пользователя
+    - **password**: Пароль (будет захеширован)
+    - **full_name**: Полное имя (опционально)
+    """
+    # Хранилище само проверяет уникальность email и username; занятые
+    # отклоняются еще до хеширования пароля, окончательно - в create
+    try:
+        await store.check_unique({"email": user.email, "username": user.username})
+        hashed_password = await hasher.hash(user.password)
+        new_user = await store.create(build_user_record(user, hashed_password))
+    except DuplicateUserError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=duplicate_detail(exc, "create"),
+        )
+    reads.forget()
 
     # Возвращаем данные без пароля
-    return UserResponse(**new_user)
+    return json_response(
+        dump_user(new_user),
+        status_code=status.HTTP_201_CREATED,
+        headers={"ETag": user_etag(store.store_id(), new_user)},
+    )
+
+
+@router.post("/users:batch", response_model=UserBatchResponse)
+async def batch_users(
+    batch: UserBatchRequest,
+    response: Response,
+    store: UserStore = Depends(get_user_store),
+    hasher: PasswordHasher = Depends(get_password_hasher),
+):
+    """
+    Пакетное создание, обновление и удаление пользователей.
+
+    - **operations**: Список операций `create` (user), `update` (id, user)
+      и `delete` (id)
+
+    Пакет применяется атомарно: если хотя бы одна операция не удалась,
+    не применяется ни одна, а ответ имеет статус 400. Результат каждой
+    операции возвращается в `results` в порядке запроса.
+    """
+    # Все пароли пакета хешируются одним заданием, распределенным по пулу
+    passwords = [
+        item.user.password
+        for item in batch.operations
+        if not isinstance(item, UserBatchDelete) and item.user.password is not None
+    ]
+    hashes = iter(await hasher.hash_many(passwords))
+
+    operations = []
+    for item in batch.operations:
+        if isinstance(item, UserBatchCreate):
+            record = build_user_record(item.user, next(hashes))
+            operations.append(BatchOperation("create", data=record))
+        elif isinstance(item, UserBatchUpdate):
+            hashed_password = next(hashes) if item.user.password is not None else None
+            changes = build_user_changes(item.user, hashed_password)
+            operations.append(BatchOperation("update", item.id, changes))
+        else:
+            operations.append(BatchOperation("delete", item.id))
+
+    outcomes = await store.apply_batch(operations)
+    reads.forget()
+    applied = all(isinstance(outcome, dict) for outcome in outcomes)
+
+    results = []
+    for index, (operation, outcome) in enumerate(zip(operations, outcomes)):
+        result = UserBatchResult(index=index, op=operation.op, status=0)
+        if isinstance(outcome, DuplicateUserError):
+            result.status = status.HTTP_400_BAD_REQUEST
+            result.detail = duplicate_detail(outcome, operation.op)
+        elif outcome is None:
+            result.status = status.HTTP_404_NOT_FOUND
+            result.detail = f"Пользователь с ID {operation.user_id} не найден"
+        elif not applied:
+            result.status = status.HTTP_424_FAILED_DEPENDENCY
+            result.detail = "Операция не применена: пакет отклонен"
+        elif operation.op == "create":
+            result.status = status.HTTP_201_CREATED
+            result.user = UserResponse(**outcome)
+        elif operation.op == "update":
+            result.status = status.HTTP_200_OK
+            result.user = UserResponse(**outcome)
+        else:
+            result.status = status.HTTP_200_OK
+            result.detail = f"Удален пользователь: {outcome['username']}"
+        results.append(result)
+
+    if not applied:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+    return UserBatchResponse(applied=applied, results=results)
+
+
+@router.post("/users:batchGet", response_model=UserBatchGetResponse)
+async def batch_get_users(
+    batch: UserBatchGetRequest, store: UserStore = Depends(get_user_store)
+):
+    """
+    Получение нескольких пользователей по id одним запросом.
+
+    - **ids**: Список id (до 1000), повторы игнорируются
+
+    Пользователи возвращаются в `users` в порядке первого упоминания id,
+    отсутствующие id - в `missing` (запрос не завершается ошибкой 404).
+    """
+    user_ids = list(dict.fromkeys(batch.ids))
+    found = await store.get_many(user_ids)
+
+    users, missing = [], []
+    for user_id, user in zip(user_ids, found):
+        if user is None:
+            missing.append(user_id)
+        else:
+            users.append(user)
+    return json_response(dump_batch_get(users, missing))
 
 
 @router.get("/users", response_model=List[UserResponse])
-async def get_users(skip: int = 0, limit: int = 100):
+async def get_users(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[str] = None,
+    store: UserStore = Depends(get_user_store),
+):
     """
     Получение списка всех пользователей.
 
     - **skip**: Количество пропускаемых записей (для пагинации)
     - **limit**: Максимальное количество возвращаемых записей
+    - **after**: Курсор из заголовка `X-Next-Cursor` предыдущей страницы
+
+    Если после страницы есть еще записи, курсор следующей страницы
+    возвращается в заголовке `X-Next-Cursor`. ETag списка меняется при любом
+    изменении пользователей; при совпадающем `If-None-Match` ответ - 304.
     """
-    users = list(fake_users_db.values())
-    return [UserResponse(**user) for user in users[skip : skip + limit]]
+    after_id = decode_cursor(after) if after else None
+    limit = max(limit, 0)
+
+    # Поколение читается до выборки: при гонке ETag окажется старше данных,
+    # и клиент просто перезапросит страницу
+    # Сначала поколение: SQLite при его чтении обновляет и store_id
+    generation = await store.generation()
+    etag = generation_etag(store.store_id(), generation)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    async def load_page():
+        # Запрашиваем на одну запись больше, чтобы узнать, есть ли следующая
+        page = await store.list_users(after_id, skip=max(skip, 0), limit=limit + 1)
+        cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            # При limit=0 страница пуста, и курсора нет
+            if page:
+                cursor = encode_cursor(page[-1]["id"])
+        return dump_users(page), cursor
+
+    body, cursor = await reads.do(
+        (store, "list", etag, after_id, skip, limit), load_page
+    )
+    headers = {"ETag": etag}
+    if cursor is not None:
+        headers["X-Next-Cursor"] = cursor
+    return json_response(body, headers=headers)
 
 
-@router.get("/users/{user_id}", response_model=UserResponse)
-async def get_user(user_id: int):
+@router.get("/users/export", response_class=StreamingResponse)
+async def export_users(request: Request, store: UserStore = Depends(get_user_store)):
     """
-    Получение пользователя по ID.
+    Потоковая выгрузка всех пользователей.
 
-    - **user_id**: ID пользователя
+    Формат выбирается по заголовку `Accept`: `text/csv` для CSV,
+    иначе NDJSON. При `Accept-Encoding: gzip` поток сжимается на лету.
+    """
+    if "text/csv" in request.headers.get("accept", ""):
+        chunks, media_type, filename = csv_chunks(store), "text/csv", "users.csv"
+    else:
+        chunks, media_type = ndjson_chunks(store), "application/x-ndjson"
+        filename = "users.ndjson"
+
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Vary": "Accept, Accept-Encoding",
+    }
+    if negotiate(request.headers.get("accept-encoding", ""), ("gzip",)):
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+
+def _add_import_error(summary: UserImportSummary, row: int, errors: List[str]):
+    """Учет отклоненной строки импорта (список ошибок ограничен)."""
+    summary.failed += 1
+    if len(summary.errors) < MAX_IMPORT_ERRORS:
+        summary.errors.append(UserImportRowError(row=row, errors=errors))
+    else:
+        summary.errors_truncated = True
+
+
+async def _import_chunk(
+    store: UserStore,
+    hasher: PasswordHasher,
+    chunk: List[ParsedRow],
+    summary: UserImportSummary,
+) -> None:
+    """Валидация и сохранение одной порции строк импорта."""
+    users, row_numbers = [], []
+    for row_number, row, error in chunk:
+        summary.processed += 1
+        if error is not None:
+            _add_import_error(summary, row_number, [error])
+            continue
+        user, errors = validate_row(row)
+        if errors:
+            _add_import_error(summary, row_number, errors)
+            continue
+        # Дубликаты уже сохраненных пользователей - без хеширования пароля
+        try:
+            await store.check_unique({"email": user.email, "username": user.username})
+        except DuplicateUserError as exc:
+            _add_import_error(summary, row_number, [duplicate_detail(exc, "create")])
+            continue
+        users.append(user)
+        row_numbers.append(row_number)
+
+    hashes = await hasher.hash_many([user.password for user in users])
+    records = [build_user_record(user, h) for user, h in zip(users, hashes)]
+    outcomes = await store.create_many(records)
+    reads.forget()
+    for row_number, outcome in zip(row_numbers, outcomes):
+        if isinstance(outcome, DuplicateUserError):
+            _add_import_error(
+                summary, row_number, [duplicate_detail(outcome, "create")]
+            )
+        else:
+            summary.created += 1
+
+
+@router.post("/users/import", response_model=UserImportSummary)
+async def import_users(
+    request: Request,
+    import_id: Optional[str] = Query(None, max_length=64),
+    store: UserStore = Depends(get_user_store),
+    hasher: PasswordHasher = Depends(get_password_hasher),
+):
+    """
+    Потоковый импорт пользователей из NDJSON или CSV.
+
+    Файл передается телом запроса (`Content-Type: application/x-ndjson`
+    или `text/csv`) либо как `multipart/form-data` в поле `file`; в обоих
+    случаях он разбирается по мере поступления.
+    Строки валидируются и сохраняются порциями; строки с ошибками
+    пропускаются и попадают в отчет. Прогресс доступен по
+    `GET /users/import/{import_id}`.
+
+    - **import_id**: Идентификатор импорта для отслеживания прогресса
     """
-    if user_id not in fake_users_db:
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        upload = MultipartUpload(content_type, request.stream())
+        try:
+            found = await upload.open()
+        except MultipartParseError:
+            found = False
+        if not found:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Ожидается файл в поле file",
+            )
+        chunks = upload.read()
+        csv_format = is_csv(upload.content_type, upload.filename)
+    else:
+        chunks = request.stream()
+        csv_format = is_csv(content_type)
+
+    summary = UserImportSummary(import_id=import_id or uuid4().hex)
+    import_jobs[summary.import_id] = summary
+    import_jobs.move_to_end(summary.import_id)
+    while len(import_jobs) > MAX_TRACKED_IMPORTS:
+        import_jobs.popitem(last=False)
+
+    lines = iter_lines(chunks)
+    rows = csv_rows(lines) if csv_format else ndjson_rows(lines)
+    chunk: List[ParsedRow] = []
+    try:
+        async for parsed in rows:
+            chunk.append(parsed)
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                await _import_chunk(store, hasher, chunk, summary)
+                chunk = []
+        if chunk:
+            await _import_chunk(store, hasher, chunk, summary)
+    except MultipartParseError:
+        summary.status = "failed"
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Пользователь с ID {user_id} не найден",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректное тело multipart/form-data",
         )
+    except Exception:
+        summary.status = "failed"
+        raise
 
-    return UserResponse(**fake_users_db[user_id])
+    summary.status = "completed"
+    return summary
 
 
-@router.put("/users/{user_id}", response_model=UserResponse)
-async def update_user(user_id: int, user_update: UserUpdate):
+@router.get("/users/import/{import_id}", response_model=UserImportSummary)
+async def get_import_status(import_id: str):
     """
-    Обновление данных пользователя.
+    Прогресс импорта пользователей.
 
-    - **user_id**: ID пользователя
-    - Поля для обновления передаются в теле запроса
+    - **import_id**: Идентификатор импорта
     """
-    if user_id not in fake_users_db:
+    if import_id not in import_jobs:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Пользователь с ID {user_id} не найден",
+            detail=f"Импорт '{import_id}' не найден",
         )
+    return import_jobs[import_id]
 
-    stored_user = fake_users_db[user_id]
-    update_data = user_update.model_dump(exclude_unset=True)
 
-    # Проверка уникальности email и username при обновлении
-    if "email" in update_data:
-        for uid, u in fake_users_db.items():
-            if uid != user_id and u["email"] == update_data["email"]:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Email уже используется",
-                )
+@router.get("/users/search", response_model=List[UserResponse])
+async def search_users(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=100),
+    store: UserStore = Depends(get_user_store),
+):
+    """
+    Поиск пользователей для подсказок при вводе.
 
-    if "username" in update_data:
-        for uid, u in fake_users_db.items():
-            if uid != user_id and u["username"] == update_data["username"]:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Username уже используется",
-                )
+    - **q**: Начало username, full_name или любого слова в них (без учета регистра)
+    - **limit**: Максимальное количество результатов
+    """
 
-    # Обработка пароля
-    if "password" in update_data:
-        stored_user["hashed_password"] = f"hashed_{update_data.pop('password')}"
+    async def load_matches():
+        return dump_users(await store.search(q, limit))
 
-    # Обновление полей
-    for field, value in update_data.items():
-        stored_user[field] = value
+    return json_response(await reads.do((store, "search", q, limit), load_matches))
 
-    return UserResponse(**stored_user)
 
+@router.get("/users/{user_id}", response_model=UserResponse)
+async def get_user(
+    user_id: int, request: Request, store: UserStore = Depends(get_user_store)
+):
+    """
+    Получение пользователя по ID.
 
-@router.delete("/users/{user_id}", response_model=MessageResponse)
-async def delete_user(user_id: int):
+    - **user_id**: ID пользователя
+
+    Поддерживает условный запрос: при совпадающем `If-None-Match` ответ - 304.
     """
-    Удаление пользователя.
 
-    - **user_id**: ID пользователя для удаления
+    async def load_user():
+        user = await store.get(user_id)
+        return (
+            None
+            if user is None
+            else (dump_user(user), user_etag(store.store_id(), user))
+        )
+
+    found = await reads.do((store, "id", user_id), load_user)
+    if found is None:
+        raise not_found(user_id)
+
+    body, etag = found
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return json_response(body, headers={"ETag": etag})
+
+
+@router.put("/users/{user_id}", response_model=UserResponse)
+async def update_user(
+    user_id: int,
+    user_update: UserUpdate,
+    store: UserStore = Depends(get_user_store),
+    hasher: PasswordHasher = Depends(get_password_hasher),
+):
+    """
+    Обновление данных пользователя.
+
+    - **user_id**: ID пользователя
+    - Поля для обновления передаются в теле запроса
     """
-    if user_id not in fake_users_db:
+    hashed_password = None
+    if user_update.password is not None:
+        hashed_password = await hasher.hash(user_update.password)
+    changes = build_user_changes(user_update, hashed_password)
+
+    # Хранилище проверяет уникальность email и username при обновлении
+    try:
+        stored_user = await store.update(user_id, changes)
+    except DuplicateUserError as exc:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Пользователь с ID {user_id} не найден",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=duplicate_detail(exc, "update"),
         )
+    reads.forget()
+    if stored_user is None:
+        raise not_found(user_id)
+
+    return json_response(
+        dump_user(stored_user),
+        headers={"ETag": user_etag(store.store_id(), stored_user)},
+    )
+
 
-    deleted_user = fake_users_db.pop(user_id)
+@router.delete("/users/{user_id}", response_model=MessageResponse)
+async def delete_user(user_id: int, store: UserStore = Depends(get_user_store)):
+    """
+    Удаление пользователя.
+
+    - **user_id**: ID пользователя для удаления
+    """
+    deleted_user = await store.delete(user_id)
+    reads.forget()
+    if deleted_user is None:
+        raise not_found(user_id)
 
     return MessageResponse(
         message="Пользователь успешно удален",
@@ -159,15 +565,29 @@ async def delete_user(user_id: int):
 
 
 @router.get("/users/search/by-username/{username}", response_model=UserResponse)
-async def search_user_by_username(username: str):
+async def search_user_by_username(
+    username: str, request: Request, store: UserStore = Depends(get_user_store)
+):
     """
     Поиск пользователя по username.
 
     - **username**: Username для поиска
     """
-    for user in fake_users_db.values():
-        if user["username"] == username:
-            return UserResponse(**user)
+
+    async def load_user():
+        user = await store.get_by_username(username)
+        return (
+            None
+            if user is None
+            else (dump_user(user), user_etag(store.store_id(), user))
+        )
+
+    found = await reads.do((store, "username", normalize_key(username)), load_user)
+    if found is not None:
+        body, etag = found
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        return json_response(body, headers={"ETag": etag})
 
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
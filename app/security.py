@@ -0,0 +1,157 @@
+"""
+Хеширование паролей (bcrypt через passlib).
+
+bcrypt специально медленный (сотни миллисекунд на хеш при стандартной
+сложности), поэтому вычисления выполняются в отдельном пуле процессов и не
+блокируют event loop. Очередь ограничена: если в работе слишком много
+паролей, новые запросы сразу получают 503 вместо бесконечного ожидания.
+"""
+
+import asyncio
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Optional
+
+from starlette.requests import Request
+
+from app.config import Settings, get_settings
+
+
+@lru_cache()
+def get_pwd_context():
+    """
+    Контекст passlib. Импортируется при первом хешировании (в процессе
+    пула), а не при импорте приложения: процессу API passlib не нужен.
+    """
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _hash_passwords(passwords: List[str], rounds: int) -> List[str]:
+    """Хеширование списка паролей (выполняется в процессе пула)."""
+    return [get_pwd_context().hash(password, rounds=rounds) for password in passwords]
+
+
+def _verify_password(password: str, hashed_password: str) -> bool:
+    """Проверка пароля (выполняется в процессе пула)."""
+    return get_pwd_context().verify(password, hashed_password)
+
+
+class PasswordHasherBusyError(Exception):
+    """Очередь хеширования переполнена."""
+
+
+class PasswordHasher:
+    """
+    Хеширование и проверка паролей в ограниченном пуле процессов.
+
+    - **rounds**: сложность bcrypt (log2 числа итераций, 4..31)
+    - **max_workers**: число процессов (по умолчанию - число CPU)
+    - **max_pending**: максимум паролей в очереди и в работе одновременно
+    """
+
+    def __init__(self, rounds: int = 12, max_workers: int = 0, max_pending: int = 1024):
+        self.rounds = rounds
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """Пул процессов (создается при первом использовании)."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _reserve(self, count: int) -> None:
+        """Резервирование места в очереди (счетчик меняется только в event loop)."""
+        if self.pending + count > self.max_pending:
+            raise PasswordHasherBusyError(
+                f"Очередь хеширования переполнена ({self.pending}/{self.max_pending})"
+            )
+        self.pending += count
+
+    async def hash_many(self, passwords: List[str]) -> List[str]:
+        """Хеширование нескольких паролей, распределенное по процессам пула."""
+        if not passwords:
+            return []
+        self._reserve(len(passwords))
+        try:
+            loop = asyncio.get_running_loop()
+            size = math.ceil(len(passwords) / self.max_workers)
+            chunks = [passwords[i : i + size] for i in range(0, len(passwords), size)]
+            results = await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        self.executor, _hash_passwords, chunk, self.rounds
+                    )
+                    for chunk in chunks
+                )
+            )
+        finally:
+            self.pending -= len(passwords)
+        return [hashed for chunk in results for hashed in chunk]
+
+    async def hash(self, password: str) -> str:
+        """Хеширование одного пароля."""
+        return (await self.hash_many([password]))[0]
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Проверка пароля по хешу."""
+        self._reserve(1)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, _verify_password, password, hashed_password
+            )
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        """Остановка пула процессов."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+def create_password_hasher(settings: Settings) -> PasswordHasher:
+    """Создание хешера паролей по настройкам."""
+    return PasswordHasher(
+        rounds=settings.password_hash_rounds,
+        max_workers=settings.password_hash_workers,
+        max_pending=settings.password_hash_max_pending,
+    )
+
+
+def password_hasher_for(app) -> PasswordHasher:
+    """
+    Хешер паролей приложения: создается при первом обращении по настройкам
+    app.state.settings (если их нет - по настройкам из окружения).
+    """
+    state = app.state
+    hasher = getattr(state, "password_hasher", None)
+    if hasher is None:
+        settings = getattr(state, "settings", None) or get_settings()
+        hasher = state.password_hasher = create_password_hasher(settings)
+    return hasher
+
+
+def get_password_hasher(request: Request) -> PasswordHasher:
+    """FastAPI зависимость: хешер паролей приложения."""
+    return password_hasher_for(request.app)
+
+
+def close_password_hasher(app) -> None:
+    """Остановка пула процессов при остановке приложения."""
+    hasher = getattr(app.state, "password_hasher", None)
+    app.state.password_hasher = None
+    if hasher is not None:
+        hasher.shutdown()
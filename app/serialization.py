@@ -0,0 +1,66 @@
+"""
+Быстрая сериализация пользователей в JSON.
+
+Записи хранилища уже прошли валидацию при создании/обновлении, поэтому
+при ответе они сериализуются напрямую заранее скомпилированными
+TypeAdapter'ами pydantic-core - без промежуточных моделей UserResponse
+и без повторной валидации через response_model FastAPI.
+"""
+
+from datetime import datetime
+from typing import List, Mapping, Optional
+
+from fastapi import Response
+from pydantic import TypeAdapter
+from typing_extensions import TypedDict
+
+
+class UserPublic(TypedDict):
+    """Публичные поля записи пользователя (те же, что у UserResponse)."""
+
+    email: str
+    username: str
+    full_name: Optional[str]
+    id: int
+    created_at: datetime
+    is_active: bool
+
+
+class UserBatchGet(TypedDict):
+    """Ответ users:batchGet (те же поля, что у UserBatchGetResponse)."""
+
+    users: List[UserPublic]
+    missing: List[int]
+
+
+# Лишние ключи записи (hashed_password) при сериализации отбрасываются
+user_adapter = TypeAdapter(UserPublic)
+users_adapter = TypeAdapter(List[UserPublic])
+batch_get_adapter = TypeAdapter(UserBatchGet)
+
+
+def dump_user(user: dict) -> bytes:
+    """JSON одного пользователя."""
+    return user_adapter.dump_json(user)
+
+
+def dump_users(users: List[dict]) -> bytes:
+    """JSON массив пользователей."""
+    return users_adapter.dump_json(users)
+
+
+def dump_batch_get(users: List[dict], missing: List[int]) -> bytes:
+    """JSON ответа users:batchGet одним вызовом сериализатора."""
+    return batch_get_adapter.dump_json({"users": users, "missing": missing})
+
+
+def json_response(
+    content: bytes, status_code: int = 200, headers: Optional[Mapping[str, str]] = None
+) -> Response:
+    """Ответ с уже сериализованным JSON."""
+    return Response(
+        content=content,
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json",
+    )
@@ -0,0 +1,141 @@
+"""
+Раздача статического UI из памяти.
+
+Файлы каталога читаются один раз при создании приложения. Для каждого
+заранее готовятся сжатые варианты (gzip и brotli, если установлен) и
+сильные ETag, поэтому запрос не трогает диск и не тратит CPU на сжатие:
+ответ - это готовые байты или 304 при совпадающем If-None-Match.
+
+Файлы с отпечатком содержимого в имени (app.3f2a9c1b.js) кешируются
+браузером на год как immutable, остальные (index.html) - с
+Cache-Control: no-cache, т.е. всегда перепроверяются по ETag.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from starlette.responses import RedirectResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from app.compression import negotiate
+from app.etags import etag_matches
+
+try:
+    import brotli
+except ImportError:  # brotli - необязательная зависимость
+    brotli = None
+
+# Отпечаток содержимого в имени файла: name.<hex>.ext
+FINGERPRINT = re.compile(r"\.[0-9a-f]{8,}\.[^.]+$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+class StaticAsset:
+    """Файл в памяти: тело и ETag для каждой кодировки."""
+
+    __slots__ = ("variants", "encodings", "media_type", "cache_control")
+
+    def __init__(self, name: str, body: bytes):
+        digest = hashlib.sha256(body).hexdigest()[:20]
+        # encoding -> (тело, ETag); "identity" - несжатый вариант
+        self.variants: Dict[str, Tuple[bytes, str]] = {
+            "identity": (body, f'"{digest}"')
+        }
+        compressed = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli:
+            compressed["br"] = brotli.compress(body, quality=11)
+        for encoding, data in compressed.items():
+            # Вариант хранится, только если он действительно меньше
+            if len(data) < len(body):
+                self.variants[encoding] = (data, f'"{digest}-{encoding}"')
+        # Порядок предпочтения сервера, как в CompressionMiddleware
+        self.encodings = tuple(
+            encoding for encoding in ("br", "gzip") if encoding in self.variants
+        )
+        self.media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.cache_control = (
+            IMMUTABLE_CACHE_CONTROL
+            if FINGERPRINT.search(name)
+            else REVALIDATE_CACHE_CONTROL
+        )
+
+
+class InMemoryStaticFiles:
+    """
+    ASGI приложение для app.mount(), замена StaticFiles.
+
+    - **directory**: каталог со статикой (читается целиком при создании)
+    - **html**: "/" и "/dir/" отдают index.html, 404.html - для 404
+    """
+
+    def __init__(self, directory: str, html: bool = False):
+        self.html = html
+        self.assets: Dict[str, StaticAsset] = {}
+        for root, _, files in os.walk(directory):
+            for name in files:
+                path = os.path.join(root, name)
+                url = "/" + os.path.relpath(path, directory).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    self.assets[url] = StaticAsset(name, f.read())
+
+    def _lookup(self, path: str) -> Tuple[str, Optional[StaticAsset]]:
+        """Файл по пути запроса или "redirect" для каталога без слеша."""
+        asset = self.assets.get(path)
+        if asset is not None or not self.html:
+            return "file", asset
+        if path.endswith("/"):
+            return "file", self.assets.get(path + "index.html")
+        if path + "/index.html" in self.assets:
+            return "redirect", None
+        return "file", None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        assert scope["type"] == "http"
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405, headers={"Allow": "GET, HEAD"})
+
+        path = scope["path"]
+        kind, asset = self._lookup(path)
+        status_code = 200
+        if kind == "redirect":
+            url = scope.get("root_path", "") + path + "/"
+            await RedirectResponse(url, status_code=307)(scope, receive, send)
+            return
+        if asset is None:
+            asset = self.assets.get("/404.html") if self.html else None
+            if asset is None:
+                raise HTTPException(status_code=404)
+            status_code = 404
+
+        request = Request(scope)
+        encoding = negotiate(
+            request.headers.get("accept-encoding", ""), asset.encodings
+        )
+        body, etag = asset.variants[encoding or "identity"]
+        response_headers = {
+            "ETag": etag,
+            "Cache-Control": asset.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+
+        if status_code == 200 and etag_matches(request, etag):
+            response = Response(status_code=304, headers=response_headers)
+        else:
+            if encoding:
+                response_headers["Content-Encoding"] = encoding
+            response = Response(
+                b"" if scope["method"] == "HEAD" else body,
+                status_code=status_code,
+                headers=response_headers,
+                media_type=asset.media_type,
+            )
+            if scope["method"] == "HEAD":
+                response.headers["Content-Length"] = str(len(body))
+        await response(scope, receive, send)
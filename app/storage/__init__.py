@@ -0,0 +1,108 @@
+"""
+Пакет хранилищ пользователей.
+Реализация выбирается настройкой USER_STORE_BACKEND
+(memory, compact, shared или sqlite)
+и передается в роутер через зависимость get_user_store. Хранилище свое у
+каждого приложения: создается по app.state.settings при первом обращении.
+Хранилища в памяти сохраняются на диск журналом и снимками, если задан WAL_DIR.
+"""
+
+from starlette.requests import Request
+
+from app.config import Settings, get_settings
+from app.storage.base import DuplicateUserError, UserStore, normalize_key
+from app.storage.cached import CachedUserStore
+from app.storage.compact import CompactUserStore
+from app.storage.durable import DurableUserStore
+from app.storage.memory import InMemoryUserStore
+from app.storage.shared import (
+    SharedMemoryUserStore,
+    SharedStoreCorruptedError,
+    SharedStoreFullError,
+)
+from app.storage.sqlite import SQLiteUserStore
+
+__all__ = [
+    "CachedUserStore",
+    "CompactUserStore",
+    "DuplicateUserError",
+    "DurableUserStore",
+    "InMemoryUserStore",
+    "SQLiteUserStore",
+    "SharedMemoryUserStore",
+    "SharedStoreCorruptedError",
+    "SharedStoreFullError",
+    "UserStore",
+    "close_user_store",
+    "create_user_store",
+    "get_user_store",
+    "normalize_key",
+    "user_store_for",
+]
+
+
+def create_user_store(settings: Settings) -> UserStore:
+    """
+    Создание хранилища по настройкам.
+    Медленные хранилища оборачиваются кешем чтения (USER_CACHE_SIZE > 0),
+    перед словарем в памяти кеш только тратил бы память.
+    """
+    if settings.user_store_backend in ("memory", "compact"):
+        store: UserStore = (
+            InMemoryUserStore()
+            if settings.user_store_backend == "memory"
+            else CompactUserStore()
+        )
+        if settings.wal_dir:
+            store = DurableUserStore(
+                store,
+                settings.wal_dir,
+                fsync=settings.wal_fsync,
+                flush_interval=settings.wal_flush_interval,
+                snapshot_every=settings.wal_snapshot_every,
+            )
+        return store
+    if settings.user_store_backend == "shared":
+        return SharedMemoryUserStore(
+            settings.shared_store_path, size=settings.shared_store_size_mb * 2**20
+        )
+    if settings.user_store_backend == "sqlite":
+        store = SQLiteUserStore(
+            settings.sqlite_path,
+            pool_size=settings.sqlite_pool_size,
+            timeout=settings.sqlite_timeout,
+        )
+    else:
+        raise ValueError(f"Неизвестное хранилище: {settings.user_store_backend}")
+
+    if settings.user_cache_size:
+        store = CachedUserStore(
+            store, maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl
+        )
+    return store
+
+
+def user_store_for(app) -> UserStore:
+    """
+    Хранилище приложения: создается при первом обращении по настройкам
+    app.state.settings (если их нет - по настройкам из окружения).
+    """
+    state = app.state
+    store = getattr(state, "user_store", None)
+    if store is None:
+        settings = getattr(state, "settings", None) or get_settings()
+        store = state.user_store = create_user_store(settings)
+    return store
+
+
+def get_user_store(request: Request) -> UserStore:
+    """FastAPI зависимость: хранилище пользователей приложения."""
+    return user_store_for(request.app)
+
+
+async def close_user_store(app) -> None:
+    """Закрытие хранилища при остановке приложения."""
+    store = getattr(app.state, "user_store", None)
+    app.state.user_store = None
+    if store is not None:
+        await store.close()
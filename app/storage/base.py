@@ -0,0 +1,219 @@
+"""
+Базовый интерфейс хранилища пользователей.
+Роутер работает только с этим интерфейсом, конкретная реализация
+выбирается через настройки и FastAPI зависимость.
+"""
+
+import secrets
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Sequence, Union
+
+EPOCH = datetime(1970, 1, 1)
+
+# Поля записи пользователя (порядок столбцов в снимках хранилища)
+USER_FIELDS = (
+    "id",
+    "email",
+    "username",
+    "full_name",
+    "created_at",
+    "is_active",
+    "hashed_password",
+    "version",
+)
+
+
+def normalize_key(value: str) -> str:
+    """Приведение email/username к единому регистру для индексов."""
+    return value.casefold()
+
+
+def to_micros(value: datetime) -> int:
+    """created_at -> микросекунды от эпохи (время без часового пояса)."""
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=value)
+
+
+def new_store_id() -> str:
+    """Новый случайный идентификатор набора данных (см. UserStore.store_id)."""
+    return secrets.token_hex(4)
+
+
+class DuplicateUserError(Exception):
+    """Нарушение уникальности email или username."""
+
+    def __init__(self, field: str):
+        super().__init__(f"Пользователь с таким {field} уже существует")
+        self.field = field
+
+
+class BatchOperation(NamedTuple):
+    """Операция пакета: create (data), update (user_id, data) или delete (user_id)."""
+
+    op: str
+    user_id: Optional[int] = None
+    data: Optional[dict] = None
+
+
+# Результат операции пакета: запись пользователя при успехе,
+# None если пользователь не найден, DuplicateUserError при конфликте
+BatchOutcome = Union[dict, None, DuplicateUserError]
+
+
+class StoreState(NamedTuple):
+    """
+    Снимок хранилища в памяти для сохранения на диск.
+
+    columns - столбцы полей USER_FIELDS в порядке id (created_at в
+    микросекундах, числовые столбцы - array), search_blocks -
+    отсортированные ключи индекса поиска блоками.
+    """
+
+    next_id: int
+    columns: Dict[str, Sequence]
+    search_blocks: List[List[str]]
+
+
+class UserStore(ABC):
+    """
+    Асинхронное хранилище пользователей.
+
+    Пользователь хранится как словарь с ключами id, email, username,
+    full_name, created_at, is_active, hashed_password и version.
+    Email и username уникальны без учета регистра. Версия записи равна 1
+    при создании и увеличивается при каждом обновлении.
+    """
+
+    @abstractmethod
+    async def create(self, user: dict) -> dict:
+        """Сохранение нового пользователя (без id), возвращает запись с id."""
+
+    @abstractmethod
+    async def get(self, user_id: int) -> Optional[dict]:
+        """Получение пользователя по id."""
+
+    @abstractmethod
+    async def get_by_username(self, username: str) -> Optional[dict]:
+        """Получение пользователя по username (без учета регистра)."""
+
+    @abstractmethod
+    async def update(self, user_id: int, changes: dict) -> Optional[dict]:
+        """Частичное обновление пользователя, None если его нет."""
+
+    @abstractmethod
+    async def delete(self, user_id: int) -> Optional[dict]:
+        """Удаление пользователя, возвращает удаленную запись или None."""
+
+    @abstractmethod
+    async def list_users(
+        self, after_id: Optional[int] = None, skip: int = 0, limit: int = 100
+    ) -> List[dict]:
+        """Страница пользователей в порядке id, начиная после after_id."""
+
+    async def get_many(self, user_ids: List[int]) -> List[Optional[dict]]:
+        """
+        Пользователи по списку id в том же порядке, None для отсутствующих.
+
+        Хранилища переопределяют метод, чтобы прочитать все записи за одно
+        обращение (один запрос к базе, один переход в пул потоков).
+        """
+        return [await self.get(user_id) for user_id in user_ids]
+
+    async def check_unique(self, user: dict) -> None:
+        """
+        Предварительная проверка, что email и username нового пользователя
+        свободны: DuplicateUserError, если заняты.
+
+        Позволяет отклонить дубликат до дорогого хеширования пароля;
+        окончательно уникальность все равно проверяет create.
+        """
+
+    async def create_many(self, users: List[dict]) -> List[BatchOutcome]:
+        """
+        Неатомарное создание нескольких пользователей.
+
+        Каждая запись сохраняется или отклоняется независимо от остальных:
+        результат - созданная запись или DuplicateUserError.
+        """
+        outcomes: List[BatchOutcome] = []
+        for user in users:
+            try:
+                outcomes.append(await self.create(user))
+            except DuplicateUserError as exc:
+                outcomes.append(exc)
+        return outcomes
+
+    async def iter_pages(self, chunk_size: int = 1000) -> AsyncIterator[List[dict]]:
+        """
+        Обход всех пользователей страницами по chunk_size в порядке id.
+
+        Каждая страница запрашивается по id последней записи предыдущей,
+        поэтому в памяти одновременно находится не больше одной страницы.
+        """
+        after_id = None
+        while True:
+            page = await self.list_users(after_id, limit=chunk_size)
+            if not page:
+                return
+            yield page
+            if len(page) < chunk_size:
+                return
+            after_id = page[-1]["id"]
+
+    @abstractmethod
+    async def search(self, query: str, limit: int = 10) -> List[dict]:
+        """
+        Пользователи, у которых username, full_name или слово в них
+        начинается с query (без учета регистра), не больше limit.
+        """
+
+    @abstractmethod
+    async def apply_batch(self, operations: List[BatchOperation]) -> List[BatchOutcome]:
+        """
+        Атомарное применение пакета операций.
+
+        Операции выполняются по порядку, поэтому уникальность проверяется
+        и внутри пакета, и относительно хранилища. Если хотя бы одна операция
+        не удалась, изменения всего пакета откатываются.
+        """
+
+    @abstractmethod
+    def store_id(self) -> str:
+        """
+        Случайный идентификатор набора данных для ETag.
+
+        id, версии и поколение сравнимы только при одинаковом идентификаторе:
+        он меняется, когда они начинаются заново (новый процесс с хранилищем
+        в памяти, clear()), и совпадает у воркеров с общими данными.
+        """
+
+    @abstractmethod
+    async def generation(self) -> int:
+        """
+        Поколение хранилища: растет при любом изменении данных.
+
+        Используется для ETag списков: пока поколение не изменилось,
+        содержимое любой страницы тоже не изменилось.
+        """
+
+    @abstractmethod
+    async def clear(self) -> None:
+        """Удаление всех пользователей и сброс генератора id."""
+
+    def start(self) -> None:
+        """Запуск фоновой подготовки хранилища при старте приложения."""
+
+    def is_ready(self) -> bool:
+        """Готово ли хранилище обслуживать запросы (для /readyz)."""
+        return True
+
+    def failure(self) -> Optional[str]:
+        """Причина, по которой хранилище не может работать, или None."""
+        return None
+
+    async def close(self) -> None:
+        """Освобождение ресурсов хранилища."""
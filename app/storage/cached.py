@@ -0,0 +1,160 @@
+"""
+Кеш чтения перед медленным хранилищем пользователей.
+
+Кешируются запросы по id и по username, в том числе отрицательные
+результаты (пользователь не найден). Записи через этот же объект точно
+инвалидируют затронутые ключи. Изменения, сделанные другими воркерами
+напрямую в общей базе, видны не позже чем через TTL.
+"""
+
+from typing import List, Optional
+
+from app.cache import MISSING, LRUCache
+from app.storage.base import BatchOperation, BatchOutcome, UserStore, normalize_key
+
+
+class CachedUserStore(UserStore):
+    """
+    Хранилище-обертка с LRU/TTL кешем чтения.
+
+    Кеш по username хранит только id, а сама запись берется из кеша по id
+    и сверяется с username: после переименования старый ключ просто
+    перестает совпадать, и устаревшая запись не может быть отдана.
+    """
+
+    def __init__(self, store: UserStore, maxsize: int = 10000, ttl: float = 60.0):
+        self.store = store
+        self.by_id = LRUCache(maxsize, ttl)
+        self.by_username = LRUCache(maxsize, ttl)
+        # Счетчик записей: результат чтения, во время которого прошла запись,
+        # не кешируется (иначе можно закешировать уже устаревшие данные)
+        self._writes = 0
+
+    def _invalidate(self, user: dict) -> None:
+        """Инвалидация ключей записанного пользователя."""
+        self._writes += 1
+        self.by_id.pop(user["id"])
+        self.by_username.pop(normalize_key(user["username"]))
+
+    def _invalidate_outcomes(self, outcomes: List[BatchOutcome]) -> None:
+        for outcome in outcomes:
+            if isinstance(outcome, dict):
+                self._invalidate(outcome)
+
+    async def get(self, user_id: int) -> Optional[dict]:
+        user = self.by_id.get(user_id)
+        if user is not MISSING:
+            return user
+
+        writes = self._writes
+        user = await self.store.get(user_id)
+        if writes == self._writes:
+            self.by_id.set(user_id, user)
+        return user
+
+    async def get_many(self, user_ids: List[int]) -> List[Optional[dict]]:
+        users = [self.by_id.get(user_id) for user_id in user_ids]
+        misses = [uid for uid, user in zip(user_ids, users) if user is MISSING]
+        if not misses:
+            return users
+
+        # Промахи читаются из хранилища одним запросом
+        writes = self._writes
+        loaded = dict(zip(misses, await self.store.get_many(misses)))
+        if writes == self._writes:
+            for user_id, user in loaded.items():
+                self.by_id.set(user_id, user)
+        return [
+            loaded[uid] if user is MISSING else user
+            for uid, user in zip(user_ids, users)
+        ]
+
+    async def get_by_username(self, username: str) -> Optional[dict]:
+        key = normalize_key(username)
+        user_id = self.by_username.get(key)
+        if user_id is None:
+            return None
+        if user_id is not MISSING:
+            user = self.by_id.get(user_id)
+            if user is not MISSING and user and normalize_key(user["username"]) == key:
+                return user
+
+        writes = self._writes
+        user = await self.store.get_by_username(username)
+        if writes == self._writes:
+            self.by_username.set(key, None if user is None else user["id"])
+            if user is not None:
+                self.by_id.set(user["id"], user)
+        return user
+
+    async def check_unique(self, user: dict) -> None:
+        await self.store.check_unique(user)
+
+    async def create(self, user: dict) -> dict:
+        new_user = await self.store.create(user)
+        self._invalidate(new_user)
+        return new_user
+
+    async def update(self, user_id: int, changes: dict) -> Optional[dict]:
+        self._writes += 1
+        self.by_id.pop(user_id)
+        stored_user = await self.store.update(user_id, changes)
+        if stored_user is not None:
+            self._invalidate(stored_user)
+        return stored_user
+
+    async def delete(self, user_id: int) -> Optional[dict]:
+        deleted_user = await self.store.delete(user_id)
+        if deleted_user is not None:
+            self._invalidate(deleted_user)
+        return deleted_user
+
+    async def create_many(self, users: List[dict]) -> List[BatchOutcome]:
+        outcomes = await self.store.create_many(users)
+        self._invalidate_outcomes(outcomes)
+        return outcomes
+
+    async def apply_batch(self, operations: List[BatchOperation]) -> List[BatchOutcome]:
+        self._writes += 1
+        for operation in operations:
+            if operation.user_id is not None:
+                self.by_id.pop(operation.user_id)
+        outcomes = await self.store.apply_batch(operations)
+        self._invalidate_outcomes(outcomes)
+        return outcomes
+
+    async def list_users(
+        self, after_id: Optional[int] = None, skip: int = 0, limit: int = 100
+    ) -> List[dict]:
+        return await self.store.list_users(after_id, skip=skip, limit=limit)
+
+    async def search(self, query: str, limit: int = 10) -> List[dict]:
+        return await self.store.search(query, limit)
+
+    def store_id(self) -> str:
+        return self.store.store_id()
+
+    async def generation(self) -> int:
+        return await self.store.generation()
+
+    async def clear(self) -> None:
+        self._writes += 1
+        await self.store.clear()
+        self.by_id.clear()
+        self.by_username.clear()
+
+    def start(self) -> None:
+        self.store.start()
+
+    def is_ready(self) -> bool:
+        return self.store.is_ready()
+
+    def failure(self) -> Optional[str]:
+        return self.store.failure()
+
+    async def close(self) -> None:
+        await self.store.close()
+
+    def stats(self) -> dict:
+        """Счетчики кеша по id и по username."""
+        return {"by_id": self.by_id.stats(), "by_username": self.by_username.stats()}
@@ -0,0 +1,341 @@
+"""
+Компактное хранилище пользователей в памяти процесса.
+Как и InMemoryUserStore, не переживает перезапуск и не разделяется
+между воркерами, но тратит на пользователя в разы меньше памяти.
+"""
+
+from array import array
+from typing import Callable, Dict, List, Optional
+
+from app.storage.base import (
+    BatchOperation,
+    BatchOutcome,
+    DuplicateUserError,
+    StoreState,
+    UserStore,
+    from_micros,
+    new_store_id,
+    normalize_key,
+    to_micros,
+)
+from app.storage.search import UserSearchIndex
+
+# Состояние строки в столбце flags
+DELETED, ACTIVE, INACTIVE = 0, 1, 2
+
+
+def index_key(value: str) -> str:
+    """Ключ индекса; если нормализация ничего не меняет, строка не копируется."""
+    key = normalize_key(value)
+    return value if key == value else key
+
+
+class CompactUserStore(UserStore):
+    """
+    Столбцовое хранилище.
+
+    id выдаются подряд, поэтому строка пользователя - это позиция id - 1 в
+    столбцах, отдельная таблица id -> запись не нужна. Строки хранятся в
+    списках, created_at - микросекундами в array('q'), версия - в array('L'),
+    активность и признак удаления - байтом в bytearray. Ключи индексов
+    разделяют объекты строк с самими данными, если уже нормализованы.
+    Наружу отдаются новые словари, собранные из столбцов, как у SQLite.
+    Удаленные строки остаются пустыми слотами и пропускаются при обходе.
+    Индекс поиска подсказок обновляется вместе с остальными индексами.
+    """
+
+    def __init__(self):
+        self._reset()
+        self._generation = 0
+        self._store_id = new_store_id()
+
+    def _reset(self) -> None:
+        """Пустые столбцы и индексы."""
+        self.emails: List[Optional[str]] = []
+        self.usernames: List[Optional[str]] = []
+        self.full_names: List[Optional[str]] = []
+        self.hashed_passwords: List[Optional[str]] = []
+        self.created_at = array("q")
+        self.versions = array("L")
+        self.flags = bytearray()
+        self.email_index: Dict[str, int] = {}
+        self.username_index: Dict[str, int] = {}
+        self.search_index = UserSearchIndex()
+        self.next_id = 1
+        self.count = 0
+
+    def _alive(self, user_id: int) -> bool:
+        return 0 < user_id <= len(self.flags) and self.flags[user_id - 1] != DELETED
+
+    def _row(self, user_id: int) -> dict:
+        """Запись пользователя из столбцов."""
+        slot = user_id - 1
+        return {
+            "id": user_id,
+            "email": self.emails[slot],
+            "username": self.usernames[slot],
+            "full_name": self.full_names[slot],
+            "created_at": from_micros(self.created_at[slot]),
+            "is_active": self.flags[slot] == ACTIVE,
+            "hashed_password": self.hashed_passwords[slot],
+            "version": self.versions[slot],
+        }
+
+    def _write(self, user: dict) -> None:
+        """Запись пользователя в его слот (столбцы растут при необходимости)."""
+        slot = user["id"] - 1
+        while len(self.flags) <= slot:
+            for column in (
+                self.emails,
+                self.usernames,
+                self.full_names,
+                self.hashed_passwords,
+            ):
+                column.append(None)
+            self.created_at.append(0)
+            self.versions.append(0)
+            self.flags.append(DELETED)
+
+        self.emails[slot] = user["email"]
+        self.usernames[slot] = user["username"]
+        self.full_names[slot] = user["full_name"]
+        self.hashed_passwords[slot] = user["hashed_password"]
+        self.created_at[slot] = to_micros(user["created_at"])
+        self.versions[slot] = user["version"]
+        self.flags[slot] = ACTIVE if user["is_active"] else INACTIVE
+
+    def _search_fields(self, user_id: int) -> dict:
+        slot = user_id - 1
+        return {
+            "id": user_id,
+            "username": self.usernames[slot],
+            "full_name": self.full_names[slot],
+        }
+
+    def _index(self, user_id: int) -> None:
+        """Добавление пользователя во вторичные индексы."""
+        self._generation += 1
+        slot = user_id - 1
+        self.email_index[index_key(self.emails[slot])] = user_id
+        self.username_index[index_key(self.usernames[slot])] = user_id
+        self.search_index.add(self._search_fields(user_id))
+
+    def _unindex(self, user_id: int) -> None:
+        """Удаление пользователя из вторичных индексов."""
+        self._generation += 1
+        slot = user_id - 1
+        self.email_index.pop(normalize_key(self.emails[slot]), None)
+        self.username_index.pop(normalize_key(self.usernames[slot]), None)
+        self.search_index.remove(self._search_fields(user_id))
+
+    def _check_unique(self, user: dict, user_id: Optional[int] = None) -> None:
+        """Проверка уникальности email и username (кроме самого user_id)."""
+        if "email" in user:
+            owner_id = self.email_index.get(normalize_key(user["email"]))
+            if owner_id is not None and owner_id != user_id:
+                raise DuplicateUserError("email")
+        if "username" in user:
+            owner_id = self.username_index.get(normalize_key(user["username"]))
+            if owner_id is not None and owner_id != user_id:
+                raise DuplicateUserError("username")
+
+    def _insert(self, user: dict) -> None:
+        """Сохранение записи с уже назначенным id во всех индексах."""
+        self._write(user)
+        self._index(user["id"])
+        self.count += 1
+        self.next_id = max(self.next_id, user["id"] + 1)
+
+    def _remove(self, user_id: int) -> dict:
+        """Удаление записи: слот очищается, id больше не выдается."""
+        user = self._row(user_id)
+        self._unindex(user_id)
+        slot = user_id - 1
+        self.emails[slot] = self.usernames[slot] = None
+        self.full_names[slot] = self.hashed_passwords[slot] = None
+        self.flags[slot] = DELETED
+        self.count -= 1
+        return user
+
+    def _create(self, user: dict) -> dict:
+        self._check_unique(user)
+        new_user = {**user, "id": self.next_id, "version": 1}
+        self._insert(new_user)
+        return self._row(new_user["id"])
+
+    def _update(self, user_id: int, changes: dict) -> Optional[dict]:
+        if not self._alive(user_id):
+            return None
+        self._check_unique(changes, user_id)
+
+        user = self._row(user_id)
+        self._unindex(user_id)
+        user.update(changes)
+        user["version"] += 1
+        self._write(user)
+        self._index(user_id)
+        return self._row(user_id)
+
+    def _replace(self, user_id: int, snapshot: dict) -> None:
+        """Восстановление записи из снимка (откат обновления)."""
+        self._unindex(user_id)
+        self._write(snapshot)
+        self._index(user_id)
+
+    def capture_state(self) -> Callable[[], StoreState]:
+        """
+        Согласованный снимок для сохранения на диск.
+
+        Сразу копируются столбцы и блоки индекса поиска, удаленные слоты
+        отбрасывает возвращаемая функция - ее можно вызвать в потоке.
+        """
+        emails, usernames = self.emails[:], self.usernames[:]
+        full_names, hashed_passwords = self.full_names[:], self.hashed_passwords[:]
+        created_at, versions = self.created_at[:], self.versions[:]
+        flags = bytes(self.flags)
+        search_blocks = self.search_index.keys.copy_blocks()
+        next_id = self.next_id
+
+        def build() -> StoreState:
+            slots = [slot for slot, flag in enumerate(flags) if flag != DELETED]
+            columns = {
+                "id": array("q", [slot + 1 for slot in slots]),
+                "email": [emails[slot] for slot in slots],
+                "username": [usernames[slot] for slot in slots],
+                "full_name": [full_names[slot] for slot in slots],
+                "created_at": array("q", [created_at[slot] for slot in slots]),
+                "is_active": [flags[slot] == ACTIVE for slot in slots],
+                "hashed_password": [hashed_passwords[slot] for slot in slots],
+                "version": array("L", [versions[slot] for slot in slots]),
+            }
+            return StoreState(next_id, columns, search_blocks)
+
+        return build
+
+    def restore_state(self, state: StoreState) -> None:
+        """Загрузка снимка в пустое хранилище: столбцы заполняются целиком."""
+        self._reset()
+        columns = state.columns
+        ids = columns["id"]
+        size = max(ids, default=0)
+        self.emails = [None] * size
+        self.usernames = [None] * size
+        self.full_names = [None] * size
+        self.hashed_passwords = [None] * size
+        self.created_at = array("q", bytes(8 * size))
+        self.versions = array("L", [0]) * size
+        self.flags = bytearray(size)
+        for column, values in (
+            (self.emails, columns["email"]),
+            (self.usernames, columns["username"]),
+            (self.full_names, columns["full_name"]),
+            (self.hashed_passwords, columns["hashed_password"]),
+            (self.created_at, columns["created_at"]),
+            (self.versions, columns["version"]),
+            (
+                self.flags,
+                [ACTIVE if active else INACTIVE for active in columns["is_active"]],
+            ),
+        ):
+            for user_id, value in zip(ids, values):
+                column[user_id - 1] = value
+
+        self.email_index = {
+            index_key(email): user_id for email, user_id in zip(columns["email"], ids)
+        }
+        self.username_index = {
+            index_key(username): user_id
+            for username, user_id in zip(columns["username"], ids)
+        }
+        self.search_index = UserSearchIndex.from_blocks(state.search_blocks)
+        self.next_id = state.next_id
+        self.count = len(ids)
+        self._generation += 1
+
+    async def create(self, user: dict) -> dict:
+        return self._create(user)
+
+    async def get(self, user_id: int) -> Optional[dict]:
+        return self._row(user_id) if self._alive(user_id) else None
+
+    async def get_many(self, user_ids: List[int]) -> List[Optional[dict]]:
+        return [
+            self._row(user_id) if self._alive(user_id) else None for user_id in user_ids
+        ]
+
+    async def get_by_username(self, username: str) -> Optional[dict]:
+        user_id = self.username_index.get(normalize_key(username))
+        return None if user_id is None else self._row(user_id)
+
+    async def check_unique(self, user: dict) -> None:
+        self._check_unique(user)
+
+    async def search(self, query: str, limit: int = 10) -> List[dict]:
+        return [self._row(uid) for uid in self.search_index.search(query, limit)]
+
+    async def update(self, user_id: int, changes: dict) -> Optional[dict]:
+        return self._update(user_id, changes)
+
+    async def delete(self, user_id: int) -> Optional[dict]:
+        if not self._alive(user_id):
+            return None
+        return self._remove(user_id)
+
+    async def apply_batch(self, operations: List[BatchOperation]) -> List[BatchOutcome]:
+        # Как в InMemoryUserStore: синхронно и с журналом отмены
+        outcomes: List[BatchOutcome] = []
+        undo: List[Callable[[], None]] = []
+        next_id = self.next_id
+
+        for operation in operations:
+            user_id = operation.user_id
+            try:
+                if operation.op == "create":
+                    outcome = self._create(operation.data)
+                    undo.append(lambda uid=outcome["id"]: self._remove(uid))
+                elif not self._alive(user_id):
+                    outcome = None
+                elif operation.op == "update":
+                    snapshot = self._row(user_id)
+                    outcome = self._update(user_id, operation.data)
+                    undo.append(lambda uid=user_id, s=snapshot: self._replace(uid, s))
+                else:
+                    outcome = self._remove(user_id)
+                    undo.append(lambda u=outcome: self._insert(u))
+            except DuplicateUserError as exc:
+                outcome = exc
+            outcomes.append(outcome)
+
+        if not all(isinstance(outcome, dict) for outcome in outcomes):
+            for action in reversed(undo):
+                action()
+            self.next_id = next_id
+        return outcomes
+
+    async def list_users(
+        self, after_id: Optional[int] = None, skip: int = 0, limit: int = 100
+    ) -> List[dict]:
+        # Слот id - 1, поэтому начало страницы находится без поиска;
+        # пропуск удаленных слотов и skip стоят O(числа просмотренных слотов)
+        flags = self.flags
+        slot = max(after_id or 0, 0)
+        page: List[dict] = []
+        while slot < len(flags) and len(page) < limit:
+            if flags[slot] != DELETED:
+                if skip:
+                    skip -= 1
+                else:
+                    page.append(self._row(slot + 1))
+            slot += 1
+        return page
+
+    def store_id(self) -> str:
+        return self._store_id
+
+    async def generation(self) -> int:
+        return self._generation
+
+    async def clear(self) -> None:
+        self._generation += 1
+        self._store_id = new_store_id()
+        self._reset()
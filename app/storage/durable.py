@@ -0,0 +1,453 @@
+"""
+Журнал упреждающей записи (WAL) и снимки для хранилищ в памяти.
+
+Каждое изменение применяется к хранилищу и сразу попадает в буфер
+журнала. Буфер сбрасывается одним write для всех накопленных записей
+(group commit) в отдельном потоке, fsync - по политике WAL_FSYNC:
+
+- always: запрос на запись ждет fsync своей группы, подтвержденное
+  изменение переживает и сбой питания;
+- interval: сброс и fsync раз в WAL_FLUSH_INTERVAL секунд, при сбое
+  теряется не больше последнего интервала;
+- never: сброс раз в интервал, fsync остается операционной системе.
+
+Журнал разбит на сегменты wal-N.log. Снимок snapshot-N.bin содержит все
+изменения сегментов до N: перед снимком начинается новый сегмент, а
+старые сегменты и снимки удаляются, когда новый снимок записан. Снимок -
+столбцы пользователей и готовые ключи индекса поиска, поэтому при запуске
+хранилище собирается целиком, без вставки по одной записи. Затем
+доигрывается хвост журнала, и только после этого хранилище готово.
+"""
+
+import asyncio
+import logging
+import os
+import pickle
+import struct
+import threading
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.storage.base import (
+    USER_FIELDS,
+    BatchOperation,
+    BatchOutcome,
+    StoreState,
+    UserStore,
+    from_micros,
+    to_micros,
+)
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+# Заголовок записи журнала: длина и CRC32 данных
+RECORD_HEADER = struct.Struct("<II")
+SNAPSHOT_MAGIC = b"TMSNAP1\n"
+
+# Изменение: ("put", поля записи), ("del", id) или ("clear", None)
+Change = Tuple[str, object]
+
+
+def _encode(change: Change) -> bytes:
+    kind, value = change
+    if kind == "put":
+        value = tuple(
+            to_micros(value[field]) if field == "created_at" else value[field]
+            for field in USER_FIELDS
+        )
+    payload = pickle.dumps((kind, value), protocol=pickle.HIGHEST_PROTOCOL)
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _decode(payload: bytes) -> Change:
+    kind, value = pickle.loads(payload)
+    if kind == "put":
+        value = dict(zip(USER_FIELDS, value))
+        value["created_at"] = from_micros(value["created_at"])
+    return kind, value
+
+
+def read_records(path: str) -> List[Change]:
+    """
+    Изменения из сегмента журнала.
+    Чтение останавливается на оборванной или поврежденной записи: это
+    хвост, который не успел попасть на диск при сбое.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    changes: List[Change] = []
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(data):
+        length, checksum = RECORD_HEADER.unpack_from(data, offset)
+        payload = data[
+            offset + RECORD_HEADER.size : offset + RECORD_HEADER.size + length
+        ]
+        if len(payload) != length or zlib.crc32(payload) != checksum:
+            break
+        changes.append(_decode(payload))
+        offset += RECORD_HEADER.size + length
+    return changes
+
+
+class DurableUserStore(UserStore):
+    """
+    Хранилище в памяти (InMemoryUserStore или CompactUserStore) с
+    журналом изменений и снимками в каталоге directory.
+
+    - **fsync**: always, interval или never
+    - **flush_interval**: период сброса журнала для interval и never, секунды
+    - **snapshot_every**: число изменений в журнале, после которого
+      в фоне записывается новый снимок
+    """
+
+    def __init__(
+        self,
+        store: UserStore,
+        directory: str,
+        fsync: str = "interval",
+        flush_interval: float = 1.0,
+        snapshot_every: int = 100_000,
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Неизвестная политика fsync: {fsync}")
+        self.store = store
+        self.directory = directory
+        self.fsync = fsync
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+
+        # Буфер, группа ожидающих fsync и таймер сброса; меняются и из
+        # потока записи, поэтому защищены блокировкой
+        self._lock = threading.RLock()
+        self._pending: List[bytes] = []
+        self._group: Optional[Future] = None
+        self._writing = False
+        self._timer: Optional[threading.Timer] = None
+        # Все операции с файлом журнала идут в одном потоке по очереди
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="wal")
+        self._fd: Optional[int] = None
+        self._segment = 0
+        self._since_snapshot = 0
+        self._snapshot_task: Optional[asyncio.Task] = None
+        self._recovery: Optional[asyncio.Task] = None
+        self._ready = False
+        self.error: Optional[BaseException] = None
+
+    def _path(self, kind: str, number: int) -> str:
+        extension = "log" if kind == "wal" else "bin"
+        return os.path.join(self.directory, f"{kind}-{number:010d}.{extension}")
+
+    def _numbers(self, kind: str) -> List[int]:
+        """Номера сегментов журнала или снимков по возрастанию."""
+        numbers = []
+        for name in os.listdir(self.directory):
+            stem, _, extension = name.partition(".")
+            prefix, _, number = stem.partition("-")
+            # Недописанные снимки (.bin.tmp) пропускаются
+            if prefix == kind and number.isdigit() and extension in ("log", "bin"):
+                numbers.append(int(number))
+        return sorted(numbers)
+
+    def _sync_directory(self) -> None:
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # Восстановление при запуске
+
+    def start(self) -> None:
+        if self._recovery is None:
+            self._recovery = asyncio.get_running_loop().create_task(self._recover())
+            self._recovery.add_done_callback(self._recovered)
+
+    def _recovered(self, task: asyncio.Task) -> None:
+        """Ошибка восстановления - в лог и в self.error (а не вечное "recovering")."""
+        if task.cancelled() or task.exception() is None:
+            return
+        self.error = task.exception()
+        logger.error(
+            "Восстановление хранилища из %s не удалось",
+            self.directory,
+            exc_info=self.error,
+        )
+
+    def is_ready(self) -> bool:
+        return self._ready and self.error is None
+
+    def failure(self) -> Optional[str]:
+        if self.error is None:
+            return None
+        return f"store failed: {type(self.error).__name__}: {self.error}"
+
+    async def _wait_ready(self) -> None:
+        if not self._ready:
+            self.start()
+            await asyncio.shield(self._recovery)
+
+    def _load(self) -> List[Change]:
+        """Загрузка последнего снимка и чтение хвоста журнала (в потоке)."""
+        os.makedirs(self.directory, exist_ok=True)
+        snapshots = self._numbers("snapshot")
+        first_segment = 0
+        if snapshots:
+            first_segment = snapshots[-1]
+            with open(self._path("snapshot", first_segment), "rb") as f:
+                if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                    raise ValueError("Неизвестный формат снимка хранилища")
+                self.store.restore_state(StoreState(*pickle.load(f)))
+
+        changes: List[Change] = []
+        segments = self._numbers("wal")
+        for number in segments:
+            if number >= first_segment:
+                changes.extend(read_records(self._path("wal", number)))
+        self._segment = max(segments + [first_segment]) + 1
+        return changes
+
+    async def _recover(self) -> None:
+        changes = await run_in_threadpool(self._load)
+        store = self.store
+        for position, (kind, value) in enumerate(changes):
+            # Доигрывание идемпотентно: put - полная запись, del - по id
+            if kind == "put":
+                if await store.get(value["id"]) is None:
+                    store._insert(value)
+                else:
+                    store._replace(value["id"], value)
+            elif kind == "del":
+                await store.delete(value)
+            else:
+                await store.clear()
+            if position % 1000 == 999:
+                await asyncio.sleep(0)  # Не задерживаем liveness-пробы
+
+        await asyncio.wrap_future(self._writer.submit(self._open_segment))
+        self._since_snapshot = len(changes)
+        self._ready = True
+
+    # Запись журнала
+
+    def _open_segment(self) -> None:
+        """Закрытие текущего сегмента и начало следующего (в потоке записи)."""
+        if self._fd is not None:
+            os.fsync(self._fd)
+            os.close(self._fd)
+        self._fd = os.open(
+            self._path("wal", self._segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND
+        )
+        self._sync_directory()
+
+    def _write(self, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self._fd, view) :]
+        if self.fsync != "never":
+            os.fsync(self._fd)
+
+    def _flush(self) -> None:
+        """Передача накопленных записей в поток записи одним блоком."""
+        with self._lock:
+            self._timer = None
+            if not self._pending:
+                return
+            data = b"".join(self._pending)
+            self._pending = []
+            group, self._group = self._group, None
+            self._writing = True
+            # Под блокировкой: блоки уходят в поток записи в порядке буфера
+            job = self._writer.submit(self._write, data)
+        job.add_done_callback(lambda job: self._flushed(job, group))
+
+    def _flushed(self, job: Future, group: Optional[Future]) -> None:
+        error = job.exception()
+        if error is not None:
+            self.error = error
+        if group is not None:
+            if error is None:
+                group.set_result(None)
+            else:
+                group.set_exception(error)
+        with self._lock:
+            self._writing = False
+            # Пока шла запись, накопилась следующая группа
+            if self.fsync == "always" and self._pending:
+                self._flush()
+
+    async def _commit(self, changes: List[Change]) -> None:
+        """Запись примененных изменений в журнал (до первого await)."""
+        if not changes:
+            return
+        records = [_encode(change) for change in changes]
+        with self._lock:
+            self._pending.extend(records)
+            self._since_snapshot += len(records)
+            group = None
+            if self.fsync == "always":
+                if self._group is None:
+                    self._group = Future()
+                group = self._group
+                if not self._writing:
+                    self._flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if self._since_snapshot >= self.snapshot_every and self._snapshot_task is None:
+            self._snapshot_task = asyncio.get_running_loop().create_task(
+                self.snapshot()
+            )
+        if group is not None:
+            await asyncio.wrap_future(group)
+
+    async def _before_write(self) -> None:
+        await self._wait_ready()
+        if self.error is not None:
+            raise self.error
+
+    # Снимки
+
+    def _write_snapshot(self, number: int, state: StoreState) -> None:
+        """Запись снимка и удаление покрытых им файлов (в потоке)."""
+        path = self._path("snapshot", number)
+        with open(path + ".tmp", "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            pickle.dump(tuple(state), f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self._sync_directory()
+        for kind in ("snapshot", "wal"):
+            for old in self._numbers(kind):
+                if old < number:
+                    os.remove(self._path(kind, old))
+
+    async def snapshot(self) -> None:
+        """Новый сегмент журнала и снимок хранилища на момент его начала."""
+        await self._wait_ready()
+        try:
+            with self._lock:
+                self._since_snapshot = 0
+                self._segment += 1
+                number = self._segment
+                self._flush()
+                rotated = self._writer.submit(self._open_segment)
+            await asyncio.wrap_future(rotated)
+            # Изменения после начала сегмента есть в журнале, поэтому снимок
+            # может их как содержать, так и не содержать
+            build = self.store.capture_state()
+            state = await run_in_threadpool(build)
+            await run_in_threadpool(self._write_snapshot, number, state)
+        finally:
+            self._snapshot_task = None
+
+    def _close_journal(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._flush()
+        self._writer.shutdown(wait=True)
+        if self._fd is not None:
+            os.fsync(self._fd)
+            os.close(self._fd)
+            self._fd = None
+
+    # Интерфейс UserStore
+
+    async def create(self, user: dict) -> dict:
+        await self._before_write()
+        new_user = await self.store.create(user)
+        await self._commit([("put", new_user)])
+        return new_user
+
+    async def create_many(self, users: List[dict]) -> List[BatchOutcome]:
+        await self._before_write()
+        outcomes = await self.store.create_many(users)
+        await self._commit(
+            [("put", outcome) for outcome in outcomes if isinstance(outcome, dict)]
+        )
+        return outcomes
+
+    async def update(self, user_id: int, changes: dict) -> Optional[dict]:
+        await self._before_write()
+        stored_user = await self.store.update(user_id, changes)
+        if stored_user is not None:
+            await self._commit([("put", stored_user)])
+        return stored_user
+
+    async def delete(self, user_id: int) -> Optional[dict]:
+        await self._before_write()
+        deleted_user = await self.store.delete(user_id)
+        if deleted_user is not None:
+            await self._commit([("del", user_id)])
+        return deleted_user
+
+    async def apply_batch(self, operations: List[BatchOperation]) -> List[BatchOutcome]:
+        await self._before_write()
+        outcomes = await self.store.apply_batch(operations)
+        if all(isinstance(outcome, dict) for outcome in outcomes):
+            await self._commit(
+                [
+                    ("del", outcome["id"])
+                    if operation.op == "delete"
+                    else ("put", outcome)
+                    for operation, outcome in zip(operations, outcomes)
+                ]
+            )
+        return outcomes
+
+    async def clear(self) -> None:
+        await self._before_write()
+        await self.store.clear()
+        await self._commit([("clear", None)])
+
+    async def get(self, user_id: int) -> Optional[dict]:
+        await self._wait_ready()
+        return await self.store.get(user_id)
+
+    async def get_many(self, user_ids: List[int]) -> List[Optional[dict]]:
+        await self._wait_ready()
+        return await self.store.get_many(user_ids)
+
+    async def get_by_username(self, username: str) -> Optional[dict]:
+        await self._wait_ready()
+        return await self.store.get_by_username(username)
+
+    async def check_unique(self, user: dict) -> None:
+        await self._wait_ready()
+        await self.store.check_unique(user)
+
+    async def list_users(
+        self, after_id: Optional[int] = None, skip: int = 0, limit: int = 100
+    ) -> List[dict]:
+        await self._wait_ready()
+        return await self.store.list_users(after_id, skip=skip, limit=limit)
+
+    async def search(self, query: str, limit: int = 10) -> List[dict]:
+        await self._wait_ready()
+        return await self.store.search(query, limit)
+
+    def store_id(self) -> str:
+        # Журнал сохраняет id и версии, но поколение после перезапуска
+        # считается заново; идентификатор хранилища в памяти - новый
+        return self.store.store_id()
+
+    async def generation(self) -> int:
+        await self._wait_ready()
+        return await self.store.generation()
+
+    async def close(self) -> None:
+        if self._snapshot_task is not None and not self._snapshot_task.done():
+            try:
+                await self._snapshot_task
+            except RuntimeError:
+                pass  # Задача осталась от уже закрытого цикла событий
+        self._close_journal()
+        await self.store.close()
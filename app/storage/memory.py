@@ -0,0 +1,240 @@
+"""
+Хранилище пользователей в памяти процесса.
+Данные теряются при перезапуске и не разделяются между воркерами.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from operator import itemgetter
+from typing import Callable, Dict, List, Optional
+
+from app.storage.base import (
+    USER_FIELDS,
+    BatchOperation,
+    BatchOutcome,
+    DuplicateUserError,
+    StoreState,
+    UserStore,
+    from_micros,
+    new_store_id,
+    normalize_key,
+    to_micros,
+)
+from app.storage.search import UserSearchIndex
+
+
+class InMemoryUserStore(UserStore):
+    """
+    Хранилище на словарях.
+
+    Вторичные индексы (нормализованный email/username -> id) поддерживаются
+    синхронно с таблицей, поэтому проверка уникальности и поиск по username
+    выполняются за O(1). Отсортированный список id позволяет выбирать
+    страницы без копирования всей таблицы: id выдаются по возрастанию,
+    поэтому вставка - это append, а поиск позиции - bisect.
+    Каждое изменение индексов увеличивает поколение хранилища.
+    Индекс поиска подсказок обновляется вместе с остальными индексами.
+    Записи не изменяются на месте: обновление заменяет словарь целиком,
+    поэтому для снимка достаточно скопировать ссылки на записи.
+    """
+
+    def __init__(self):
+        self.users: Dict[int, dict] = {}
+        self.email_index: Dict[str, int] = {}
+        self.username_index: Dict[str, int] = {}
+        self.user_ids: List[int] = []
+        self.next_id = 1
+        self.search_index = UserSearchIndex()
+        self._generation = 0
+        self._store_id = new_store_id()
+
+    def _index(self, user: dict) -> None:
+        """Добавление пользователя во вторичные индексы."""
+        self._generation += 1
+        self.email_index[normalize_key(user["email"])] = user["id"]
+        self.username_index[normalize_key(user["username"])] = user["id"]
+        self.search_index.add(user)
+
+    def _unindex(self, user: dict) -> None:
+        """Удаление пользователя из вторичных индексов."""
+        self._generation += 1
+        self.email_index.pop(normalize_key(user["email"]), None)
+        self.username_index.pop(normalize_key(user["username"]), None)
+        self.search_index.remove(user)
+
+    def _check_unique(self, user: dict, user_id: Optional[int] = None) -> None:
+        """Проверка уникальности email и username (кроме самого user_id)."""
+        if "email" in user:
+            owner_id = self.email_index.get(normalize_key(user["email"]))
+            if owner_id is not None and owner_id != user_id:
+                raise DuplicateUserError("email")
+        if "username" in user:
+            owner_id = self.username_index.get(normalize_key(user["username"]))
+            if owner_id is not None and owner_id != user_id:
+                raise DuplicateUserError("username")
+
+    def _insert(self, user: dict) -> None:
+        """Сохранение записи с уже назначенным id во всех индексах."""
+        self.users[user["id"]] = user
+        self._index(user)
+        if self.user_ids and self.user_ids[-1] > user["id"]:
+            insort(self.user_ids, user["id"])  # Восстановление после отката
+        else:
+            self.user_ids.append(user["id"])
+        self.next_id = max(self.next_id, user["id"] + 1)
+
+    def _remove(self, user_id: int) -> dict:
+        """Удаление записи из таблицы и всех индексов."""
+        user = self.users.pop(user_id)
+        self._unindex(user)
+        del self.user_ids[bisect_left(self.user_ids, user_id)]
+        return user
+
+    def _create(self, user: dict) -> dict:
+        self._check_unique(user)
+        new_user = {**user, "id": self.next_id, "version": 1}
+        self._insert(new_user)
+        return new_user
+
+    def _update(self, user_id: int, changes: dict) -> Optional[dict]:
+        stored_user = self.users.get(user_id)
+        if stored_user is None:
+            return None
+        self._check_unique(changes, user_id)
+
+        updated_user = {**stored_user, **changes}
+        updated_user["version"] += 1
+        self._unindex(stored_user)
+        self.users[user_id] = updated_user
+        self._index(updated_user)
+        return updated_user
+
+    def _replace(self, user_id: int, snapshot: dict) -> None:
+        """Восстановление записи из снимка (откат обновления)."""
+        self._unindex(self.users[user_id])
+        self.users[user_id] = dict(snapshot)
+        self._index(self.users[user_id])
+
+    def capture_state(self) -> Callable[[], StoreState]:
+        """
+        Согласованный снимок для сохранения на диск.
+
+        Сразу копируются только ссылки на записи и блоки индекса поиска,
+        столбцы собирает возвращаемая функция - ее можно вызвать в потоке.
+        """
+        users = list(self.users.values())
+        search_blocks = self.search_index.keys.copy_blocks()
+        next_id = self.next_id
+
+        def build() -> StoreState:
+            users.sort(key=itemgetter("id"))  # После откатов порядок мог сбиться
+            columns = {field: [user[field] for user in users] for field in USER_FIELDS}
+            columns["created_at"] = array("q", map(to_micros, columns["created_at"]))
+            columns["id"] = array("q", columns["id"])
+            columns["version"] = array("L", columns["version"])
+            return StoreState(next_id, columns, search_blocks)
+
+        return build
+
+    def restore_state(self, state: StoreState) -> None:
+        """Загрузка снимка в пустое хранилище: индексы строятся целиком."""
+        columns = {
+            **state.columns,
+            "created_at": map(from_micros, state.columns["created_at"]),
+        }
+        users = [
+            dict(zip(USER_FIELDS, row))
+            for row in zip(*(columns[field] for field in USER_FIELDS))
+        ]
+        self.users = {user["id"]: user for user in users}
+        self.user_ids = [user["id"] for user in users]
+        self.email_index = {normalize_key(user["email"]): user["id"] for user in users}
+        self.username_index = {
+            normalize_key(user["username"]): user["id"] for user in users
+        }
+        self.search_index = UserSearchIndex.from_blocks(state.search_blocks)
+        self.next_id = state.next_id
+        self._generation += 1
+
+    async def create(self, user: dict) -> dict:
+        return self._create(user)
+
+    async def get(self, user_id: int) -> Optional[dict]:
+        return self.users.get(user_id)
+
+    async def get_many(self, user_ids: List[int]) -> List[Optional[dict]]:
+        users = self.users
+        return [users.get(user_id) for user_id in user_ids]
+
+    async def get_by_username(self, username: str) -> Optional[dict]:
+        user_id = self.username_index.get(normalize_key(username))
+        return None if user_id is None else self.users[user_id]
+
+    async def check_unique(self, user: dict) -> None:
+        self._check_unique(user)
+
+    async def search(self, query: str, limit: int = 10) -> List[dict]:
+        return [self.users[uid] for uid in self.search_index.search(query, limit)]
+
+    async def update(self, user_id: int, changes: dict) -> Optional[dict]:
+        return self._update(user_id, changes)
+
+    async def delete(self, user_id: int) -> Optional[dict]:
+        if user_id not in self.users:
+            return None
+        return self._remove(user_id)
+
+    async def apply_batch(self, operations: List[BatchOperation]) -> List[BatchOutcome]:
+        # Операции применяются синхронно (без await), поэтому другие запросы
+        # не видят промежуточного состояния. Для отката ведется журнал отмены.
+        outcomes: List[BatchOutcome] = []
+        undo: List[Callable[[], None]] = []
+        next_id = self.next_id
+
+        for operation in operations:
+            user_id = operation.user_id
+            try:
+                if operation.op == "create":
+                    outcome = dict(self._create(operation.data))
+                    undo.append(lambda uid=outcome["id"]: self._remove(uid))
+                elif user_id not in self.users:
+                    outcome = None
+                elif operation.op == "update":
+                    snapshot = dict(self.users[user_id])
+                    outcome = dict(self._update(user_id, operation.data))
+                    undo.append(lambda uid=user_id, s=snapshot: self._replace(uid, s))
+                else:
+                    outcome = self._remove(user_id)
+                    undo.append(lambda u=outcome: self._insert(u))
+            except DuplicateUserError as exc:
+                outcome = exc
+            outcomes.append(outcome)
+
+        if not all(isinstance(outcome, dict) for outcome in outcomes):
+            for action in reversed(undo):
+                action()
+            self.next_id = next_id
+        return outcomes
+
+    async def list_users(
+        self, after_id: Optional[int] = None, skip: int = 0, limit: int = 100
+    ) -> List[dict]:
+        start = bisect_right(self.user_ids, after_id) if after_id is not None else 0
+        start += skip
+        return [self.users[uid] for uid in self.user_ids[start : start + limit]]
+
+    def store_id(self) -> str:
+        return self._store_id
+
+    async def generation(self) -> int:
+        return self._generation
+
+    async def clear(self) -> None:
+        self._generation += 1
+        self._store_id = new_store_id()
+        self.users.clear()
+        self.email_index.clear()
+        self.username_index.clear()
+        self.user_ids.clear()
+        self.search_index = UserSearchIndex()
+        self.next_id = 1
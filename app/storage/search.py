@@ -0,0 +1,147 @@
+"""
+Поиск пользователей по началу username, full_name и отдельных слов в них.
+
+Индекс - отсортированный список ключей "слово\\0id", разбитый на блоки:
+поиск - это bisect по границам блоков и bisect внутри блока, после чего
+совпадения идут подряд, поэтому первые N находятся за O(log n + N).
+Вставка и удаление сдвигают только один блок, а не весь список.
+"""
+
+import re
+from bisect import bisect_left, insort
+from typing import Iterator, List, Optional, Set
+
+from app.storage.base import normalize_key
+
+# Границы слов: "john_doe" ищется и по "john", и по "doe"
+WORD_SPLIT = re.compile(r"[\W_]+")
+
+# Размер блока отсортированного списка (как load в sortedcontainers)
+BLOCK_SIZE = 1000
+
+
+def search_key(query: str) -> str:
+    """Нормализация поискового запроса."""
+    return normalize_key(query).strip()
+
+
+def search_tokens(username: str, full_name: Optional[str]) -> Set[str]:
+    """Слова, по началу которых находится пользователь."""
+    tokens = set()
+    for value in (username, full_name):
+        if value:
+            key = normalize_key(value)
+            tokens.add(key)
+            tokens.update(word for word in WORD_SPLIT.split(key) if word)
+    return tokens
+
+
+def user_matches(user: dict, query: str) -> bool:
+    """Совпадение пользователя с нормализованным запросом."""
+    tokens = search_tokens(user["username"], user["full_name"])
+    return any(token.startswith(query) for token in tokens)
+
+
+class SortedKeyList:
+    """Отсортированный список строк, хранящийся блоками."""
+
+    def __init__(self, keys: Optional[List[str]] = None):
+        keys = sorted(keys or [])
+        self.blocks: List[List[str]] = [
+            keys[i : i + BLOCK_SIZE] for i in range(0, len(keys), BLOCK_SIZE)
+        ]
+        self.maxes: List[str] = [block[-1] for block in self.blocks]
+
+    def copy_blocks(self) -> List[List[str]]:
+        """Копия блоков (ссылки на строки, без копирования самих строк)."""
+        return [block[:] for block in self.blocks]
+
+    def __len__(self) -> int:
+        return sum(len(block) for block in self.blocks)
+
+    def add(self, key: str) -> None:
+        if not self.blocks:
+            self.blocks.append([key])
+            self.maxes.append(key)
+            return
+        position = min(bisect_left(self.maxes, key), len(self.blocks) - 1)
+        block = self.blocks[position]
+        insort(block, key)
+        self.maxes[position] = block[-1]
+        if len(block) > 2 * BLOCK_SIZE:
+            self.blocks.insert(position + 1, block[BLOCK_SIZE:])
+            del block[BLOCK_SIZE:]
+            self.maxes.insert(position, block[-1])
+
+    def discard(self, key: str) -> None:
+        position = bisect_left(self.maxes, key)
+        if position == len(self.blocks):
+            return
+        block = self.blocks[position]
+        index = bisect_left(block, key)
+        if index == len(block) or block[index] != key:
+            return
+        del block[index]
+        if block:
+            self.maxes[position] = block[-1]
+        else:
+            del self.blocks[position]
+            del self.maxes[position]
+
+    def iter_from(self, key: str) -> Iterator[str]:
+        """Ключи не меньше key по возрастанию."""
+        position = bisect_left(self.maxes, key)
+        for block_index in range(position, len(self.blocks)):
+            block = self.blocks[block_index]
+            start = bisect_left(block, key) if block_index == position else 0
+            yield from block[start:]
+
+
+class UserSearchIndex:
+    """Инкрементальный индекс поиска пользователей по началу слов."""
+
+    def __init__(self, users: Optional[List[dict]] = None):
+        self.keys = SortedKeyList(
+            [
+                self._key(token, user["id"])
+                for user in users or []
+                for token in search_tokens(user["username"], user["full_name"])
+            ]
+        )
+
+    @classmethod
+    def from_blocks(cls, blocks: List[List[str]]) -> "UserSearchIndex":
+        """Индекс из готовых отсортированных ключей (загрузка снимка)."""
+        index = cls()
+        blocks = [block for block in blocks if block]
+        index.keys.blocks = blocks
+        index.keys.maxes = [block[-1] for block in blocks]
+        return index
+
+    @staticmethod
+    def _key(token: str, user_id: int) -> str:
+        # \0 меньше любого символа слова, поэтому "ann" идет раньше "anna";
+        # id с ведущими нулями - одинаковые слова упорядочены по id
+        return f"{token}\0{user_id:010d}"
+
+    def add(self, user: dict) -> None:
+        for token in search_tokens(user["username"], user["full_name"]):
+            self.keys.add(self._key(token, user["id"]))
+
+    def remove(self, user: dict) -> None:
+        for token in search_tokens(user["username"], user["full_name"]):
+            self.keys.discard(self._key(token, user["id"]))
+
+    def search(self, query: str, limit: int) -> List[int]:
+        """id первых limit пользователей, у которых слово начинается с query."""
+        query = search_key(query)
+        found: List[int] = []
+        seen: Set[int] = set()
+        for key in self.keys.iter_from(query):
+            if not key.startswith(query) or len(found) == limit:
+                break
+            user_id = int(key[key.rindex("\0") + 1 :])
+            if user_id not in seen:
+                seen.add(user_id)
+                found.append(user_id)
+        return found
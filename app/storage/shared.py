@@ -0,0 +1,356 @@
+"""
+Хранилище пользователей, общее для воркеров uvicorn на одном хосте.
+
+Данные лежат в файле, отображенном в память (по умолчанию в /dev/shm),
+в виде журнала изменений: каждая запись журнала - это новая версия
+пользователя или удаление. Каждый воркер держит локальную копию в
+InMemoryUserStore и перед любой операцией дочитывает хвост журнала.
+
+- Чтение не берет блокировок: заголовок файла публикует конец журнала
+  только после того, как сами записи уже записаны.
+- Запись выполняется под межпроцессной блокировкой (flock): воркер
+  дочитывает журнал, проверяет и применяет изменения к своей копии и
+  дописывает их в журнал одним блоком, поэтому пакет виден атомарно.
+- Когда журнал заполняется, он переписывается снимком текущих данных.
+  Эпоха в заголовке работает как seqlock: читатель, заметивший смену
+  эпохи, перечитывает журнал целиком. Нечетная эпоха - сжатие идет;
+  если она остается нечетной под блокировкой, писатель упал, и журнал
+  переписывается из локальной копии того, кто взял блокировку.
+- Ожидание блокировки и сжатие идут в пуле потоков, а не в event loop.
+"""
+
+import asyncio
+import fcntl
+import json
+import mmap
+import os
+import struct
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.storage.base import (
+    BatchOperation,
+    BatchOutcome,
+    DuplicateUserError,
+    UserStore,
+    new_store_id,
+)
+from app.storage.memory import InMemoryUserStore
+
+MAGIC = b"TMUSERS1"
+# magic, эпоха, конец журнала, следующий id, поколение
+HEADER = struct.Struct("<8sQQQQ")
+HEADER_SIZE = 64
+# Идентификатор набора данных (UserStore.store_id) - сразу за заголовком,
+# общий для всех воркеров; меняется только при создании файла и clear()
+STORE_ID = struct.Struct("<8s")
+STORE_ID_OFFSET = HEADER.size
+ENTRY_LENGTH = struct.Struct("<I")
+
+# Изменение: ("put", запись) или ("del", id)
+Change = Tuple[str, object]
+
+
+class SharedStoreFullError(Exception):
+    """Данные не помещаются в файл общего хранилища даже после сжатия."""
+
+
+class SharedStoreCorruptedError(Exception):
+    """Писатель упал посреди сжатия, и восстановить журнал не из чего."""
+
+
+def _encode(change: Change) -> bytes:
+    kind, value = change
+    if kind == "put":
+        value = {**value, "created_at": value["created_at"].isoformat()}
+    payload = json.dumps([kind, value], separators=(",", ":")).encode()
+    return ENTRY_LENGTH.pack(len(payload)) + payload
+
+
+def _decode(payload: bytes) -> Change:
+    kind, value = json.loads(payload)
+    if kind == "put":
+        value["created_at"] = datetime.fromisoformat(value["created_at"])
+    return kind, value
+
+
+class SharedMemoryUserStore(UserStore):
+    """
+    Журнал изменений в общей памяти + локальная копия в каждом процессе.
+
+    - **path**: файл журнала (в /dev/shm он не попадает на диск)
+    - **size**: размер файла в байтах
+    """
+
+    def __init__(self, path: str, size: int = 256 * 2**20):
+        self.path = path
+        self.size = size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._flocked():
+            if os.fstat(self.fd).st_size < size:
+                os.ftruncate(self.fd, size)
+            self.mm = mmap.mmap(self.fd, size)
+            if self.mm[: len(MAGIC)] != MAGIC:
+                self._write_header(0, HEADER_SIZE, 1, 0)
+            if not any(self.mm[STORE_ID_OFFSET : STORE_ID_OFFSET + STORE_ID.size]):
+                self._write_store_id()
+        self.local = InMemoryUserStore()
+        self._epoch = -1
+        self._position = HEADER_SIZE
+        self._write_lock = asyncio.Lock()
+        self._compacting = False
+
+    @contextmanager
+    def _flocked(self) -> Iterator[None]:
+        """Межпроцессная блокировка без event loop (только при открытии файла)."""
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    @asynccontextmanager
+    async def _locked(self) -> AsyncIterator[None]:
+        """
+        Межпроцессная блокировка записи.
+
+        flock - на открытый файл, а не на поток, поэтому писатели своего
+        процесса сначала встают в очередь asyncio.Lock. Ожидание flock
+        идет в пуле потоков: другой воркер может держать его, пока сжимает
+        журнал, и event loop не должен стоять все это время.
+        """
+        async with self._write_lock:
+            await run_in_threadpool(fcntl.flock, self.fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def _header(self) -> Tuple[int, int, int, int]:
+        _, epoch, end, next_id, generation = HEADER.unpack_from(self.mm)
+        return epoch, end, next_id, generation
+
+    def _write_header(self, epoch: int, end: int, next_id: int, generation: int):
+        HEADER.pack_into(self.mm, 0, MAGIC, epoch, end, next_id, generation)
+
+    def _write_store_id(self) -> None:
+        STORE_ID.pack_into(self.mm, STORE_ID_OFFSET, new_store_id().encode())
+
+    def _apply(self, change: Change) -> None:
+        """Применение изменения из журнала к локальной копии."""
+        kind, value = change
+        local = self.local
+        if kind == "del":
+            if value in local.users:
+                local._remove(value)
+        elif value["id"] in local.users:
+            local._replace(value["id"], value)
+        else:
+            local._insert(value)
+
+    async def _sync(self, locked: bool = False) -> None:
+        """
+        Дочитывание журнала, записанного другими процессами.
+
+        - **locked**: вызывающий держит блокировку записи
+        """
+        if self._compacting and not locked:
+            # Журнал переписывает наш же процесс: локальная копия актуальна
+            return
+        while True:
+            epoch, end, next_id, generation = self._header()
+            if epoch % 2:
+                if locked:
+                    # Нечетная эпоха под нашей блокировкой - писатель упал
+                    await self._repair(epoch, end, generation)
+                    return
+                # Журнал переписывается прямо сейчас: ждем окончания записи
+                async with self._locked():
+                    await self._sync(locked=True)
+                return
+            if epoch == self._epoch and end == self._position:
+                return
+            start = self._position if epoch == self._epoch else HEADER_SIZE
+            data = self.mm[start:end]
+            if self._header()[0] != epoch:
+                continue  # Журнал переписали, пока мы его читали
+
+            if epoch != self._epoch:
+                self.local = InMemoryUserStore()
+            offset = 0
+            while offset < len(data):
+                (length,) = ENTRY_LENGTH.unpack_from(data, offset)
+                offset += ENTRY_LENGTH.size
+                self._apply(_decode(data[offset : offset + length]))
+                offset += length
+            self.local.next_id = max(self.local.next_id, next_id)
+            self._epoch, self._position = epoch, end
+            return
+
+    async def _reload(self) -> None:
+        """Отбрасывание локальной копии и чтение журнала с начала."""
+        self._epoch = -1
+        await self._sync(locked=True)
+
+    async def _repair(self, epoch: int, end: int, generation: int) -> None:
+        """
+        Восстановление журнала после писателя, упавшего посреди сжатия.
+
+        Пока эпоха нечетная, в заголовке остается конец журнала до сжатия.
+        Если локальная копия дочитана ровно до него, в ней все
+        опубликованные данные, и журнал переписывается из нее. Иначе
+        восстановить данные нечем - тогда ошибка, а не вечное ожидание.
+        """
+        if (self._epoch, self._position) != (epoch - 1, end):
+            raise SharedStoreCorruptedError(
+                "Журнал общего хранилища не дописан, а локальная копия устарела"
+            )
+        await self._compact(epoch - 1, end, generation + 1)
+
+    def _write_snapshot(self, epoch: int, end: int, generation: int) -> int:
+        """Запись снимка локальной копии поверх журнала; возвращает новый конец."""
+        entries = b"".join(_encode(("put", user)) for user in self.local.users.values())
+        if HEADER_SIZE + len(entries) > self.size:
+            raise SharedStoreFullError("Данные не помещаются в общее хранилище")
+        next_id = self.local.next_id
+        self._write_header(epoch + 1, end, next_id, generation)
+        self.mm[HEADER_SIZE : HEADER_SIZE + len(entries)] = entries
+        new_end = HEADER_SIZE + len(entries)
+        self._write_header(epoch + 2, new_end, next_id, generation)
+        return new_end
+
+    async def _compact(self, epoch: int, end: int, generation: int) -> None:
+        """Перезапись журнала снимком текущих данных локальной копии."""
+        # Сериализация всех записей - в пуле потоков; читатели этого
+        # процесса тем временем отвечают из локальной копии
+        self._compacting = True
+        try:
+            new_end = await run_in_threadpool(
+                self._write_snapshot, epoch, end, generation
+            )
+        finally:
+            self._compacting = False
+        self._epoch, self._position = epoch + 2, new_end
+
+    async def _commit(self, changes: List[Change]) -> None:
+        """Публикация изменений, уже примененных к локальной копии."""
+        if not changes:
+            return
+        epoch, end, _, generation = self._header()
+        entries = b"".join(_encode(change) for change in changes)
+        try:
+            if end + len(entries) > self.size:
+                await self._compact(epoch, end, generation + 1)
+                return
+        except SharedStoreFullError:
+            await self._reload()  # Откат локальной копии к опубликованным данным
+            raise
+        self.mm[end : end + len(entries)] = entries
+        # Конец журнала публикуется после записи самих изменений
+        self._write_header(
+            epoch, end + len(entries), self.local.next_id, generation + 1
+        )
+        self._position = end + len(entries)
+
+    async def create(self, user: dict) -> dict:
+        async with self._locked():
+            await self._sync(locked=True)
+            new_user = self.local._create(user)
+            await self._commit([("put", new_user)])
+        return new_user
+
+    async def create_many(self, users: List[dict]) -> List[BatchOutcome]:
+        outcomes: List[BatchOutcome] = []
+        async with self._locked():
+            await self._sync(locked=True)
+            for user in users:
+                try:
+                    outcomes.append(self.local._create(user))
+                except DuplicateUserError as exc:
+                    outcomes.append(exc)
+            await self._commit(
+                [("put", outcome) for outcome in outcomes if isinstance(outcome, dict)]
+            )
+        return outcomes
+
+    async def update(self, user_id: int, changes: dict) -> Optional[dict]:
+        async with self._locked():
+            await self._sync(locked=True)
+            stored_user = self.local._update(user_id, changes)
+            if stored_user is not None:
+                await self._commit([("put", stored_user)])
+        return stored_user
+
+    async def delete(self, user_id: int) -> Optional[dict]:
+        async with self._locked():
+            await self._sync(locked=True)
+            if user_id not in self.local.users:
+                return None
+            deleted_user = self.local._remove(user_id)
+            await self._commit([("del", user_id)])
+        return deleted_user
+
+    async def apply_batch(self, operations: List[BatchOperation]) -> List[BatchOutcome]:
+        async with self._locked():
+            await self._sync(locked=True)
+            # Пакет применяется к локальной копии атомарно (с откатом);
+            # в результатах - копии записей на момент каждой операции
+            outcomes = await self.local.apply_batch(operations)
+            if all(isinstance(outcome, dict) for outcome in outcomes):
+                await self._commit(
+                    [
+                        ("del", outcome["id"])
+                        if operation.op == "delete"
+                        else ("put", outcome)
+                        for operation, outcome in zip(operations, outcomes)
+                    ]
+                )
+        return outcomes
+
+    async def get(self, user_id: int) -> Optional[dict]:
+        await self._sync()
+        return await self.local.get(user_id)
+
+    async def get_many(self, user_ids: List[int]) -> List[Optional[dict]]:
+        await self._sync()
+        return await self.local.get_many(user_ids)
+
+    async def get_by_username(self, username: str) -> Optional[dict]:
+        await self._sync()
+        return await self.local.get_by_username(username)
+
+    async def check_unique(self, user: dict) -> None:
+        await self._sync()
+        await self.local.check_unique(user)
+
+    async def list_users(
+        self, after_id: Optional[int] = None, skip: int = 0, limit: int = 100
+    ) -> List[dict]:
+        await self._sync()
+        return await self.local.list_users(after_id, skip=skip, limit=limit)
+
+    async def search(self, query: str, limit: int = 10) -> List[dict]:
+        await self._sync()
+        return await self.local.search(query, limit)
+
+    def store_id(self) -> str:
+        return STORE_ID.unpack_from(self.mm, STORE_ID_OFFSET)[0].decode()
+
+    async def generation(self) -> int:
+        # Поколение общее: локальные счетчики воркеров не совпадают
+        return self._header()[3]
+
+    async def clear(self) -> None:
+        async with self._locked():
+            epoch, _, _, generation = self._header()
+            self.local = InMemoryUserStore()
+            self._write_store_id()
+            self._write_header(epoch + 2, HEADER_SIZE, 1, generation + 1)
+            self._epoch, self._position = epoch + 2, HEADER_SIZE
+
+    async def close(self) -> None:
+        self.mm.close()
+        os.close(self.fd)
@@ -0,0 +1,532 @@
+"""
+Хранилище пользователей в SQLite.
+Переживает перезапуск и может разделяться между несколькими воркерами
+uvicorn на одном хосте.
+
+Запросы выполняются в пуле потоков (run_in_threadpool), чтобы не блокировать
+event loop. Соединения берутся из ограниченного пула, база работает в режиме
+WAL (читатели не блокируются писателем), а SQL запросы - константы, поэтому
+sqlite3 переиспользует подготовленные выражения из кеша каждого соединения.
+"""
+
+import queue
+import secrets
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.storage.base import (
+    BatchOperation,
+    BatchOutcome,
+    DuplicateUserError,
+    UserStore,
+    normalize_key,
+)
+from app.storage.search import search_key, search_tokens
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT NOT NULL,
+    email_key TEXT NOT NULL UNIQUE,
+    username TEXT NOT NULL,
+    username_key TEXT NOT NULL UNIQUE,
+    full_name TEXT,
+    created_at TEXT NOT NULL,
+    is_active INTEGER NOT NULL DEFAULT 1,
+    hashed_password TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1
+);
+
+-- Поколение хранилища общее для всех воркеров и меняется в той же
+-- транзакции, что и данные (откат транзакции откатывает и поколение)
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('generation', 0);
+
+CREATE TRIGGER IF NOT EXISTS users_generation_insert AFTER INSERT ON users
+BEGIN
+    UPDATE store_meta SET value = value + 1 WHERE key = 'generation';
+END;
+CREATE TRIGGER IF NOT EXISTS users_generation_update AFTER UPDATE ON users
+BEGIN
+    UPDATE store_meta SET value = value + 1 WHERE key = 'generation';
+END;
+CREATE TRIGGER IF NOT EXISTS users_generation_delete AFTER DELETE ON users
+BEGIN
+    UPDATE store_meta SET value = value + 1 WHERE key = 'generation';
+END;
+
+-- Индекс поиска подсказок, как UserSearchIndex в памяти: слова username и
+-- full_name (search_tokens), по началу которых находится пользователь.
+-- Слова считаются в Python при записи; при удалении строки - триггер
+CREATE TABLE IF NOT EXISTS user_search (
+    token TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (token, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS user_search_user_id ON user_search (user_id);
+CREATE TRIGGER IF NOT EXISTS users_search_delete AFTER DELETE ON users
+BEGIN
+    DELETE FROM user_search WHERE user_id = old.id;
+END;
+"""
+
+ADD_VERSION_COLUMN = "ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 1"
+COLUMNS = (
+    "id, email, username, full_name, created_at, is_active, hashed_password, version"
+)
+
+INSERT_USER = (
+    "INSERT INTO users (email, email_key, username, username_key, full_name, "
+    "created_at, is_active, hashed_password) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+SELECT_BY_ID = f"SELECT {COLUMNS} FROM users WHERE id = ?"
+SELECT_BY_USERNAME = f"SELECT {COLUMNS} FROM users WHERE username_key = ?"
+SELECT_TAKEN = (
+    "SELECT EXISTS (SELECT 1 FROM users WHERE email_key = ?), "
+    "EXISTS (SELECT 1 FROM users WHERE username_key = ?)"
+)
+# Плейсхолдеры IN подставляются по числу id; старые сборки SQLite
+# ограничивают число параметров выражения 999
+SELECT_MANY = f"SELECT {COLUMNS} FROM users WHERE id IN ({{}})"
+SELECT_MANY_CHUNK = 500
+SELECT_PAGE = f"SELECT {COLUMNS} FROM users WHERE id > ? ORDER BY id LIMIT ? OFFSET ?"
+UPDATE_USER = (
+    "UPDATE users SET email = ?, email_key = ?, username = ?, username_key = ?, "
+    "full_name = ?, is_active = ?, hashed_password = ?, version = ? WHERE id = ?"
+)
+# Поиск по началу слова - диапазон первичного ключа user_search, в порядке
+# (слово, id), как в UserSearchIndex
+SELECT_SEARCH = (
+    "SELECT user_id FROM user_search WHERE token >= ? AND token < ? "
+    "ORDER BY token, user_id"
+)
+SELECT_SEARCH_ALL = "SELECT user_id FROM user_search ORDER BY token, user_id"
+INSERT_SEARCH = "INSERT OR IGNORE INTO user_search (token, user_id) VALUES (?, ?)"
+DELETE_SEARCH = "DELETE FROM user_search WHERE user_id = ?"
+SELECT_SEARCH_FIELDS = "SELECT id, username, full_name FROM users"
+DELETE_USER = "DELETE FROM users WHERE id = ?"
+# Идентификатор набора данных (UserStore.store_id): общий для воркеров,
+# новый у новой базы и после clear()
+SELECT_META = (
+    "SELECT key, value FROM store_meta WHERE key IN ('generation', 'store_id')"
+)
+INSERT_STORE_ID = "INSERT OR IGNORE INTO store_meta (key, value) VALUES ('store_id', ?)"
+UPDATE_STORE_ID = "UPDATE store_meta SET value = ? WHERE key = 'store_id'"
+
+
+class PoolTimeoutError(Exception):
+    """Не удалось получить соединение из пула за отведенное время."""
+
+
+class ConnectionPool:
+    """Ограниченный потокобезопасный пул соединений SQLite."""
+
+    def __init__(self, path: str, size: int = 5, timeout: float = 30.0):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открытие и настройка нового соединения."""
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            isolation_level=None,  # Транзакции управляются явно
+            check_same_thread=False,  # Соединение переходит между потоками пула
+            cached_statements=64,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Получение соединения: свободное, новое (если лимит позволяет) или ожидание."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeoutError(f"Нет свободных соединений SQLite ({self.size})")
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Возврат соединения в пул."""
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Соединение из пула на время блока with."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        """Закрытие всех свободных соединений."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """Пишущая транзакция (BEGIN IMMEDIATE сразу берет блокировку записи)."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _row_to_user(row: sqlite3.Row) -> dict:
+    """Преобразование строки таблицы в запись пользователя."""
+    user = dict(row)
+    user["created_at"] = datetime.fromisoformat(user["created_at"])
+    user["is_active"] = bool(user["is_active"])
+    return user
+
+
+def _index_search(conn: sqlite3.Connection, user: dict) -> None:
+    """Слова пользователя в индекс поиска (в транзакции записи)."""
+    conn.executemany(
+        INSERT_SEARCH,
+        [
+            (token, user["id"])
+            for token in search_tokens(user["username"], user["full_name"])
+        ],
+    )
+
+
+def _script_statements(script: str) -> List[str]:
+    """
+    Разбиение скрипта на отдельные выражения: executescript сначала
+    фиксирует текущую транзакцию, а схема создается внутри нее.
+    """
+    statements, current = [], ""
+    for line in script.splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ""
+    return statements
+
+
+def _add_version_column(conn: sqlite3.Connection) -> None:
+    """Столбец version (базы, созданные до версий записей)."""
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(users)")}
+    if "version" not in columns:
+        conn.execute(ADD_VERSION_COLUMN)
+
+
+def _backfill_search(conn: sqlite3.Connection) -> None:
+    """Индекс поиска для пользователей, сохраненных до его появления."""
+    for row in conn.execute(SELECT_SEARCH_FIELDS).fetchall():
+        _index_search(conn, dict(row))
+
+
+# Миграции по PRAGMA user_version: шаг i переводит базу с версии i на i + 1.
+# Недостающие таблицы создает SCHEMA до миграций, поэтому шаги только
+# дополняют существующие. Базы, созданные до user_version, имеют версию 0
+# и могут уже содержать часть изменений - шаги идемпотентны
+MIGRATIONS: List[Callable[[sqlite3.Connection], None]] = [
+    _add_version_column,
+    _backfill_search,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+SCHEMA_STATEMENTS = _script_statements(SCHEMA)
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """
+    Создание схемы и миграции до SCHEMA_VERSION.
+
+    Несколько воркеров открывают базу одновременно, поэтому все изменения
+    схемы выполняются в одной пишущей транзакции, а версия перечитывается
+    после получения блокировки: мигрирует только первый воркер.
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    with transaction(conn):
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        exists = conn.execute("PRAGMA table_info(users)").fetchone() is not None
+        for statement in SCHEMA_STATEMENTS:
+            conn.execute(statement)
+        if exists:
+            for migration in MIGRATIONS[version:]:
+                migration(conn)
+        conn.execute(INSERT_STORE_ID, (secrets.randbits(32),))
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def _duplicate_error(exc: sqlite3.IntegrityError) -> DuplicateUserError:
+    """Определение поля, нарушившего уникальность."""
+    return DuplicateUserError("email" if "email_key" in str(exc) else "username")
+
+
+class SQLiteUserStore(UserStore):
+    """Хранилище пользователей в файле SQLite с пулом соединений."""
+
+    def __init__(self, path: str, pool_size: int = 5, timeout: float = 30.0):
+        self.pool = ConnectionPool(path, pool_size, timeout)
+        with self.pool.connection() as conn:
+            _migrate(conn)
+        self._generation()
+
+    @staticmethod
+    def _insert_row(conn: sqlite3.Connection, user: dict) -> dict:
+        params = (
+            user["email"],
+            normalize_key(user["email"]),
+            user["username"],
+            normalize_key(user["username"]),
+            user.get("full_name"),
+            user["created_at"].isoformat(),
+            int(user.get("is_active", True)),
+            user["hashed_password"],
+        )
+        try:
+            cursor = conn.execute(INSERT_USER, params)
+        except sqlite3.IntegrityError as exc:
+            raise _duplicate_error(exc)
+        user = {**user, "id": cursor.lastrowid, "version": 1}
+        _index_search(conn, user)
+        return user
+
+    @staticmethod
+    def _update_row(
+        conn: sqlite3.Connection, user_id: int, changes: dict
+    ) -> Optional[dict]:
+        row = conn.execute(SELECT_BY_ID, (user_id,)).fetchone()
+        if row is None:
+            return None
+        user = {**_row_to_user(row), **changes}
+        user["version"] = row["version"] + 1
+        params = (
+            user["email"],
+            normalize_key(user["email"]),
+            user["username"],
+            normalize_key(user["username"]),
+            user["full_name"],
+            int(user["is_active"]),
+            user["hashed_password"],
+            user["version"],
+            user_id,
+        )
+        try:
+            conn.execute(UPDATE_USER, params)
+        except sqlite3.IntegrityError as exc:
+            raise _duplicate_error(exc)
+        if (row["username"], row["full_name"]) != (user["username"], user["full_name"]):
+            conn.execute(DELETE_SEARCH, (user_id,))
+            _index_search(conn, user)
+        return user
+
+    @staticmethod
+    def _delete_row(conn: sqlite3.Connection, user_id: int) -> Optional[dict]:
+        row = conn.execute(SELECT_BY_ID, (user_id,)).fetchone()
+        if row is None:
+            return None
+        conn.execute(DELETE_USER, (user_id,))
+        return _row_to_user(row)
+
+    def _create(self, user: dict) -> dict:
+        with self.pool.connection() as conn, transaction(conn):
+            return self._insert_row(conn, user)
+
+    def _get(self, user_id: int) -> Optional[dict]:
+        with self.pool.connection() as conn:
+            row = conn.execute(SELECT_BY_ID, (user_id,)).fetchone()
+        return None if row is None else _row_to_user(row)
+
+    def _get_many(self, user_ids: List[int]) -> List[Optional[dict]]:
+        found: Dict[int, dict] = {}
+        with self.pool.connection() as conn:
+            for start in range(0, len(user_ids), SELECT_MANY_CHUNK):
+                chunk = user_ids[start : start + SELECT_MANY_CHUNK]
+                sql = SELECT_MANY.format(", ".join("?" * len(chunk)))
+                for row in conn.execute(sql, chunk):
+                    found[row["id"]] = _row_to_user(row)
+        return [found.get(user_id) for user_id in user_ids]
+
+    def _get_by_username(self, username: str) -> Optional[dict]:
+        params = (normalize_key(username),)
+        with self.pool.connection() as conn:
+            row = conn.execute(SELECT_BY_USERNAME, params).fetchone()
+        return None if row is None else _row_to_user(row)
+
+    def _check_unique(self, user: dict) -> None:
+        params = (normalize_key(user["email"]), normalize_key(user["username"]))
+        with self.pool.connection() as conn:
+            email_taken, username_taken = conn.execute(SELECT_TAKEN, params).fetchone()
+        if email_taken:
+            raise DuplicateUserError("email")
+        if username_taken:
+            raise DuplicateUserError("username")
+
+    def _update(self, user_id: int, changes: dict) -> Optional[dict]:
+        with self.pool.connection() as conn, transaction(conn):
+            return self._update_row(conn, user_id, changes)
+
+    def _delete(self, user_id: int) -> Optional[dict]:
+        with self.pool.connection() as conn, transaction(conn):
+            return self._delete_row(conn, user_id)
+
+    def _create_many(self, users: List[dict]) -> List[BatchOutcome]:
+        # Одна транзакция на весь список: отклоненная строка не мешает остальным
+        outcomes: List[BatchOutcome] = []
+        with self.pool.connection() as conn, transaction(conn):
+            for user in users:
+                try:
+                    outcomes.append(self._insert_row(conn, user))
+                except DuplicateUserError as exc:
+                    outcomes.append(exc)
+        return outcomes
+
+    def _apply_operation(
+        self, conn: sqlite3.Connection, operation: BatchOperation
+    ) -> BatchOutcome:
+        try:
+            if operation.op == "create":
+                return self._insert_row(conn, operation.data)
+            if operation.op == "update":
+                return self._update_row(conn, operation.user_id, operation.data)
+            return self._delete_row(conn, operation.user_id)
+        except DuplicateUserError as exc:
+            return exc
+
+    def _apply_batch(self, operations: List[BatchOperation]) -> List[BatchOutcome]:
+        # Весь пакет - одна транзакция и один переход в пул потоков.
+        # Ошибка отдельного выражения не прерывает транзакцию SQLite,
+        # поэтому собираем результаты всех операций и затем решаем,
+        # фиксировать пакет или откатить.
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                outcomes = [self._apply_operation(conn, op) for op in operations]
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            applied = all(isinstance(outcome, dict) for outcome in outcomes)
+            conn.execute("COMMIT" if applied else "ROLLBACK")
+        return outcomes
+
+    def _list_users(self, after_id: Optional[int], skip: int, limit: int) -> List[dict]:
+        params = (after_id if after_id is not None else 0, limit, skip)
+        with self.pool.connection() as conn:
+            rows = conn.execute(SELECT_PAGE, params).fetchall()
+        return [_row_to_user(row) for row in rows]
+
+    def _search(self, query: str, limit: int) -> List[dict]:
+        query = search_key(query)
+        if query:
+            # Верхняя граница диапазона: query с увеличенным последним символом
+            params: tuple = (query, query[:-1] + chr(ord(query[-1]) + 1))
+            sql = SELECT_SEARCH
+        else:
+            params, sql = (), SELECT_SEARCH_ALL
+        user_ids: Dict[int, None] = {}
+        with self.pool.connection() as conn:
+            for (user_id,) in conn.execute(sql, params):
+                user_ids[user_id] = None
+                if len(user_ids) == limit:
+                    break
+        found = self._get_many(list(user_ids))
+        return [user for user in found if user is not None]
+
+    def _generation(self) -> int:
+        """Поколение; заодно обновляется идентификатор (его мог сменить clear())."""
+        with self.pool.connection() as conn:
+            meta = dict(conn.execute(SELECT_META).fetchall())
+        self._store_id = meta["store_id"]
+        return meta["generation"]
+
+    def _clear(self) -> None:
+        store_id = secrets.randbits(32)
+        with self.pool.connection() as conn, transaction(conn):
+            conn.execute("DELETE FROM users")
+            conn.execute("DELETE FROM sqlite_sequence WHERE name = 'users'")
+            conn.execute(UPDATE_STORE_ID, (store_id,))
+        self._store_id = store_id
+
+    async def create(self, user: dict) -> dict:
+        return await run_in_threadpool(self._create, user)
+
+    async def get(self, user_id: int) -> Optional[dict]:
+        return await run_in_threadpool(self._get, user_id)
+
+    async def get_many(self, user_ids: List[int]) -> List[Optional[dict]]:
+        return await run_in_threadpool(self._get_many, user_ids)
+
+    async def get_by_username(self, username: str) -> Optional[dict]:
+        return await run_in_threadpool(self._get_by_username, username)
+
+    async def check_unique(self, user: dict) -> None:
+        await run_in_threadpool(self._check_unique, user)
+
+    async def update(self, user_id: int, changes: dict) -> Optional[dict]:
+        return await run_in_threadpool(self._update, user_id, changes)
+
+    async def delete(self, user_id: int) -> Optional[dict]:
+        return await run_in_threadpool(self._delete, user_id)
+
+    async def list_users(
+        self, after_id: Optional[int] = None, skip: int = 0, limit: int = 100
+    ) -> List[dict]:
+        return await run_in_threadpool(self._list_users, after_id, skip, limit)
+
+    async def create_many(self, users: List[dict]) -> List[BatchOutcome]:
+        return await run_in_threadpool(self._create_many, users)
+
+    async def apply_batch(self, operations: List[BatchOperation]) -> List[BatchOutcome]:
+        return await run_in_threadpool(self._apply_batch, operations)
+
+    async def search(self, query: str, limit: int = 10) -> List[dict]:
+        return await run_in_threadpool(self._search, query, limit)
+
+    async def generation(self) -> int:
+        return await run_in_threadpool(self._generation)
+
+    def store_id(self) -> str:
+        return f"{self._store_id:08x}"
+
+    async def clear(self) -> None:
+        await run_in_threadpool(self._clear)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.pool.close)
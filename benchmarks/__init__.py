@@ -0,0 +1,4 @@
+"""
+Бенчмарки производительности API.
+Запуск: python -m benchmarks.<имя_модуля> --help
+"""
@@ -0,0 +1,95 @@
+"""
+Бенчмарк: N запросов GET /users/{id} против одного POST /users:batchGet.
+
+Для каждого N из --ids сравниваются N последовательных GET (как
+рендер страницы в цикле), N одновременных GET и один users:batchGet
+с теми же id; часть id отсутствует. Хранилище задается как у приложения
+(USER_STORE_BACKEND, для sqlite - SQLITE_PATH).
+
+    python -m benchmarks.bench_batch_get --ids 50 200 --rounds 20
+    USER_STORE_BACKEND=sqlite SQLITE_PATH=/tmp/bench.db \\
+        python -m benchmarks.bench_batch_get
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from typing import Dict, List
+
+import httpx
+
+from app.storage import user_store_for
+from benchmarks.bench_users_api import seed_user
+from benchmarks.common import disable_load_shedding
+
+
+async def sequential(client: httpx.AsyncClient, ids: List[int]) -> None:
+    for user_id in ids:
+        await client.get(f"/api/v1/users/{user_id}")
+
+
+async def concurrent(client: httpx.AsyncClient, ids: List[int]) -> None:
+    await asyncio.gather(*(client.get(f"/api/v1/users/{uid}") for uid in ids))
+
+
+async def batch_get(client: httpx.AsyncClient, ids: List[int]) -> None:
+    response = await client.post("/api/v1/users:batchGet", json={"ids": ids})
+    assert response.status_code == 200
+
+
+async def run(args: argparse.Namespace) -> dict:
+    disable_load_shedding()
+    from main import app
+
+    store = user_store_for(app)
+    await store.clear()
+    await store.create_many([seed_user(i) for i in range(1, args.users + 1)])
+
+    modes = {"sequential": sequential, "concurrent": concurrent, "batch": batch_get}
+    result: dict = {
+        "store": os.environ.get("USER_STORE_BACKEND", "memory"),
+        "users": args.users,
+    }
+    rng = random.Random(42)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        for count in args.ids:
+            # Около 5% id отсутствуют
+            ids = [rng.randint(1, int(args.users * 1.05)) for _ in range(count)]
+            samples: Dict[str, List[float]] = {name: [] for name in modes}
+            for _ in range(args.rounds):
+                for name, mode in modes.items():
+                    started = time.perf_counter()
+                    await mode(client, ids)
+                    samples[name].append(time.perf_counter() - started)
+
+            timings = {
+                name: round(statistics.median(values) * 1000, 2)
+                for name, values in samples.items()
+            }
+            result[f"ids_{count}"] = {
+                **{f"{name}_ms": value for name, value in timings.items()},
+                "speedup_vs_sequential": round(
+                    timings["sequential"] / timings["batch"], 1
+                ),
+            }
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ids", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Бенчмарк: одновременные одинаковые чтения с объединением и без.
+
+Хранилище отвечает с задержкой --latency-ms (как база данных). Для
+популярного пользователя и первой страницы списка --concurrency клиентов
+одновременно шлют одинаковые запросы; измеряются число обращений к
+хранилищу, p50/p99 и время всей волны. Отдельно - накладные расходы
+SingleFlight на одиночный запрос без конкуренции.
+
+    python -m benchmarks.bench_coalesce --concurrency 200 --latency-ms 5
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Dict, List
+
+import httpx
+
+from app.coalesce import SingleFlight
+from app.routes import users as users_routes
+from app.storage import user_store_for
+from benchmarks.bench_users_api import seed_user
+from benchmarks.common import disable_load_shedding, summarize
+
+PATHS = {"user": "/api/v1/users/1", "first_page": "/api/v1/users?limit=100"}
+
+
+class NoFlight:
+    """Без объединения: каждый запрос выполняет свое вычисление."""
+
+    async def do(self, key, fn):
+        return await fn()
+
+    def forget(self) -> None:
+        pass
+
+
+def slow_store(app, latency: float) -> dict:
+    """Задержка перед чтениями хранилища приложения; счетчик обращений."""
+    store = user_store_for(app)
+    calls = {"count": 0}
+    for name in ("get", "list_users"):
+        method = getattr(store, name)
+
+        async def slow(*args, _method=method, **kwargs):
+            calls["count"] += 1
+            await asyncio.sleep(latency)
+            return await _method(*args, **kwargs)
+
+        setattr(store, name, slow)
+    return calls
+
+
+async def wave(client: httpx.AsyncClient, path: str, concurrency: int) -> dict:
+    latencies: List[float] = []
+
+    async def request() -> None:
+        started = time.perf_counter()
+        response = await client.get(path)
+        assert response.status_code == 200
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(request() for _ in range(concurrency)))
+    return {
+        **summarize(latencies),
+        "wave_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    disable_load_shedding()
+    from main import app
+
+    store = user_store_for(app)
+    await store.clear()
+    await store.create_many([seed_user(i) for i in range(1, 1001)])
+
+    result = {"concurrency": args.concurrency, "latency_ms": args.latency_ms}
+    batch = 200
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        # Накладные расходы без конкуренции (хранилище без задержки). Пачки
+        # чередуются, берется медиана: шум хоста одинаково влияет на оба варианта
+        variants = {"without": NoFlight(), "with": SingleFlight()}
+        samples: Dict[str, List[float]] = {name: [] for name in variants}
+        for _ in range(max(1, args.requests // batch)):
+            for name, reads in variants.items():
+                users_routes.reads = reads
+                started = time.perf_counter()
+                for _ in range(batch):
+                    await client.get(PATHS["user"])
+                elapsed = time.perf_counter() - started
+                samples[name].append(elapsed / batch * 1e6)
+        for name, values in samples.items():
+            result[f"sequential_us_{name}"] = round(statistics.median(values), 1)
+
+        calls = slow_store(app, args.latency_ms / 1000)
+        for name, reads in (("without", NoFlight()), ("with", SingleFlight())):
+            users_routes.reads = reads
+            for scenario, path in PATHS.items():
+                calls["count"] = 0
+                stats = await wave(client, path, args.concurrency)
+                result[f"{scenario}_{name}"] = {**stats, "store_reads": calls["count"]}
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
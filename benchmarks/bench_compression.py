@@ -0,0 +1,111 @@
+"""
+Бенчмарк: CPU на сжатие против сэкономленных байт для страниц списка.
+
+Для страниц пользователей разного размера измеряются время сжатия и
+размер результата для уровней gzip (и качеств brotli, если установлен),
+а также CPU на запрос через CompressionMiddleware по сравнению с тем же
+приложением без сжатия.
+
+    python -m benchmarks.bench_compression --page-sizes 10 100 1000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+import httpx
+from fastapi import FastAPI
+
+from app.compression import ENCODINGS, BrotliEncoder, CompressionMiddleware, GzipEncoder
+from app.serialization import dump_users, json_response
+from benchmarks.bench_serialization import make_page
+
+GZIP_LEVELS = (1, 6, 9)
+BROTLI_QUALITIES = (1, 4, 11)
+
+
+def codec_table(body: bytes, repeats: int) -> dict:
+    """Время сжатия одной страницы и степень сжатия для каждого кодека."""
+    codecs = [(f"gzip-{level}", GzipEncoder, level) for level in GZIP_LEVELS]
+    if "br" in ENCODINGS:
+        codecs += [(f"br-{q}", BrotliEncoder, q) for q in BROTLI_QUALITIES]
+
+    table = {}
+    for name, encoder_class, level in codecs:
+        start = time.process_time()
+        for _ in range(repeats):
+            data = encoder_class(level).compress(body, final=True)
+        cpu = (time.process_time() - start) / repeats
+        table[name] = {
+            "cpu_us": round(cpu * 1e6, 1),
+            "bytes": len(data),
+            "saved_percent": round((1 - len(data) / len(body)) * 100, 1),
+            "saved_bytes_per_cpu_ms": round((len(body) - len(data)) / (cpu * 1e3)),
+        }
+    return table
+
+
+def build_app(body: bytes, compressed: bool) -> FastAPI:
+    bench_app = FastAPI()
+    if compressed:
+        bench_app.add_middleware(CompressionMiddleware)
+
+    @bench_app.get("/users")
+    async def users():
+        return json_response(body)
+
+    return bench_app
+
+
+async def request_cpu(body: bytes, compressed: bool, requests: int) -> dict:
+    """CPU на запрос через приложение (с middleware сжатия или без)."""
+    transport = httpx.ASGITransport(app=build_app(body, compressed))
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        # Сжатое тело не распаковываем: считаем только стоимость сервера
+        headers = {"Accept-Encoding": ",".join(ENCODINGS)}
+        await client.get("/users", headers=headers)
+        start = time.process_time()
+        for _ in range(requests):
+            response = await client.get("/users", headers=headers)
+        cpu = (time.process_time() - start) / requests
+    return {
+        "cpu_us_per_request": round(cpu * 1e6, 1),
+        "encoding": response.headers.get("content-encoding", "identity"),
+        "wire_bytes": int(response.headers["content-length"]),
+    }
+
+
+async def run(page_sizes: List[int], repeats: int, requests: int) -> dict:
+    results = {}
+    for size in page_sizes:
+        body = dump_users(make_page(size))
+        plain = await request_cpu(body, False, requests)
+        compressed = await request_cpu(body, True, requests)
+        results[str(size)] = {
+            "body_bytes": len(body),
+            "codecs": codec_table(body, repeats),
+            "request_plain": plain,
+            "request_compressed": compressed,
+            "cpu_overhead_us": round(
+                compressed["cpu_us_per_request"] - plain["cpu_us_per_request"], 1
+            ),
+        }
+    return {"encodings": list(ENCODINGS), "results": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+    result = asyncio.run(run(args.page_sizes, args.repeats, args.requests))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Бенчмарк: журнал упреждающей записи и восстановление хранилища.
+
+Для каждой политики fsync измеряется пропускная способность записи при
+конкурентных обновлениях (group commit объединяет их в один fsync).
+Затем хранилище с --users пользователями сохраняется снимком, поверх
+снимка пишется --tail изменений, и измеряется время восстановления
+нового процесса: загрузка снимка + доигрывание журнала.
+
+    python -m benchmarks.bench_durable --users 1000000 --tail 100000
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Type
+
+from app.storage import CompactUserStore, DurableUserStore, InMemoryUserStore
+from app.storage.durable import FSYNC_POLICIES
+from benchmarks.bench_memory_store import unique_user
+from benchmarks.bench_users_api import SEED_CHUNK_SIZE
+
+STORES = {"memory": InMemoryUserStore, "compact": CompactUserStore}
+
+
+async def write_throughput(
+    directory: str, fsync: str, updates: int, concurrency: int
+) -> dict:
+    store = DurableUserStore(InMemoryUserStore(), directory, fsync=fsync)
+    await store.create_many([unique_user(i) for i in range(1, 1001)])
+    counter = iter(range(updates))
+
+    async def worker() -> None:
+        for i in counter:
+            await store.update(i % 1000 + 1, {"full_name": f"Updated {i}"})
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await store.close()
+    return {"updates_per_second": round(updates / elapsed)}
+
+
+async def recovery(directory: str, store_class: Type, users: int, tail: int) -> dict:
+    store = DurableUserStore(store_class(), directory, snapshot_every=10**12)
+    for start in range(1, users + 1, SEED_CHUNK_SIZE):
+        stop = min(start + SEED_CHUNK_SIZE, users + 1)
+        await store.create_many([unique_user(i) for i in range(start, stop)])
+    started = time.perf_counter()
+    await store.snapshot()
+    snapshot_seconds = time.perf_counter() - started
+
+    rng = random.Random(0)
+    for i in range(tail):
+        await store.update(rng.randint(1, users), {"full_name": f"Updated {i}"})
+    await store.close()
+    del store
+    gc.collect()
+
+    started = time.perf_counter()
+    restored = DurableUserStore(store_class(), directory)
+    assert await restored.get(users) is not None
+    recovery_seconds = time.perf_counter() - started
+    await restored.close()
+
+    sizes = {
+        name: os.path.getsize(os.path.join(directory, name))
+        for name in os.listdir(directory)
+    }
+    return {
+        "snapshot_seconds": round(snapshot_seconds, 2),
+        "recovery_seconds": round(recovery_seconds, 2),
+        "snapshot_mb": round(
+            sum(size for name, size in sizes.items() if name.startswith("snapshot"))
+            / 2**20,
+            1,
+        ),
+        "wal_mb": round(
+            sum(size for name, size in sizes.items() if name.startswith("wal"))
+            / 2**20,
+            1,
+        ),
+    }
+
+
+async def run(args) -> dict:
+    result = {"users": args.users, "tail": args.tail, "fsync": {}, "recovery": {}}
+    for fsync in FSYNC_POLICIES:
+        with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+            result["fsync"][fsync] = await write_throughput(
+                directory, fsync, args.updates, args.concurrency
+            )
+    for name in args.stores:
+        with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+            result["recovery"][name] = await recovery(
+                directory, STORES[name], args.users, args.tail
+            )
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--tail", type=int, default=10_000)
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--stores", nargs="+", choices=STORES, default=list(STORES))
+    parser.add_argument("--dir", help="Каталог для файлов (по умолчанию - временный)")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Бенчмарк: память и скорость хранилищ пользователей в памяти процесса.
+
+Сравнивает InMemoryUserStore (словарь словарей) и CompactUserStore
+(столбцы): байты на пользователя с индексами (по tracemalloc), время
+поиска по id и по username, полный обход страницами и поиск подсказок
+по префиксу (память индекса поиска входит в байты на пользователя).
+
+    python -m benchmarks.bench_memory_store --users 1000000
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import random
+import time
+import tracemalloc
+from typing import Type
+
+from app.storage import CompactUserStore, InMemoryUserStore, UserStore
+from benchmarks.bench_users_api import SEED_CHUNK_SIZE, seed_user
+
+
+def unique_user(user_id: int) -> dict:
+    """Запись с уникальным хешем пароля, как у настоящих пользователей."""
+    user = seed_user(user_id)
+    user["hashed_password"] = user["hashed_password"][:-10] + f"{user_id:010d}"
+    return user
+
+
+async def fill(store: UserStore, users: int) -> None:
+    for start in range(1, users + 1, SEED_CHUNK_SIZE):
+        stop = min(start + SEED_CHUNK_SIZE, users + 1)
+        await store.create_many([unique_user(i) for i in range(start, stop)])
+
+
+async def measure(store_class: Type[UserStore], users: int, lookups: int) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = store_class()
+    await fill(store, users)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    rng = random.Random(0)
+    ids = [rng.randint(1, users) for _ in range(lookups)]
+    usernames = [f"user{user_id}" for user_id in ids]
+
+    start = time.perf_counter()
+    for user_id in ids:
+        await store.get(user_id)
+    get_us = (time.perf_counter() - start) / lookups * 1e6
+
+    start = time.perf_counter()
+    for username in usernames:
+        await store.get_by_username(username)
+    username_us = (time.perf_counter() - start) / lookups * 1e6
+
+    start = time.perf_counter()
+    scanned = 0
+    async for page in store.iter_pages(1000):
+        scanned += len(page)
+    scan_seconds = time.perf_counter() - start
+    assert scanned == users
+
+    prefixes = [f"user{user_id}"[: rng.randint(5, 9)] for user_id in ids]
+    start = time.perf_counter()
+    for prefix in prefixes:
+        await store.search(prefix, 10)
+    search_us = (time.perf_counter() - start) / lookups * 1e6
+
+    return {
+        "bytes_per_user": round(used / users),
+        "total_mb": round(used / 2**20, 1),
+        "get_us": round(get_us, 2),
+        "get_by_username_us": round(username_us, 2),
+        "scan_seconds": round(scan_seconds, 3),
+        "scan_users_per_second": round(users / scan_seconds),
+        "search_top10_us": round(search_us, 2),
+    }
+
+
+async def run(users: int, lookups: int) -> dict:
+    result = {"users": users, "lookups": lookups}
+    for name, store_class in (
+        ("dict_of_dicts", InMemoryUserStore),
+        ("compact", CompactUserStore),
+    ):
+        result[name] = await measure(store_class, users, lookups)
+    ratio = (
+        result["compact"]["bytes_per_user"] / result["dict_of_dicts"]["bytes_per_user"]
+    )
+    result["memory_saving_percent"] = round((1 - ratio) * 100, 1)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.users, args.lookups)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
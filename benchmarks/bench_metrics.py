@@ -0,0 +1,98 @@
+"""
+Бенчмарк: накладные расходы MetricsMiddleware на запрос.
+
+Два одинаковых приложения (роутеры из main.py), без middleware и с ним,
+вызываются напрямую через ASGI интерфейс. Разница CPU на запрос - стоимость
+сопоставления маршрута и обновления счетчиков.
+
+    python -m benchmarks.bench_metrics --requests 20000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI
+
+from app.metrics import MetricsMiddleware, MetricsRegistry
+from app.routes import health, users
+
+PATHS = {
+    "first_route": "/health",
+    "param_route": "/api/v1/users/1",
+    "unmatched": "/no/such/path",
+}
+
+
+def build_app(with_metrics: bool) -> FastAPI:
+    """Приложение с маршрутами main.py."""
+    bench_app = FastAPI()
+    if with_metrics:
+        bench_app.add_middleware(MetricsMiddleware, registry=MetricsRegistry())
+    bench_app.include_router(health.router)
+    bench_app.include_router(users.router, prefix="/api/v1")
+    return bench_app
+
+
+async def call(asgi_app: FastAPI, path: str) -> None:
+    """Один GET запрос напрямую через ASGI интерфейс."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await asgi_app(scope, receive, send)
+
+
+async def measure(asgi_app: FastAPI, path: str, requests: int) -> float:
+    """CPU на запрос, мкс."""
+    for _ in range(100):  # Прогрев
+        await call(asgi_app, path)
+    start = time.process_time()
+    for _ in range(requests):
+        await call(asgi_app, path)
+    return (time.process_time() - start) / requests * 1e6
+
+
+async def run(requests: int) -> dict:
+    plain_app, metrics_app = build_app(False), build_app(True)
+
+    results = {}
+    for name, path in PATHS.items():
+        plain = await measure(plain_app, path, requests)
+        with_metrics = await measure(metrics_app, path, requests)
+        results[name] = {
+            "path": path,
+            "plain_cpu_us": round(plain, 2),
+            "metrics_cpu_us": round(with_metrics, 2),
+            "overhead_us": round(with_metrics - plain, 2),
+        }
+    return {"requests": requests, "results": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.requests)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
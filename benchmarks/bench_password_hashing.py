@@ -0,0 +1,124 @@
+"""
+Бенчмарк: задержка несвязанных endpoint'ов во время волны регистраций.
+
+Приложение запускается в процессе (httpx + ASGI транспорт), поэтому любая
+блокировка event loop сразу видна по задержке /healthz. Режим --blocking
+хеширует пароли прямо в event loop для сравнения.
+
+    python -m benchmarks.bench_password_hashing --signups 64 --rounds 12
+    python -m benchmarks.bench_password_hashing --signups 64 --rounds 12 --blocking
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+import httpx
+
+from app.security import PasswordHasher, _hash_passwords, password_hasher_for
+from benchmarks.common import disable_load_shedding, summarize
+
+
+class BlockingPasswordHasher(PasswordHasher):
+    """Хеширование прямо в event loop (как было бы без пула процессов)."""
+
+    async def hash_many(self, passwords: List[str]) -> List[str]:
+        return _hash_passwords(passwords, self.rounds)
+
+
+async def probe(client: httpx.AsyncClient, latencies: List[float], stop) -> None:
+    """
+    Опрос /healthz каждую миллисекунду, пока не выставлен stop.
+
+    Задержка считается от момента, когда запрос должен был уйти, поэтому
+    время, пока event loop заблокирован, тоже попадает в измерение.
+    """
+    interval = 0.001
+    while not stop.is_set():
+        scheduled = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        response = await client.get("/healthz")
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - scheduled)
+
+
+async def run(app, signups: int, baseline_seconds: float) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        # Прогрев пула процессов, чтобы не мерить запуск процессов
+        await password_hasher_for(app).hash("warmup")
+
+        baseline: List[float] = []
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(client, baseline, stop))
+        await asyncio.sleep(baseline_seconds)
+        stop.set()
+        await prober
+
+        during: List[float] = []
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(client, during, stop))
+        started = time.perf_counter()
+        responses = await asyncio.gather(
+            *(
+                client.post(
+                    "/api/v1/users",
+                    json={
+                        "email": f"bench{i}@example.com",
+                        "username": f"bench{i}",
+                        "password": "password123",
+                    },
+                )
+                for i in range(signups)
+            )
+        )
+        burst_seconds = time.perf_counter() - started
+        stop.set()
+        await prober
+
+    statuses = {}
+    for response in responses:
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    return {
+        "signups": signups,
+        "signup_statuses": statuses,
+        "burst_seconds": round(burst_seconds, 3),
+        "healthz_baseline": summarize(baseline),
+        "healthz_during_burst": summarize(during or [0.0]),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--signups", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--baseline-seconds", type=float, default=1.0)
+    parser.add_argument("--blocking", action="store_true")
+    args = parser.parse_args()
+
+    # Блокирующий режим нарочно задерживает event loop: без этого
+    # регистрации отклонялись бы контролем допуска
+    disable_load_shedding()
+    from main import app
+
+    hasher_class = BlockingPasswordHasher if args.blocking else PasswordHasher
+    hasher = hasher_class(
+        rounds=args.rounds, max_workers=args.workers, max_pending=args.signups + 1
+    )
+    app.state.password_hasher = hasher
+    try:
+        result = asyncio.run(run(app, args.signups, args.baseline_seconds))
+    finally:
+        hasher.shutdown()
+    result["mode"] = "blocking" if args.blocking else "process_pool"
+    result["rounds"] = args.rounds
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Бенчмарк: влияние активного профиля на задержку остальных маршрутов.
+
+--concurrency клиентов шлют GET /api/v1/users/{id} в приложение main.py
+(в одном процессе, через ASGI) без профиля, с профилем и с профилем в
+режиме трассировки медленных запросов. Режимы чередуются по раундам,
+чтобы шум хоста одинаково влиял на все. Отдельно - стоимость одного
+снимка стека глубины --depth.
+
+    python -m benchmarks.bench_profiling --requests 2000 --rounds 5
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from app import metrics
+from app.profiling import StackSampler
+from app.storage import user_store_for
+from benchmarks.bench_users_api import seed_user
+from benchmarks.common import disable_load_shedding, percentile, summarize
+
+
+async def measure(
+    client: httpx.AsyncClient, requests: int, concurrency: int
+) -> List[float]:
+    latencies: List[float] = []
+
+    async def worker(offset: int) -> None:
+        for i in range(offset, requests, concurrency):
+            started = time.perf_counter()
+            response = await client.get(f"/api/v1/users/{i % 1000 + 1}")
+            assert response.status_code == 200
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+    return latencies
+
+
+def sample_cost(depth: int, samples: int = 10_000) -> float:
+    """Микросекунд на снимок стека глубины depth."""
+    sampler = StackSampler()
+
+    def nested(level: int) -> float:
+        if level > 0:
+            return nested(level - 1)
+        frame = sys._getframe()
+        started = time.perf_counter()
+        for _ in range(samples):
+            sampler.sample(frame)
+        return (time.perf_counter() - started) / samples * 1e6
+
+    frame, current = sys._getframe(), 0
+    while frame is not None:
+        frame, current = frame.f_back, current + 1
+    return nested(max(0, depth - current))
+
+
+async def run(args: argparse.Namespace) -> dict:
+    disable_load_shedding()
+    from main import app
+
+    store = user_store_for(app)
+    await store.clear()
+    await store.create_many([seed_user(i) for i in range(1, 1001)])
+
+    interval = args.interval_ms / 1000
+    modes: Dict[str, Callable[[], Optional[StackSampler]]] = {
+        "off": lambda: None,
+        "profile": lambda: StackSampler(interval),
+        "trace": lambda: StackSampler(interval, slow_threshold=args.slow_ms / 1000),
+    }
+    latencies: Dict[str, List[float]] = {name: [] for name in modes}
+    samples: Dict[str, int] = {name: 0 for name in modes}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        await measure(client, 200, args.concurrency)
+        for _ in range(args.rounds):
+            for name, make_sampler in modes.items():
+                sampler = make_sampler()
+                if sampler is not None:
+                    sampler.start()
+                    if sampler.slow_threshold is not None:
+                        metrics.registry.tracer = sampler
+                try:
+                    latencies[name] += await measure(
+                        client, args.requests, args.concurrency
+                    )
+                finally:
+                    if sampler is not None:
+                        metrics.registry.tracer = None
+                        sampler.stop()
+                        samples[name] += sampler.samples
+
+    result: dict = {"interval_ms": args.interval_ms, "concurrency": args.concurrency}
+    base = {q: percentile(latencies["off"], q) for q in (50, 99)}
+    for name, values in latencies.items():
+        result[name] = {**summarize(values), "samples": samples[name]}
+        if name != "off":
+            for q in (50, 99):
+                change = percentile(values, q) / base[q] - 1
+                result[name][f"p{q}_change_pct"] = round(change * 100, 1)
+    result["sample_us"] = round(sample_cost(args.depth), 1)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--interval-ms", type=float, default=10.0)
+    parser.add_argument("--slow-ms", type=float, default=5.0)
+    parser.add_argument("--depth", type=int, default=60)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Бенчмарк: накладные расходы лимита частоты на запрос.
+
+- backend: время take() для --clients разных клиентов, память корзин и
+  самая долгая вставка (пауза на расширение словаря) для одного шарда
+  и для шардов по умолчанию;
+- middleware: время прямого ASGI вызова маленького приложения с
+  RateLimitMiddleware и без него (без HTTP клиента, чтобы была видна
+  именно стоимость лимита).
+
+    python -m benchmarks.bench_ratelimit --clients 1000 1000000
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import tracemalloc
+from typing import Dict, List
+
+from fastapi import FastAPI
+
+from app.metrics import MetricsMiddleware, MetricsRegistry
+from app.ratelimit import InMemoryRateLimitBackend, RateLimitMiddleware
+
+
+async def backend_cost(clients: int, shards: int, requests: int) -> dict:
+    keys = [
+        (f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", "GET", "/")
+        for i in range(clients)
+    ]
+
+    # Корзина восстанавливается за 100 с и не истекает за время прогона:
+    # в таблице остаются все клиенты
+    rate, capacity = 0.01, 1
+
+    # Память корзин (отдельным проходом: tracemalloc замедляет вставки)
+    tracemalloc.start()
+    backend = InMemoryRateLimitBackend(max_entries=clients * 2, shards=shards)
+    for key in keys:
+        await backend.take(key, rate, capacity)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del backend
+
+    backend = InMemoryRateLimitBackend(max_entries=clients * 2, shards=shards)
+    worst = 0.0
+    for key in keys:
+        started = time.perf_counter()
+        await backend.take(key, rate, capacity)
+        worst = max(worst, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for i in range(requests):
+        await backend.take(keys[i * 7919 % clients], rate, capacity)
+    elapsed = time.perf_counter() - started
+    return {
+        "take_us": round(elapsed / requests * 1e6, 2),
+        "worst_insert_ms": round(worst * 1000, 2),
+        "bytes_per_client": round(memory / clients),
+        "buckets": len(backend),
+    }
+
+
+def build_app(limited: bool) -> FastAPI:
+    """Приложение как в main.py: метрики снаружи, лимит внутри."""
+    bench_app = FastAPI()
+    if limited:
+        bench_app.add_middleware(
+            RateLimitMiddleware,
+            backend=InMemoryRateLimitBackend(),
+            rates={"read": 1e9},
+        )
+    bench_app.add_middleware(MetricsMiddleware, registry=MetricsRegistry())
+
+    @bench_app.get("/api/v1/users/{user_id}")
+    async def user(user_id: int):
+        return {"id": user_id}
+
+    return bench_app
+
+
+def make_scope(i: int) -> dict:
+    return {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": f"/api/v1/users/{i}",
+        "raw_path": f"/api/v1/users/{i}".encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"accept", b"*/*")],
+        "client": (f"10.0.{i >> 8 & 255}.{i & 255}", 5000),
+        "server": ("bench", 80),
+    }
+
+
+async def asgi_cost(requests: int, batch: int = 1000) -> dict:
+    """
+    Микросекунд на прямой ASGI вызов приложения без лимита и с ним.
+    Пачки запросов чередуются, берется медиана: так шум хоста одинаково
+    влияет на оба варианта.
+    """
+    apps = {"plain": build_app(False), "limited": build_app(True)}
+    scopes = [make_scope(i) for i in range(batch)]
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    samples: Dict[str, List[float]] = {name: [] for name in apps}
+    for _ in range(max(1, requests // batch)):
+        for name, bench_app in apps.items():
+            started = time.perf_counter()
+            for scope in scopes:
+                await bench_app(dict(scope), receive, send)
+            samples[name].append((time.perf_counter() - started) / batch * 1e6)
+    return {name: statistics.median(values) for name, values in samples.items()}
+
+
+async def run(args: argparse.Namespace) -> dict:
+    backend = {
+        str(clients): {
+            f"shards_{shards}": await backend_cost(clients, shards, args.requests)
+            for shards in (1, 64)
+        }
+        for clients in args.clients
+    }
+    cost = await asgi_cost(args.requests)
+    return {
+        "backend": backend,
+        "middleware": {
+            "request_us": round(cost["plain"], 2),
+            "request_with_limit_us": round(cost["limited"], 2),
+            "overhead_us": round(cost["limited"] - cost["plain"], 2),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1000, 1_000_000])
+    parser.add_argument("--requests", type=int, default=100_000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
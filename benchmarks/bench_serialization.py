@@ -0,0 +1,104 @@
+"""
+Бенчмарк: CPU на запрос страницы списка пользователей.
+
+Сравнивает прежний путь (UserResponse для каждой записи + повторная
+валидация и сериализация через response_model) с прямой сериализацией
+записей хранилища через TypeAdapter (app/serialization).
+
+    python -m benchmarks.bench_serialization --page-size 100 --requests 500
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import List
+
+import httpx
+from fastapi import FastAPI
+
+from app.models import UserResponse
+from app.serialization import dump_users, json_response
+
+
+def make_page(size: int) -> List[dict]:
+    """Страница записей хранилища."""
+    now = datetime.now()
+    return [
+        {
+            "id": i,
+            "email": f"user{i}@example.com",
+            "username": f"user{i}",
+            "full_name": f"User Number {i}",
+            "created_at": now,
+            "is_active": True,
+            "hashed_password": "$2b$12$" + "x" * 53,
+        }
+        for i in range(1, size + 1)
+    ]
+
+
+def build_app(page: List[dict]) -> FastAPI:
+    """Приложение с двумя вариантами одного и того же endpoint'а."""
+    bench_app = FastAPI()
+
+    @bench_app.get("/legacy", response_model=List[UserResponse])
+    async def legacy():
+        return [UserResponse(**user) for user in page]
+
+    @bench_app.get("/fast", response_model=List[UserResponse])
+    async def fast():
+        return json_response(dump_users(page))
+
+    return bench_app
+
+
+async def measure(client: httpx.AsyncClient, path: str, requests: int) -> dict:
+    """CPU и реальное время на запрос, мкс."""
+    await client.get(path)  # Прогрев
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(requests):
+        response = await client.get(path)
+        response.raise_for_status()
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    return {
+        "cpu_us_per_request": round(cpu / requests * 1e6, 1),
+        "wall_us_per_request": round(wall / requests * 1e6, 1),
+        "response_bytes": len(response.content),
+    }
+
+
+async def run(page_size: int, requests: int) -> dict:
+    page = make_page(page_size)
+    transport = httpx.ASGITransport(app=build_app(page))
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        legacy = await measure(client, "/legacy", requests)
+        fast = await measure(client, "/fast", requests)
+        assert (await client.get("/legacy")).json() == (
+            await client.get("/fast")
+        ).json()
+
+    saving = 1 - fast["cpu_us_per_request"] / legacy["cpu_us_per_request"]
+    return {
+        "page_size": page_size,
+        "requests": requests,
+        "legacy": legacy,
+        "fast": fast,
+        "cpu_saving_percent": round(saving * 100, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.page_size, args.requests)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
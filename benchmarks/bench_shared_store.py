@@ -0,0 +1,162 @@
+"""
+Бенчмарк: масштабирование чтения по числу воркеров uvicorn.
+
+Файл общего хранилища (USER_STORE_BACKEND=shared) заполняется один раз,
+затем для каждого числа воркеров запускается `uvicorn main:app --workers N`
+и несколько клиентских процессов нагружают GET /api/v1/users/{id}.
+Для каждого N сохраняются пропускная способность, p50/p99 и ускорение
+относительно одного воркера. Ускорение ограничено числом ядер хоста.
+
+    python -m benchmarks.bench_shared_store --users 100000 --workers 1 2 4
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+import httpx
+
+from app.storage import SharedMemoryUserStore
+from benchmarks.bench_users_api import SEED_CHUNK_SIZE, free_port, seed_user
+from benchmarks.common import disable_load_shedding, summarize
+
+
+async def fill(path: str, size: int, users: int) -> None:
+    store = SharedMemoryUserStore(path, size=size)
+    await store.clear()
+    for start in range(1, users + 1, SEED_CHUNK_SIZE):
+        stop = min(start + SEED_CHUNK_SIZE, users + 1)
+        await store.create_many([seed_user(i) for i in range(start, stop)])
+    await store.close()
+
+
+async def client_load(port: int, users: int, requests: int, concurrency: int):
+    """Нагрузка из одного клиентского процесса: задержки и время."""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}", limits=limits
+    ) as client:
+
+        async def worker() -> None:
+            nonlocal errors
+            for i in counter:
+                started = time.perf_counter()
+                response = await client.get(f"/api/v1/users/{i * 7919 % users + 1}")
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+    return latencies, errors, wall
+
+
+def client_process(port, users, requests, concurrency, queue) -> None:
+    queue.put(asyncio.run(client_load(port, users, requests, concurrency)))
+
+
+def wait_ready(port: int, server: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("Процесс сервера завершился")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/healthz").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError("Сервер не запустился")
+
+
+def run_workers(workers: int, args, env: dict) -> dict:
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)]
+        + ["--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        wait_ready(port, server, args.startup_timeout)
+        context = multiprocessing.get_context("spawn")
+        queue = context.Queue()
+        per_client = args.requests // args.clients
+        clients = [
+            context.Process(
+                target=client_process,
+                args=(port, args.users, per_client, args.concurrency, queue),
+            )
+            for _ in range(args.clients)
+        ]
+        for client in clients:
+            client.start()
+        results = [queue.get() for _ in clients]
+        for client in clients:
+            client.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = [latency for result in results for latency in result[0]]
+    wall = max(result[2] for result in results)
+    return {
+        **summarize(latencies),
+        "errors": sum(result[1] for result in results),
+        "throughput_rps": round(len(latencies) / wall, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--clients", type=int, default=4, help="Клиентских процессов")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    disable_load_shedding()
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        path = os.path.join(tmp, "users.shm")
+        asyncio.run(fill(path, args.size_mb * 2**20, args.users))
+        env = {
+            **os.environ,
+            "USER_STORE_BACKEND": "shared",
+            "SHARED_STORE_PATH": path,
+            "SHARED_STORE_SIZE_MB": str(args.size_mb),
+        }
+        results = {}
+        for workers in args.workers:
+            results[str(workers)] = run_workers(workers, args, env)
+            print(f"  workers={workers} {results[str(workers)]}", file=sys.stderr)
+
+    base = results[str(args.workers[0])]["throughput_rps"]
+    for result in results.values():
+        result["speedup"] = round(result["throughput_rps"] / base, 2)
+    report = {
+        "users": args.users,
+        "requests": args.requests,
+        "clients": args.clients,
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
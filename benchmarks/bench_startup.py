@@ -0,0 +1,125 @@
+"""
+Бенчмарк: время запуска приложения.
+
+Отчет из двух частей:
+
+- стоимость импорта: `python -X importtime -c "import main"`, суммарно
+  по пакетам верхнего уровня и самые дорогие модули (с учетом вложенных);
+- время до первого 200 от /healthz: от запуска `uvicorn main:app` до
+  успешного ответа, несколько прогонов (p50 и максимум).
+
+    python -m benchmarks.bench_startup --runs 5 --top 15
+"""
+
+import argparse
+import json
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import List
+
+import httpx
+
+from benchmarks.bench_users_api import free_port
+from benchmarks.common import percentile
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+def import_costs(module: str, top: int) -> dict:
+    """Собственное время импорта по пакетам и кумулятивное по модулям."""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+
+    packages = defaultdict(int)
+    modules = []
+    total = 0
+    for line in output.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        packages[name.split(".")[0]] += int(self_us)
+        modules.append((name, int(cumulative_us)))
+        if name == module and not indent:
+            total = int(cumulative_us)
+
+    def ms(us: int) -> float:
+        return round(us / 1000, 1)
+
+    return {
+        "total_ms": ms(total),
+        "packages_ms": {
+            name: ms(us)
+            for name, us in sorted(packages.items(), key=lambda item: -item[1])[:top]
+        },
+        "modules_cumulative_ms": {
+            name: ms(us)
+            for name, us in sorted(modules, key=lambda item: -item[1])[:top]
+        },
+    }
+
+
+def time_to_healthy(target: str, factory: bool, timeout: float) -> float:
+    """Секунды от запуска uvicorn до первого 200 от /healthz."""
+    port = free_port()
+    command = [sys.executable, "-m", "uvicorn", target, "--port", str(port)]
+    if factory:
+        command.append("--factory")
+    started = time.perf_counter()
+    server = subprocess.Popen(command + ["--log-level", "warning"])
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError("Процесс сервера завершился")
+            try:
+                response = httpx.get(f"http://127.0.0.1:{port}/healthz")
+                if response.status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            time.sleep(0.01)
+        raise TimeoutError("Сервер не запустился")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run(args) -> dict:
+    target = "main:create_app" if args.factory else "main:app"
+    samples: List[float] = [
+        time_to_healthy(target, args.factory, args.timeout) for _ in range(args.runs)
+    ]
+    return {
+        "imports": import_costs("main", args.top),
+        "first_healthz": {
+            "target": target,
+            "runs": len(samples),
+            "p50_ms": round(percentile(samples, 50) * 1000, 1),
+            "max_ms": round(max(samples) * 1000, 1),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument(
+        "--factory",
+        action="store_true",
+        help="Запуск через фабрику: uvicorn --factory main:create_app",
+    )
+    args = parser.parse_args()
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+Нагрузочный бенчмарк API пользователей на больших объемах данных.
+
+Хранилище заранее заполняется 10k/100k/1M пользователями (напрямую, без
+HTTP и bcrypt), затем каждый endpoint нагружается конкурентными запросами.
+Для каждого размера и endpoint'а сохраняются пропускная способность и
+p50/p99. Режимы: inprocess (httpx + ASGI транспорт) и uvicorn (отдельный
+процесс с настоящим сервером, запросы по TCP).
+
+    python -m benchmarks.bench_users_api --sizes 10000 100000 --output run.json
+    python -m benchmarks.bench_users_api --mode uvicorn --sizes 1000000
+    python -m benchmarks.bench_users_api --baseline baseline.json --threshold 0.2
+
+С --baseline результаты сравниваются с сохраненным прогоном: если p99
+вырос или пропускная способность упала больше чем на threshold, бенчмарк
+завершается с кодом 1.
+
+С --max-growth проверяется, что задержка не растет с объемом данных:
+p50 каждого endpoint'а на самом большом размере не должен превышать p50
+на самом маленьком больше чем в max-growth раз (например, создание
+пользователя не должно сканировать таблицу).
+
+    python -m benchmarks.bench_users_api --sizes 1000 1000000 --max-growth 3
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import sys
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.common import disable_load_shedding, summarize
+
+# Хеш-заглушка для заполнения: bcrypt на миллион записей занял бы часы
+SEED_PASSWORD_HASH = "$2b$04$" + "x" * 53
+SEED_CHUNK_SIZE = 10_000
+
+RequestFactory = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+
+def seed_user(user_id: int) -> dict:
+    """Запись хранилища для заполнения."""
+    return {
+        "email": f"user{user_id}@example.com",
+        "username": f"user{user_id}",
+        "full_name": f"User Number {user_id}",
+        "created_at": datetime.now(),
+        "is_active": True,
+        "hashed_password": SEED_PASSWORD_HASH,
+    }
+
+
+async def seed_store(count: int) -> None:
+    """Очистка хранилища приложения и заполнение count пользователями."""
+    from app.storage import user_store_for
+    from main import app
+
+    store = user_store_for(app)
+    await store.clear()
+    for start in range(1, count + 1, SEED_CHUNK_SIZE):
+        stop = min(start + SEED_CHUNK_SIZE, count + 1)
+        await store.create_many([seed_user(i) for i in range(start, stop)])
+
+
+def build_scenarios(size: int, seed: int) -> Dict[str, RequestFactory]:
+    """Endpoint'ы и генераторы запросов к ним."""
+    from app.routes.users import encode_cursor
+
+    rng = random.Random(seed)
+
+    def random_id() -> int:
+        return rng.randint(1, size)
+
+    async def create_user(client, i):
+        return await client.post(
+            "/api/v1/users",
+            json={
+                "email": f"bench{size}-{i}@example.com",
+                "username": f"bench{size}-{i}",
+                "password": "password123",
+            },
+        )
+
+    async def get_users_first_page(client, i):
+        return await client.get("/api/v1/users", params={"limit": 100})
+
+    async def get_users_cursor(client, i):
+        cursor = encode_cursor(random_id())
+        return await client.get("/api/v1/users", params={"limit": 100, "after": cursor})
+
+    async def get_user(client, i):
+        return await client.get(f"/api/v1/users/{random_id()}")
+
+    async def search_user_by_username(client, i):
+        return await client.get(f"/api/v1/users/search/by-username/user{random_id()}")
+
+    async def search_users(client, i):
+        prefix = f"user{random_id()}"[: rng.randint(5, 9)]
+        return await client.get("/api/v1/users/search", params={"q": prefix})
+
+    async def update_user(client, i):
+        return await client.put(
+            f"/api/v1/users/{random_id()}", json={"full_name": f"Updated {i}"}
+        )
+
+    return {
+        "create_user": create_user,
+        "get_users_first_page": get_users_first_page,
+        "get_users_cursor": get_users_cursor,
+        "get_user": get_user,
+        "search_user_by_username": search_user_by_username,
+        "search_users": search_users,
+        "update_user": update_user,
+    }
+
+
+async def drive(
+    client: httpx.AsyncClient, factory: RequestFactory, requests: int, concurrency: int
+) -> dict:
+    """requests запросов с concurrency одновременными клиентами."""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            response = await factory(client, i)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    return {
+        **summarize(latencies),
+        "errors": errors,
+        "throughput_rps": round(requests / wall, 1),
+    }
+
+
+async def run_scenarios(
+    client: httpx.AsyncClient, size: int, requests: int, concurrency: int, seed: int
+) -> dict:
+    results = {}
+    for name, factory in build_scenarios(size, seed).items():
+        await drive(client, factory, min(requests, 50), concurrency)  # Прогрев
+        results[name] = await drive(client, factory, requests, concurrency)
+        print(f"  {size:>9} {name:<24} {results[name]}", file=sys.stderr)
+    return results
+
+
+async def run_inprocess(sizes: List[int], requests: int, concurrency: int) -> dict:
+    from main import app
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        for size in sizes:
+            await seed_store(size)
+            results[str(size)] = await run_scenarios(
+                client, size, requests, concurrency, seed=size
+            )
+    return results
+
+
+def serve(size: int, port: int) -> None:
+    """Процесс сервера: заполнение хранилища и запуск uvicorn."""
+    import uvicorn
+
+    from main import app
+
+    asyncio.run(seed_store(size))
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(client: httpx.AsyncClient, server, timeout: float) -> None:
+    """Ожидание, пока сервер заполнит хранилище и начнет отвечать."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not server.is_alive():
+            raise RuntimeError("Процесс сервера завершился")
+        try:
+            if (await client.get("/healthz")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError("Сервер не запустился")
+
+
+async def run_uvicorn(
+    sizes: List[int], requests: int, concurrency: int, startup_timeout: float
+) -> dict:
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for size in sizes:
+        port = free_port()
+        server = context.Process(target=serve, args=(size, port))
+        server.start()
+        try:
+            limits = httpx.Limits(max_connections=concurrency)
+            async with httpx.AsyncClient(
+                base_url=f"http://127.0.0.1:{port}", limits=limits
+            ) as client:
+                await wait_ready(client, server, startup_timeout)
+                results[str(size)] = await run_scenarios(
+                    client, size, requests, concurrency, seed=size
+                )
+        finally:
+            server.terminate()
+            server.join()
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """Регрессии относительно базового прогона."""
+    regressions = []
+    for size, endpoints in results.items():
+        for name, current in endpoints.items():
+            base = baseline.get(size, {}).get(name)
+            if base is None:
+                continue
+            if current["p99_ms"] > base["p99_ms"] * (1 + threshold):
+                regressions.append(
+                    f"{size} {name}: p99 {base['p99_ms']} -> {current['p99_ms']} ms"
+                )
+            if current["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+                regressions.append(
+                    f"{size} {name}: throughput {base['throughput_rps']} -> "
+                    f"{current['throughput_rps']} rps"
+                )
+    return regressions
+
+
+def growth_regressions(results: dict, max_growth: float) -> List[str]:
+    """Endpoint'ы, p50 которых растет с объемом данных больше max_growth раз."""
+    sizes = sorted(results, key=int)
+    small, large = results[sizes[0]], results[sizes[-1]]
+    regressions = []
+    for name, current in large.items():
+        base = small.get(name)
+        if base is None or current["p50_ms"] <= base["p50_ms"] * max_growth:
+            continue
+        regressions.append(
+            f"{name}: p50 {base['p50_ms']} ms при {sizes[0]} -> "
+            f"{current['p50_ms']} ms при {sizes[-1]}"
+        )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=4, help="Сложность bcrypt")
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    parser.add_argument("--output", help="Файл для сохранения результатов (JSON)")
+    parser.add_argument("--baseline", help="Прогон для сравнения (JSON)")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument(
+        "--max-growth", type=float, help="Допустимый рост p50 с объемом данных"
+    )
+    args = parser.parse_args()
+
+    # Читается лениво при создании хешера, в том числе в процессе uvicorn
+    os.environ["PASSWORD_HASH_ROUNDS"] = str(args.rounds)
+    disable_load_shedding()
+
+    if args.mode == "inprocess":
+        results = asyncio.run(
+            run_inprocess(args.sizes, args.requests, args.concurrency)
+        )
+    else:
+        results = asyncio.run(
+            run_uvicorn(
+                args.sizes, args.requests, args.concurrency, args.startup_timeout
+            )
+        )
+
+    report = {
+        "meta": {
+            "mode": args.mode,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "rounds": args.rounds,
+            "store": os.environ.get("USER_STORE_BACKEND", "memory"),
+            "python": platform.python_version(),
+            "started_at": datetime.now().isoformat(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    regressions: Optional[List[str]] = None
+    if args.max_growth is not None and len(results) > 1:
+        regressions = growth_regressions(results, args.max_growth)
+        report["regressions"] = regressions
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for key in ("mode", "concurrency", "store"):
+            if baseline["meta"].get(key) != report["meta"][key]:
+                print(f"Внимание: в базовом прогоне другой {key}", file=sys.stderr)
+        regressions = (regressions or []) + compare(
+            results, baseline["results"], args.threshold
+        )
+        report["regressions"] = regressions
+
+    print(json.dumps(report, indent=2))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
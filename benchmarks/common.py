@@ -0,0 +1,39 @@
+"""
+Общие функции бенчмарков: перцентили и сводка задержек.
+"""
+
+import os
+from typing import List
+
+# Нагрузка идет с одного клиента быстрее любого лимита частоты, а задержка
+# event loop - часть измерения, поэтому защита от перегрузки выключается
+UNLIMITED_ENV = {
+    "RATE_LIMIT_BACKEND": "off",
+    "ADMISSION_READ_LIMIT": "0",
+    "ADMISSION_WRITE_LIMIT": "0",
+    "ADMISSION_BULK_LIMIT": "0",
+    "ADMISSION_MAX_LAG": "0",
+}
+
+
+def disable_load_shedding() -> None:
+    """Выключение лимитов приложения (до первого чтения его настроек)."""
+    for name, value in UNLIMITED_ENV.items():
+        os.environ.setdefault(name, value)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль q (0..100) по отсортированной выборке."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: List[float]) -> dict:
+    """p50/p99/max в миллисекундах."""
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+    }
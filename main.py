@@ -1,43 +1,50 @@
 """
 Главный файл FastAPI приложения.
 Точка входа в приложение с настройкой роутов и middleware.
+
+Приложение собирает фабрика create_app(settings); модульный app нужен
+для `uvicorn main:app` и тестов. Тяжелые подсистемы (хранилище, пул
+хеширования паролей, passlib) создаются при первом обращении, а не при
+импорте, чтобы новый под начинал отвечать как можно раньше.
 """
 
-import uvicorn
+from contextlib import asynccontextmanager
+from typing import Optional
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 
-from app.routes import health, users
-
-# Создание экземпляра приложения
-app = FastAPI(
-    title="TeachMe CI/CD API",
-    description="Демонстрационное FastAPI приложение для изучения CI/CD процессов",
-    version="1.0.2",
-    docs_url="/docs",
-    redoc_url="/redoc",
-)
-
-# Настройка CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # В продакшене указать конкретные домены
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+from app.admission import AdmissionMiddleware, create_admission_controller
+from app.compression import CompressionMiddleware
+from app.config import Settings, get_settings
+from app.metrics import MetricsMiddleware
+from app.profiling import create_debug_profiler
+from app.ratelimit import RateLimitMiddleware, create_rate_limit_backend
+from app.routes import debug, health, users
+from app.security import PasswordHasherBusyError, close_password_hasher
+from app.static import InMemoryStaticFiles
+from app.storage import close_user_store, user_store_for
 
-# Подключение роутеров
-app.include_router(health.router, tags=["Health"])
-app.include_router(users.router, prefix="/api/v1", tags=["Users"])
 
-# Подключение статических файлов (UI)
-app.mount("/ui", StaticFiles(directory="static", html=True), name="static")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Жизненный цикл приложения: восстановление хранилища с диска в фоне
+    (до его окончания /readyz отвечает 503), замер задержки event loop
+    и освобождение ресурсов.
+    """
+    user_store_for(app).start()
+    app.state.admission.monitor.start()
+    yield
+    await app.state.admission.monitor.stop()
+    if app.state.rate_limit is not None:
+        await app.state.rate_limit.close()
+    await close_user_store(app)
+    close_password_hasher(app)
 
 
-@app.get("/")
 async def root():
     """Корневой endpoint."""
     return {
@@ -48,7 +55,6 @@ async def root():
     }
 
 
-@app.exception_handler(404)
 async def not_found_handler(request, exc):
     """Обработчик для несуществующих маршрутов."""
     return JSONResponse(
@@ -57,7 +63,15 @@ async def not_found_handler(request, exc):
     )
 
 
-@app.exception_handler(500)
+async def password_hasher_busy_handler(request, exc):
+    """Перегрузка пула хеширования паролей: клиенту стоит повторить позже."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Сервис перегружен, повторите запрос позже"},
+        headers={"Retry-After": "1"},
+    )
+
+
 async def internal_error_handler(request, exc):
     """Обработчик внутренних ошибок сервера."""
     return JSONResponse(
@@ -66,8 +80,118 @@ async def internal_error_handler(request, exc):
     )
 
 
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    """
+    Создание приложения по настройкам (по умолчанию - из окружения).
+
+    Хранилище пользователей и пул хеширования у каждого приложения свои:
+    они создаются по этим настройкам при первом обращении и лежат в
+    app.state (см. user_store_for, password_hasher_for).
+    """
+    settings = settings or get_settings()
+
+    app = FastAPI(
+        title="TeachMe CI/CD API",
+        description="Демонстрационное FastAPI приложение для изучения CI/CD процессов",
+        version="1.0.2",
+        docs_url="/docs",
+        redoc_url="/redoc",
+        lifespan=lifespan,
+    )
+
+    app.state.settings = settings
+
+    # Контроль допуска: ближе всех к маршрутам, внутри CORS, чтобы ответ 503
+    # тоже получил CORS заголовки
+    app.state.admission = create_admission_controller(settings)
+    app.add_middleware(
+        AdmissionMiddleware,
+        controller=app.state.admission,
+        retry_after=settings.admission_retry_after,
+    )
+
+    # Лимит частоты по клиенту и маршруту: снаружи контроля допуска, чтобы
+    # шумный клиент не занимал его слоты
+    app.state.rate_limit = create_rate_limit_backend(settings)
+    if app.state.rate_limit is not None:
+        app.add_middleware(
+            RateLimitMiddleware,
+            backend=app.state.rate_limit,
+            rates={
+                "read": settings.rate_limit_read,
+                "write": settings.rate_limit_write,
+                "bulk": settings.rate_limit_bulk,
+            },
+            burst=settings.rate_limit_burst,
+            api_key_header=settings.rate_limit_api_key_header,
+            api_keys=[
+                key.strip()
+                for key in settings.rate_limit_api_keys.split(",")
+                if key.strip()
+            ],
+        )
+
+    # Настройка CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # В продакшене указать конкретные домены
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        # Курсор пагинации, ETag для условных запросов и лимиты частоты
+        expose_headers=[
+            "X-Next-Cursor",
+            "ETag",
+            "RateLimit-Limit",
+            "RateLimit-Remaining",
+            "RateLimit-Reset",
+            "RateLimit-Policy",
+            "Retry-After",
+        ],
+    )
+
+    # Сжатие ответов (gzip, brotli если установлен) по Accept-Encoding
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_min_size,
+        gzip_level=settings.compression_gzip_level,
+        brotli_quality=settings.compression_brotli_quality,
+    )
+
+    # Метрики Prometheus (/metrics); добавлено последним, поэтому внешнее
+    app.add_middleware(MetricsMiddleware)
+
+    # Подключение роутеров
+    app.include_router(health.router, tags=["Health"])
+    app.include_router(users.router, prefix="/api/v1", tags=["Users"])
+
+    # Профилирование по запросу (/debug/profile): только если задан токен
+    app.state.profiler = create_debug_profiler(settings)
+    if app.state.profiler is not None:
+        app.include_router(debug.router, tags=["Debug"], include_in_schema=False)
+
+    # Статические файлы (UI): из памяти, со сжатыми вариантами и ETag
+    if settings.static_in_memory:
+        static = InMemoryStaticFiles(directory="static", html=True)
+    else:
+        static = StaticFiles(directory="static", html=True)
+    app.mount("/ui", static, name="static")
+
+    app.add_api_route("/", root, methods=["GET"])
+    app.add_exception_handler(404, not_found_handler)
+    app.add_exception_handler(PasswordHasherBusyError, password_hasher_busy_handler)
+    app.add_exception_handler(500, internal_error_handler)
+    return app
+
+
+app = create_app()
+
+
 if __name__ == "__main__":
-    # Запуск сервера для разработки
+    # Запуск сервера для разработки; uvicorn импортируется только здесь,
+    # под `uvicorn main:app` он уже загружен самим CLI
+    import uvicorn
+
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
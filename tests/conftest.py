@@ -0,0 +1,13 @@
+"""
+Общие настройки тестов.
+Переменные окружения задаются до первого чтения настроек приложения.
+"""
+
+import os
+
+# Минимальная сложность bcrypt, чтобы тесты не тратили время на хеширование
+os.environ.setdefault("PASSWORD_HASH_ROUNDS", "4")
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "2")
+# Весь набор тестов ходит от одного клиента и быстрее любого разумного
+# лимита частоты; сам лимит проверяется в test_ratelimit.py
+os.environ.setdefault("RATE_LIMIT_BACKEND", "off")
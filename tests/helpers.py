@@ -0,0 +1,18 @@
+"""
+Общие вспомогательные функции тестов.
+"""
+
+from datetime import datetime
+
+
+def make_user(name: str, **fields) -> dict:
+    """Запись пользователя без id; fields заменяют значения по умолчанию."""
+    return {
+        "email": f"{name}@example.com",
+        "username": name,
+        "full_name": None,
+        "created_at": datetime.now(),
+        "is_active": True,
+        "hashed_password": "hashed_password123",
+        **fields,
+    }
@@ -0,0 +1,146 @@
+"""
+Тесты контроля допуска и сброса нагрузки.
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+from app.admission import (
+    AdmissionController,
+    AdmissionMiddleware,
+    LoopLagMonitor,
+    classify,
+)
+from app.routes import health
+
+
+def build_app(controller: AdmissionController) -> FastAPI:
+    """Приложение с маршрутом, который ждет сигнала, и /readyz."""
+    test_app = FastAPI()
+    test_app.state.admission = controller
+    test_app.state.release = asyncio.Event()
+    test_app.add_middleware(AdmissionMiddleware, controller=controller, retry_after=2)
+    test_app.include_router(health.router)
+
+    @test_app.get("/slow")
+    async def slow(request: Request):
+        await request.app.state.release.wait()
+        return {"status": "done"}
+
+    @test_app.post("/write")
+    async def write():
+        return {"status": "ok"}
+
+    return test_app
+
+
+def client_for(test_app: FastAPI) -> httpx.AsyncClient:
+    transport = httpx.ASGITransport(app=test_app)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+@pytest.mark.unit
+def test_classify():
+    assert classify("GET", "/healthz") is None
+    assert classify("GET", "/metrics") is None
+    assert classify("GET", "/api/v1/users/1") == "read"
+    assert classify("PUT", "/api/v1/users/1") == "write"
+    assert classify("POST", "/api/v1/users:batchGet") == "read"
+    assert classify("POST", "/api/v1/users/import") == "bulk"
+    assert classify("GET", "/api/v1/users/export") == "bulk"
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_loop_lag_monitor():
+    """Блокировка event loop видна в lag сразу, еще до следующего замера."""
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start()
+    await asyncio.sleep(0.03)
+    assert monitor.lag < 0.1
+
+    time.sleep(0.2)  # Блокирующий вызов в event loop
+    assert monitor.lag >= 0.15
+    await asyncio.sleep(0.001)
+    assert monitor.last >= 0.15
+
+    # Задержка спадает плавно, а не до нуля на следующем замере
+    await asyncio.sleep(0.03)
+    assert 0.01 < monitor.last < 0.2
+    await asyncio.sleep(0.3)
+    assert monitor.last < 0.01
+
+    await monitor.stop()
+    assert monitor.lag == 0.0
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_concurrency_limit():
+    """Сверх лимита класса - сразу 503 с Retry-After, другие классы работают."""
+    controller = AdmissionController({"read": 2, "write": 0, "bulk": 0}, max_lag=0)
+    test_app = build_app(controller)
+
+    async with client_for(test_app) as client:
+        slow = [asyncio.create_task(client.get("/slow")) for _ in range(2)]
+        while controller.in_flight["read"] < 2:
+            await asyncio.sleep(0.001)
+
+        response = await client.get("/slow")
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "2"
+        assert response.json()["detail"]
+
+        # Лимит чтения не мешает записи и пробам
+        assert (await client.post("/write")).status_code == 200
+        response = await client.get("/readyz")
+        assert response.status_code == 503
+        assert response.json()["reason"] == "read requests at limit (2)"
+
+        test_app.state.release.set()
+        assert [r.status_code for r in await asyncio.gather(*slow)] == [200, 200]
+
+        assert controller.in_flight["read"] == 0
+        assert controller.rejected["read"] == 1
+        assert (await client.get("/slow")).status_code == 200
+        assert (await client.get("/readyz")).status_code == 200
+
+
+@pytest.mark.unit
+def test_readiness_ignores_bulk_limit():
+    """Занятые массовые операции отклоняют новые, но под остается готовым."""
+    controller = AdmissionController({"read": 1, "write": 1, "bulk": 1}, max_lag=0)
+    assert controller.try_acquire("bulk")
+    assert not controller.try_acquire("bulk")
+    assert controller.overload_reason() is None
+
+    assert controller.try_acquire("write")
+    assert controller.overload_reason() == "write requests at limit (1)"
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_loop_lag_shedding():
+    """Пока задержка event loop выше порога, запросы и /readyz получают 503."""
+    controller = AdmissionController({}, max_lag=0.1, lag_interval=0.01)
+    test_app = build_app(controller)
+    controller.monitor.start()
+
+    async with client_for(test_app) as client:
+        assert (await client.post("/write")).status_code == 200
+
+        time.sleep(0.3)
+        assert (await client.post("/write")).status_code == 503
+        response = await client.get("/readyz")
+        assert response.status_code == 503
+        assert response.json()["reason"].startswith("event loop lag")
+
+        await asyncio.sleep(0.3)  # Loop снова успевает, задержка спала
+        assert (await client.post("/write")).status_code == 200
+        assert (await client.get("/readyz")).status_code == 200
+
+    await controller.monitor.stop()
@@ -0,0 +1,173 @@
+"""
+Тесты кеша чтения пользователей.
+"""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.cache import MISSING, LRUCache
+from app.storage import CachedUserStore, InMemoryUserStore, get_user_store
+from app.storage.base import BatchOperation
+from main import app
+from tests.helpers import make_user
+
+client = TestClient(app)
+
+
+class CountingStore(InMemoryUserStore):
+    """Хранилище в памяти, считающее обращения на чтение."""
+
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    async def get(self, user_id):
+        self.reads += 1
+        return await super().get(user_id)
+
+    async def get_by_username(self, username):
+        self.reads += 1
+        return await super().get_by_username(username)
+
+
+@pytest.fixture
+def backend():
+    return CountingStore()
+
+
+@pytest.fixture
+def cached(backend):
+    return CachedUserStore(backend, maxsize=4, ttl=0)
+
+
+@pytest.mark.unit
+class TestLRUCache:
+    """Тесты LRUCache."""
+
+    def test_eviction_order(self):
+        """Тест: вытесняется давно не использованная запись."""
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+
+        assert cache.get("b") is MISSING
+        assert cache.get("a") == 1
+        assert cache.stats()["evictions"] == 1
+        assert cache.stats()["hits"] == 2
+        assert cache.stats()["misses"] == 1
+
+    def test_ttl(self, monkeypatch):
+        """Тест: просроченная запись считается промахом."""
+        now = [100.0]
+        monkeypatch.setattr("app.cache.time.monotonic", lambda: now[0])
+        cache = LRUCache(maxsize=2, ttl=5)
+        cache.set("a", None)
+
+        assert cache.get("a") is None
+        now[0] += 5
+        assert cache.get("a") is MISSING
+        assert len(cache) == 0
+
+
+@pytest.mark.unit
+class TestCachedUserStore:
+    """Тесты CachedUserStore."""
+
+    @pytest.mark.asyncio
+    async def test_hits_and_negative_caching(self, cached, backend):
+        """Тест: повторные чтения, включая 404, не доходят до хранилища."""
+        await cached.create(make_user("alice"))
+
+        for _ in range(3):
+            assert (await cached.get(1))["username"] == "alice"
+            assert (await cached.get_by_username("ALICE"))["id"] == 1
+            assert await cached.get(2) is None
+            assert await cached.get_by_username("bob") is None
+        assert backend.reads == 4
+
+    @pytest.mark.asyncio
+    async def test_create_invalidates_negative_entries(self, cached):
+        """Тест: созданный пользователь сразу виден по id и username."""
+        assert await cached.get(1) is None
+        assert await cached.get_by_username("alice") is None
+
+        await cached.create(make_user("alice"))
+
+        assert (await cached.get(1))["username"] == "alice"
+        assert (await cached.get_by_username("alice"))["id"] == 1
+
+    @pytest.mark.asyncio
+    async def test_rename_and_delete(self, cached):
+        """Тест: после переименования и удаления кеш не отдает старые данные."""
+        await cached.create(make_user("alice"))
+        assert await cached.get_by_username("alice")
+        assert await cached.get_by_username("carol") is None
+
+        await cached.update(1, {"username": "carol"})
+        assert await cached.get_by_username("alice") is None
+        assert (await cached.get_by_username("carol"))["id"] == 1
+        assert (await cached.get(1))["version"] == 2
+
+        await cached.delete(1)
+        assert await cached.get(1) is None
+        assert await cached.get_by_username("carol") is None
+
+    @pytest.mark.asyncio
+    async def test_batch_invalidates(self, cached):
+        """Тест: пакетные операции инвалидируют затронутые записи."""
+        await cached.create(make_user("alice"))
+        assert await cached.get(1)
+        assert await cached.get(2) is None
+
+        await cached.apply_batch(
+            [
+                BatchOperation("create", None, make_user("bob")),
+                BatchOperation("update", 1, {"full_name": "Alice"}),
+            ]
+        )
+
+        assert (await cached.get(1))["full_name"] == "Alice"
+        assert (await cached.get(2))["username"] == "bob"
+
+    @pytest.mark.asyncio
+    async def test_read_racing_write_is_not_cached(self, cached, backend):
+        """Тест: результат чтения, пересекшегося с записью, не кешируется."""
+        await cached.create(make_user("alice"))
+        original_get = backend.get
+
+        async def slow_get(user_id):
+            user = dict(await original_get(user_id))
+            await asyncio.sleep(0.01)
+            return user
+
+        backend.get = slow_get
+        read = asyncio.ensure_future(cached.get(1))
+        await asyncio.sleep(0)
+        await cached.update(1, {"full_name": "New"})
+        await read
+        backend.get = original_get
+
+        assert (await cached.get(1))["full_name"] == "New"
+
+
+@pytest.mark.integration
+def test_cache_stats_endpoint():
+    """Тест endpoint счетчиков кеша."""
+    assert client.get("/stats/cache").json() == {"enabled": False}
+
+    cached = CachedUserStore(InMemoryUserStore(), maxsize=10, ttl=0)
+    app.dependency_overrides[get_user_store] = lambda: cached
+    try:
+        client.get("/api/v1/users/1")
+        client.get("/api/v1/users/1")
+        stats = client.get("/stats/cache").json()
+    finally:
+        app.dependency_overrides.clear()
+
+    assert stats["enabled"] is True
+    assert stats["by_id"]["hits"] == 1
+    assert stats["by_id"]["misses"] == 1
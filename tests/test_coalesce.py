@@ -0,0 +1,145 @@
+"""
+Тесты объединения одинаковых одновременных чтений.
+"""
+
+import asyncio
+from datetime import datetime
+
+import httpx
+import pytest
+
+from app.coalesce import SingleFlight
+from app.routes import users as users_routes
+from app.storage import user_store_for
+from main import app
+
+
+@pytest.mark.unit
+class TestSingleFlight:
+    """Тесты SingleFlight."""
+
+    @pytest.mark.asyncio
+    async def test_shared_result(self):
+        flights = SingleFlight()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return object()
+
+        results = await asyncio.gather(*(flights.do("key", compute) for _ in range(10)))
+        assert calls == 1
+        assert all(result is results[0] for result in results)
+        assert flights.stats() == {"in_flight": 0, "leaders": 1, "followers": 9}
+
+        # Вычисление закончилось: следующий запрос считает заново
+        await flights.do("key", compute)
+        await flights.do("other", compute)
+        assert calls == 3
+
+    @pytest.mark.asyncio
+    async def test_error_shared(self):
+        flights = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(
+            *(flights.do("key", fail) for _ in range(3)), return_exceptions=True
+        )
+        assert all(isinstance(result, ValueError) for result in results)
+        assert len(flights) == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter(self):
+        """Отмена одного ожидающего не отменяет вычисление для остальных."""
+        flights = SingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        leader = asyncio.create_task(flights.do("key", compute))
+        follower = asyncio.create_task(flights.do("key", compute))
+        await asyncio.sleep(0.005)
+        leader.cancel()
+        assert await follower == "done"
+        assert leader.cancelled()
+
+    @pytest.mark.asyncio
+    async def test_forget(self):
+        """После forget() новые запросы не получают начатое до этого чтение."""
+        flights = SingleFlight()
+        value = "old"
+
+        async def compute():
+            result = value
+            await asyncio.sleep(0.01)
+            return result
+
+        first = asyncio.create_task(flights.do("key", compute))
+        await asyncio.sleep(0.001)
+        value = "new"
+        flights.forget()
+        second = asyncio.create_task(flights.do("key", compute))
+        assert await first == "old"
+        assert await second == "new"
+        assert flights.leaders == 2
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_concurrent_user_reads(monkeypatch):
+    """Одновременные GET одного пользователя - одно чтение из хранилища."""
+    store = user_store_for(app)
+    await store.clear()
+    user = await store.create(
+        {
+            "email": "popular@example.com",
+            "username": "popular",
+            "full_name": "Popular User",
+            "created_at": datetime.now(),
+            "is_active": True,
+            "hashed_password": "hashed_password123",
+        }
+    )
+    store_get = store.get
+    calls = 0
+
+    async def slow_get(user_id):
+        # Данные на момент начала чтения, ответ - с задержкой, как у базы
+        nonlocal calls
+        calls += 1
+        user = await store_get(user_id)
+        await asyncio.sleep(0.1)
+        return user
+
+    monkeypatch.setattr(store, "get", slow_get)
+    monkeypatch.setattr(users_routes, "reads", SingleFlight())
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        path = f"/api/v1/users/{user['id']}"
+        responses = await asyncio.gather(*(client.get(path) for _ in range(20)))
+        assert calls == 1
+        assert {r.status_code for r in responses} == {200}
+        assert len({r.content for r in responses}) == 1
+        assert len({r.headers["etag"] for r in responses}) == 1
+
+        # Запись во время чтения: запрос после нее не получает старые данные
+        reader = asyncio.create_task(client.get(path))
+        await asyncio.sleep(0.005)
+        response = await client.put(path, json={"full_name": "Renamed"})
+        assert response.status_code == 200
+        assert (await client.get(path)).json()["full_name"] == "Renamed"
+        assert (await reader).status_code == 200
+
+        responses = await asyncio.gather(
+            *(client.get("/api/v1/users/999999") for _ in range(5))
+        )
+        assert {r.status_code for r in responses} == {404}
+
+    await store.clear()
@@ -0,0 +1,163 @@
+"""
+Тесты сжатия HTTP ответов.
+"""
+
+import asyncio
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.compression import CompressionMiddleware, negotiate, skip_compression
+from app.storage import user_store_for
+from main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def users():
+    """Достаточно пользователей, чтобы страница списка превысила порог."""
+    store = user_store_for(app)
+    asyncio.run(store.clear())
+    asyncio.run(
+        store.create_many(
+            [
+                {
+                    "email": f"user{i}@example.com",
+                    "username": f"user{i}",
+                    "full_name": f"User Number {i}",
+                    "created_at": datetime.now(),
+                    "is_active": True,
+                    "hashed_password": "hashed_password123",
+                }
+                for i in range(50)
+            ]
+        )
+    )
+    yield
+    asyncio.run(store.clear())
+
+
+def build_app(**options) -> FastAPI:
+    """Маленькое приложение с потоковым и отключенным от сжатия маршрутами."""
+    test_app = FastAPI()
+    test_app.add_middleware(CompressionMiddleware, **options)
+
+    @test_app.get("/text")
+    async def text():
+        return PlainTextResponse("a" * 5000)
+
+    @test_app.get("/raw", dependencies=[Depends(skip_compression)])
+    async def raw():
+        return PlainTextResponse("a" * 5000)
+
+    @test_app.get("/stream")
+    async def stream():
+        async def lines():
+            for i in range(100):
+                yield f"line {i}\n".encode()
+
+        return StreamingResponse(lines(), media_type="text/plain")
+
+    return test_app
+
+
+@pytest.mark.unit
+class TestNegotiation:
+    """Тесты выбора кодировки по Accept-Encoding."""
+
+    def test_preference(self):
+        assert negotiate("gzip, br", ("br", "gzip")) == "br"
+        assert negotiate("gzip;q=1.0, br;q=0.5", ("br", "gzip")) == "gzip"
+        assert negotiate("gzip, deflate", ("gzip",)) == "gzip"
+
+    def test_rejected(self):
+        assert negotiate("", ("gzip",)) is None
+        assert negotiate("identity", ("gzip",)) is None
+        assert negotiate("gzip;q=0", ("gzip",)) is None
+        assert negotiate("*;q=0.5, gzip;q=0", ("br", "gzip")) == "br"
+        assert negotiate("gzip;q=bad", ("gzip",)) is None
+
+    def test_wildcard(self):
+        assert negotiate("*", ("gzip",)) == "gzip"
+
+
+@pytest.mark.integration
+class TestCompressionMiddleware:
+    """Тесты сжатия ответов приложения."""
+
+    def test_large_list_is_compressed(self, users):
+        response = client.get(
+            "/api/v1/users", params={"limit": 50}, headers={"Accept-Encoding": "gzip"}
+        )
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert int(response.headers["content-length"]) < len(response.content)
+        assert len(response.json()) == 50
+
+        # ETag сжатого представления слабый, но условный запрос работает
+        etag = response.headers["etag"]
+        assert etag.startswith("W/")
+        response = client.get(
+            "/api/v1/users",
+            params={"limit": 50},
+            headers={"Accept-Encoding": "gzip", "If-None-Match": etag},
+        )
+        assert response.status_code == 304
+
+    def test_small_response_not_compressed(self):
+        response = client.get("/healthz", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+
+    def test_identity(self, users):
+        response = client.get(
+            "/api/v1/users",
+            params={"limit": 50},
+            headers={"Accept-Encoding": "identity"},
+        )
+        assert "content-encoding" not in response.headers
+        assert not response.headers["etag"].startswith("W/")
+
+    def test_export_not_compressed_twice(self, users):
+        response = client.get(
+            "/api/v1/users/export", headers={"Accept-Encoding": "gzip"}
+        )
+        assert response.headers["content-encoding"] == "gzip"
+        # httpx распаковывает gzip один раз: внутри уже NDJSON
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert len(rows) == 50
+
+    def test_skip_compression(self):
+        test_client = TestClient(build_app())
+        headers = {"Accept-Encoding": "gzip"}
+        response = test_client.get("/text", headers=headers)
+        assert response.headers["content-encoding"] == "gzip"
+        response = test_client.get("/raw", headers=headers)
+        assert "content-encoding" not in response.headers
+
+    def test_threshold(self):
+        test_client = TestClient(build_app(minimum_size=10_000))
+        response = test_client.get("/text", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+
+    def test_streaming(self):
+        test_client = TestClient(build_app())
+        with test_client.stream(
+            "GET", "/stream", headers={"Accept-Encoding": "gzip"}
+        ) as response:
+            assert response.headers["content-encoding"] == "gzip"
+            assert "content-length" not in response.headers
+            raw = b"".join(response.iter_raw())
+        assert gzip.decompress(raw) == b"".join(
+            f"line {i}\n".encode() for i in range(100)
+        )
+
+    def test_invalid_level(self):
+        with pytest.raises(ValueError):
+            CompressionMiddleware(build_app(), gzip_level=10)
@@ -0,0 +1,189 @@
+"""
+Тесты журнала упреждающей записи и снимков хранилища в памяти.
+"""
+
+import asyncio
+import os
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.storage import (
+    CompactUserStore,
+    DurableUserStore,
+    InMemoryUserStore,
+    get_user_store,
+)
+from app.storage.base import BatchOperation
+from main import app
+from tests.helpers import make_user
+
+
+def durable_user(name: str) -> dict:
+    """Запись с заполненным full_name и микросекундами в created_at."""
+    return make_user(
+        name,
+        full_name=f"{name.title()} Smith",
+        created_at=datetime(2024, 5, 1, 12, 30, 15, 123456),
+    )
+
+
+async def fill(store: DurableUserStore) -> None:
+    """Создание, изменение и удаление пользователей."""
+    await store.create_many([durable_user(f"user{i}") for i in range(1, 6)])
+    await store.update(2, {"full_name": "Renamed", "is_active": False})
+    await store.delete(3)
+    await store.apply_batch(
+        [
+            BatchOperation("create", data=durable_user("batch")),
+            BatchOperation("delete", user_id=4),
+        ]
+    )
+
+
+async def state(store) -> list:
+    return [user async for page in store.iter_pages(2) for user in page]
+
+
+@pytest.fixture(params=[InMemoryUserStore, CompactUserStore])
+def store_class(request):
+    return request.param
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("snapshot_every", [1000, 3])
+def test_recovery(tmp_path, store_class, snapshot_every):
+    """Тест: после перезапуска данные восстанавливаются из снимка и журнала."""
+    directory = str(tmp_path / "wal")
+
+    async def scenario():
+        first = DurableUserStore(
+            store_class(), directory, fsync="always", snapshot_every=snapshot_every
+        )
+        await fill(first)
+        if first._snapshot_task is not None:
+            await first._snapshot_task
+        expected = await state(first)
+        await first.close()
+
+        second = DurableUserStore(store_class(), directory)
+        assert await state(second) == expected
+        assert [user["id"] for user in expected] == [1, 2, 5, 6]
+        assert (await second.get(2))["is_active"] is False
+        assert (await second.get_by_username("USER5"))["id"] == 5
+        assert [user["id"] for user in await second.search("smi")] == [1, 5, 6]
+        # Следующий id продолжает последовательность, а не начинается с 1
+        assert (await second.create(durable_user("next")))["id"] == 7
+        await second.close()
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.unit
+def test_snapshot_replaces_old_files(tmp_path):
+    """Тест: снимок удаляет покрытые им сегменты журнала."""
+    directory = tmp_path / "wal"
+
+    async def scenario():
+        store = DurableUserStore(InMemoryUserStore(), str(directory), fsync="always")
+        await fill(store)
+        await store.snapshot()
+        await store.update(1, {"full_name": "After snapshot"})
+        await store.close()
+
+        names = sorted(os.listdir(directory))
+        assert len([name for name in names if name.startswith("snapshot")]) == 1
+        assert len([name for name in names if name.startswith("wal")]) == 1
+
+        restored = DurableUserStore(InMemoryUserStore(), str(directory))
+        assert (await restored.get(1))["full_name"] == "After snapshot"
+        assert len(await state(restored)) == 4
+        await restored.close()
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.unit
+def test_torn_tail_is_ignored(tmp_path):
+    """Тест: оборванная при сбое запись в конце журнала отбрасывается."""
+    directory = tmp_path / "wal"
+
+    async def scenario():
+        store = DurableUserStore(InMemoryUserStore(), str(directory), fsync="always")
+        await store.create(durable_user("alice"))
+        await store.create(durable_user("bob"))
+        await store.close()
+
+        (segment,) = directory.glob("wal-*.log")
+        segment.write_bytes(segment.read_bytes()[:-5])
+
+        restored = DurableUserStore(InMemoryUserStore(), str(directory))
+        assert [user["username"] for user in await state(restored)] == ["alice"]
+        await restored.close()
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.unit
+def test_interval_fsync_flushes_in_background(tmp_path):
+    """Тест: при fsync=interval журнал сбрасывается без ожидания запроса."""
+    directory = tmp_path / "wal"
+
+    async def scenario():
+        store = DurableUserStore(
+            InMemoryUserStore(), str(directory), fsync="interval", flush_interval=0.01
+        )
+        await store.create(durable_user("alice"))
+        await asyncio.sleep(0.2)
+        (segment,) = directory.glob("wal-*.log")
+        assert segment.stat().st_size > 0
+        await store.close()
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.unit
+def test_invalid_fsync_policy(tmp_path):
+    """Тест: неизвестная политика fsync отклоняется."""
+    with pytest.raises(ValueError):
+        DurableUserStore(InMemoryUserStore(), str(tmp_path), fsync="sometimes")
+
+
+@pytest.mark.integration
+def test_readyz_waits_for_recovery(tmp_path):
+    """Тест: /readyz отвечает 503, пока хранилище не восстановлено."""
+    store = DurableUserStore(InMemoryUserStore(), str(tmp_path / "wal"))
+    app.dependency_overrides[get_user_store] = lambda: store
+    try:
+        client = TestClient(app)
+        response = client.get("/readyz")
+        assert response.status_code == 503
+        assert response.json()["status"] == "not ready"
+
+        # Первый запрос к хранилищу дожидается восстановления
+        assert client.get("/api/v1/users").status_code == 200
+        assert client.get("/readyz").status_code == 200
+    finally:
+        app.dependency_overrides.clear()
+        asyncio.run(store.close())
+
+
+@pytest.mark.integration
+def test_readyz_reports_failed_recovery(tmp_path, caplog):
+    """Тест: неудачное восстановление видно в /readyz и в логе, а не как "recovering"."""
+    blocker = tmp_path / "not-a-directory"
+    blocker.write_text("")
+    store = DurableUserStore(InMemoryUserStore(), str(blocker / "wal"))
+    app.dependency_overrides[get_user_store] = lambda: store
+    try:
+        client = TestClient(app, raise_server_exceptions=False)
+        assert client.get("/api/v1/users").status_code == 500
+
+        response = client.get("/readyz")
+        assert response.status_code == 503
+        assert response.json()["reason"].startswith("store failed:")
+        assert "Восстановление хранилища" in caplog.text
+    finally:
+        app.dependency_overrides.clear()
+        asyncio.run(store.close())
@@ -3,10 +3,17 @@
 Smoke тесты для проверки работоспособности приложения.
 """
 
+import asyncio
+import json
+import os
+
 import pytest
 from fastapi.testclient import TestClient
 
-from main import app
+from app.config import Settings
+from app.routes import health
+from app.routes.health import DeploymentInfoCache
+from main import app, create_app
 
 client = TestClient(app)
 
@@ -61,6 +68,23 @@ def test_root_endpoint():
     assert data["docs"] == "/docs"
 
 
+@pytest.mark.smoke
+def test_create_app():
+    """Фабрика приложения: отдельный экземпляр по переданным настройкам."""
+    settings = Settings(static_in_memory=False, compression_min_size=10)
+    factory_client = TestClient(create_app(settings))
+
+    assert factory_client.get("/healthz").status_code == 200
+    response = factory_client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    # StaticFiles вместо раздачи из памяти: без Cache-Control
+    response = factory_client.get("/ui/")
+    assert response.status_code == 200
+    assert "cache-control" not in response.headers
+    assert client.get("/ui/").headers["cache-control"] == "no-cache"
+    assert factory_client.get("/missing").json()["detail"] == "Endpoint не найден"
+
+
 @pytest.mark.smoke
 def test_deployment_endpoint():
     """Тест deployment status endpoint."""
@@ -86,3 +110,62 @@ def test_deployment_endpoint():
     # Проверяем значения
     assert data["status"] == "deployed"
     assert data["server"] == "AWS EC2"
+
+
+@pytest.mark.unit
+def test_deployment_info_cache(tmp_path, monkeypatch):
+    """Тест: файл деплоя перечитывается только после изменения."""
+    path = tmp_path / "deployment_info.json"
+    cache = DeploymentInfoCache(str(path), check_interval=0)
+    opened = []
+    real_open = open
+    monkeypatch.setattr(
+        health, "open", lambda *args: opened.append(args) or real_open(*args), False
+    )
+
+    assert asyncio.run(cache.get())["deployed_at"] == "unknown"
+
+    path.write_text(json.dumps({"deployed_at": "today", "commit_sha": "abc"}))
+    assert asyncio.run(cache.get())["commit_sha"] == "abc"
+    assert asyncio.run(cache.get())["commit_sha"] == "abc"
+    assert len(opened) == 1
+
+    path.write_text(json.dumps({"deployed_at": "today", "commit_sha": "def"}))
+    os.utime(path, ns=(0, 10**9))
+    assert asyncio.run(cache.get())["commit_sha"] == "def"
+    assert len(opened) == 2
+
+    path.unlink()
+    assert asyncio.run(cache.get())["deployed_at"] == "unknown"
+
+
+@pytest.mark.unit
+def test_deployment_info_cache_first_load(tmp_path, monkeypatch):
+    """Тест: параллельные запросы при первой загрузке ждут одну проверку."""
+    path = tmp_path / "deployment_info.json"
+    path.write_text(json.dumps({"deployed_at": "today", "commit_sha": "abc"}))
+    cache = DeploymentInfoCache(str(path), check_interval=60)
+    stats = []
+    real_stat = os.stat
+    monkeypatch.setattr(
+        health.os,
+        "stat",
+        lambda path, **kwargs: stats.append(path) or real_stat(path, **kwargs),
+    )
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get() for _ in range(10)))
+
+    results = asyncio.run(scenario())
+    assert [info["commit_sha"] for info in results] == ["abc"] * 10
+    assert len(stats) == 1
+
+
+@pytest.mark.unit
+def test_deployment_info_cache_throttles_stat(tmp_path, monkeypatch):
+    """Тест: в пределах интервала проверки файловая система не трогается."""
+    cache = DeploymentInfoCache(str(tmp_path / "missing.json"), check_interval=60)
+    asyncio.run(cache.get())
+
+    monkeypatch.setattr(health.os, "stat", lambda path: pytest.fail("stat called"))
+    assert asyncio.run(cache.get())["deployed_at"] == "unknown"
@@ -0,0 +1,88 @@
+"""
+Тесты метрик Prometheus.
+"""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import metrics
+from app.metrics import Histogram, MetricsRegistry
+from app.storage import user_store_for
+from main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def clear_metrics():
+    metrics.registry.clear()
+    asyncio.run(user_store_for(app).clear())
+    yield
+    asyncio.run(user_store_for(app).clear())
+
+
+def sample(text: str, line_prefix: str) -> float:
+    """Значение ряда метрики по началу строки."""
+    for line in text.splitlines():
+        if line.startswith(line_prefix):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"Нет ряда {line_prefix}")
+
+
+@pytest.mark.unit
+def test_histogram_buckets():
+    """Тест: значения попадают в корзины, в выводе они накопительные."""
+    histogram = Histogram((1, 10))
+    for value in (0.5, 1, 5, 50):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1]
+
+    registry = MetricsRegistry()
+    registry.route("GET", "/x").duration = histogram
+    text = registry.render()
+    name, labels = "http_request_duration_seconds", 'method="GET",route="/x"'
+    assert sample(text, f'{name}_bucket{{{labels},le="1.0"}}') == 2
+    assert sample(text, f'{name}_bucket{{{labels},le="+Inf"}}') == 4
+    assert sample(text, f"{name}_sum{{{labels}}}") == 56.5
+    assert sample(text, f"{name}_count{{{labels}}}") == 4
+
+
+@pytest.mark.integration
+def test_metrics_by_route_template():
+    """Тест: метрики группируются по шаблону маршрута, а не по пути."""
+    for user_id in (1, 2, 3):
+        client.get(f"/api/v1/users/{user_id}")
+    client.get("/healthz")
+    client.get("/no/such/path")
+    client.post("/healthz")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+
+    route = 'method="GET",route="/api/v1/users/{user_id}"'
+    assert sample(text, f'http_requests_total{{{route},status="404"}}') == 3
+    assert sample(text, f"http_request_duration_seconds_count{{{route}}}") == 3
+    assert sample(text, f"http_requests_in_progress{{{route}}}") == 0
+    total = "http_requests_total"
+    assert sample(text, f'{total}{{method="GET",route="/healthz",status="200"}}') == 1
+    assert sample(text, f'{total}{{method="GET",route="unmatched",status="404"}}') == 1
+    assert sample(text, f'{total}{{method="POST",route="/healthz",status="405"}}') == 1
+    assert "/api/v1/users/1" not in text
+
+    # Запрос к /metrics виден как выполняющийся
+    assert sample(text, 'http_requests_in_progress{method="GET",route="/metrics"}') == 1
+
+
+@pytest.mark.integration
+def test_response_size_metric():
+    """Тест: размер тела ответа попадает в гистограмму."""
+    body = client.get("/healthz").content
+    text = client.get("/metrics").text
+
+    labels = 'method="GET",route="/healthz"'
+    assert sample(text, f"http_response_size_bytes_sum{{{labels}}}") == len(body)
+    assert sample(text, f'http_response_size_bytes_bucket{{{labels},le="100.0"}}') == 1
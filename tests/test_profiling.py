@@ -0,0 +1,94 @@
+"""
+Тесты профилирования по запросу (/debug/profile).
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.config import Settings
+from main import create_app
+
+TOKEN = {"X-Debug-Token": "secret"}
+
+
+def busy_app():
+    """Приложение с профилированием и маршрутом, нагружающим процессор."""
+    app = create_app(Settings(debug_profile_token="secret", rate_limit_backend="off"))
+
+    async def busy():
+        deadline = time.process_time() + 0.05
+        while time.process_time() < deadline:
+            pass
+        return {"status": "done"}
+
+    app.add_api_route("/busy", busy, methods=["GET"])
+    return app
+
+
+def client_for(app) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://t"
+    )
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_disabled_by_default():
+    async with client_for(create_app(Settings())) as client:
+        response = await client.get("/debug/profile?seconds=0.1", headers=TOKEN)
+        assert response.status_code == 404
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_guard():
+    async with client_for(busy_app()) as client:
+        response = await client.get("/debug/profile?seconds=0.1")
+        assert response.status_code == 403
+        response = await client.get(
+            "/debug/profile?seconds=0.1", headers={"X-Debug-Token": "wrong"}
+        )
+        assert response.status_code == 403
+        response = await client.get("/debug/profile?seconds=600", headers=TOKEN)
+        assert response.status_code == 400
+
+        # Один профиль за раз
+        first = asyncio.create_task(
+            client.get("/debug/profile?seconds=0.2", headers=TOKEN)
+        )
+        await asyncio.sleep(0.05)
+        second = await client.get("/debug/profile?seconds=0.1", headers=TOKEN)
+        assert second.status_code == 409
+        assert (await first).status_code == 200
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_collapsed_stacks_and_slow_requests():
+    async with client_for(busy_app()) as client:
+        profile = asyncio.create_task(
+            client.get(
+                "/debug/profile?seconds=0.5&interval_ms=1&slow_ms=20", headers=TOKEN
+            )
+        )
+        await asyncio.sleep(0.05)
+        await asyncio.gather(*(client.get("/busy") for _ in range(3)))
+        await client.get("/healthz")
+        response = await profile
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert int(response.headers["x-profile-samples"]) > 0
+    assert int(response.headers["x-profile-slow-requests"]) == 3
+
+    lines = response.text.splitlines()
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0
+        assert ";" in stack
+    slow = [line for line in lines if line.startswith("slow GET /busy;")]
+    assert slow
+    assert any("busy (tests/test_profiling.py:" in line for line in slow)
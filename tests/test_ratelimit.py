@@ -0,0 +1,140 @@
+"""
+Тесты ограничения частоты запросов.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import ratelimit
+from app.config import Settings
+from app.ratelimit import InMemoryRateLimitBackend
+from main import create_app
+
+
+class Clock:
+    """Управляемое время для пополнения корзин."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    return clock
+
+
+@pytest.mark.unit
+class TestInMemoryBackend:
+    """Тесты корзин токенов в памяти."""
+
+    @pytest.mark.asyncio
+    async def test_take_and_refill(self, clock):
+        backend = InMemoryRateLimitBackend()
+        results = [await backend.take("client", 2.0, 3) for _ in range(4)]
+
+        assert [r.allowed for r in results] == [True, True, True, False]
+        assert [r.remaining for r in results] == [2, 1, 0, 0]
+        assert results[-1].retry_after == pytest.approx(0.5)
+        assert results[-1].reset == pytest.approx(1.5)
+
+        clock.now += 0.5
+        assert (await backend.take("client", 2.0, 3)).allowed
+        assert not (await backend.take("client", 2.0, 3)).allowed
+        # Другая корзина не затронута
+        assert (await backend.take("other", 2.0, 3)).remaining == 2
+
+    @pytest.mark.asyncio
+    async def test_lazy_expiry(self, clock):
+        """Восстановившиеся корзины удаляются при создании новых."""
+        backend = InMemoryRateLimitBackend(shards=1)
+        for i in range(100):
+            await backend.take(i, 1.0, 10)
+        assert len(backend) == 100
+
+        clock.now += 0.5  # Корзины еще не восстановились
+        await backend.take("new", 1.0, 10)
+        assert len(backend) == 101
+
+        clock.now += 1.0
+        for i in range(50):
+            await backend.take(("next", i), 1.0, 10)
+        assert len(backend) == 51
+        assert backend.expired == 100
+
+    @pytest.mark.asyncio
+    async def test_max_entries(self, clock):
+        backend = InMemoryRateLimitBackend(max_entries=64, shards=4)
+        for i in range(1000):
+            await backend.take(i, 1.0, 10)
+        assert len(backend) <= 64
+        assert backend.evictions >= 1000 - 64
+
+    def test_invalid_shards(self):
+        with pytest.raises(ValueError):
+            InMemoryRateLimitBackend(shards=3)
+
+
+@pytest.mark.integration
+class TestRateLimitMiddleware:
+    """Тесты лимитов в приложении."""
+
+    @pytest.fixture
+    def client(self):
+        settings = Settings(
+            rate_limit_backend="memory",
+            rate_limit_read=1,
+            rate_limit_burst=3,
+            rate_limit_api_keys="secret, other",
+        )
+        return TestClient(create_app(settings))
+
+    def test_headers_and_429(self, client):
+        for remaining in ("2", "1", "0"):
+            response = client.get("/")
+            assert response.status_code == 200
+            assert response.headers["ratelimit-limit"] == "3"
+            assert response.headers["ratelimit-remaining"] == remaining
+            assert response.headers["ratelimit-policy"] == "3;w=3"
+
+        response = client.get("/")
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "1"
+        assert int(response.headers["ratelimit-reset"]) >= 1
+        assert response.json()["detail"]
+
+    def test_keys(self, client):
+        for _ in range(3):
+            client.get("/")
+        assert client.get("/").status_code == 429
+
+        # Неизвестные ключи не дают новых корзин: клиент - по IP
+        for key in ("0", "1", "2"):
+            response = client.get("/", headers={"X-API-Key": key})
+            assert response.status_code == 429
+
+        # Свой лимит у известного API ключа и у каждого шаблона маршрута
+        assert client.get("/", headers={"X-API-Key": "secret"}).status_code == 200
+        assert client.get("/api/v1/users/1").status_code == 404
+        assert client.get("/api/v1/users/2").headers["ratelimit-remaining"] == "1"
+
+        # Пробы не ограничиваются
+        for _ in range(5):
+            response = client.get("/healthz")
+            assert response.status_code == 200
+            assert "ratelimit-limit" not in response.headers
+
+    def test_disabled(self):
+        client = TestClient(create_app(Settings(rate_limit_backend="off")))
+        assert "ratelimit-limit" not in client.get("/").headers
+        # Выключен по умолчанию: без доверенного прокси все клиенты за
+        # балансировщиком делили бы одну корзину
+        assert Settings().rate_limit_backend == "off"
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            create_app(Settings(rate_limit_backend="nope"))
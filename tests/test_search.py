@@ -0,0 +1,59 @@
+"""
+Тесты индекса поиска пользователей.
+"""
+
+import pytest
+
+from app.storage import search
+from app.storage.search import SortedKeyList, UserSearchIndex, search_tokens
+
+
+@pytest.mark.unit
+def test_search_tokens():
+    """Тест разбиения username и full_name на слова."""
+    assert search_tokens("John_Doe", "Мария Иванова-Петрова") == {
+        "john_doe",
+        "john",
+        "doe",
+        "мария иванова-петрова",
+        "мария",
+        "иванова",
+        "петрова",
+    }
+    assert search_tokens("solo", None) == {"solo"}
+
+
+@pytest.mark.unit
+def test_sorted_key_list_blocks(monkeypatch):
+    """Тест: порядок сохраняется при разбиении и удалении блоков."""
+    monkeypatch.setattr(search, "BLOCK_SIZE", 4)
+    keys = SortedKeyList([f"k{i:03d}" for i in range(0, 40, 2)])
+    for i in range(1, 40, 2):
+        keys.add(f"k{i:03d}")
+
+    assert len(keys.blocks) > 1
+    assert list(keys.iter_from("")) == [f"k{i:03d}" for i in range(40)]
+
+    for i in range(0, 40, 3):
+        keys.discard(f"k{i:03d}")
+    keys.discard("missing")
+    expected = [f"k{i:03d}" for i in range(40) if i % 3]
+    assert list(keys.iter_from("")) == expected
+    assert list(keys.iter_from("k020")) == [key for key in expected if key >= "k020"]
+    assert len(keys) == len(expected)
+
+
+@pytest.mark.unit
+def test_search_returns_each_user_once():
+    """Тест: пользователь с несколькими совпавшими словами возвращается один раз."""
+    index = UserSearchIndex(
+        [
+            {"id": 1, "username": "anna", "full_name": "Anna Annenkova"},
+            {"id": 2, "username": "ann", "full_name": None},
+            {"id": 3, "username": "boris", "full_name": "Boris Annin"},
+        ]
+    )
+
+    assert index.search("ann", 10) == [2, 1, 3]
+    assert index.search("ANN", 2) == [2, 1]
+    assert index.search("z", 10) == []
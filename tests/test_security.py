@@ -0,0 +1,139 @@
+"""
+Тесты хеширования паролей.
+"""
+
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.security import PasswordHasher, PasswordHasherBusyError, password_hasher_for
+from app.storage import user_store_for
+from main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def hasher():
+    """Отдельный хешер с минимальной сложностью."""
+    hasher = PasswordHasher(rounds=4, max_workers=2, max_pending=4)
+    yield hasher
+    hasher.shutdown()
+
+
+@pytest.mark.unit
+class TestPasswordHasher:
+    """Тесты PasswordHasher."""
+
+    @pytest.mark.asyncio
+    async def test_hash_and_verify(self, hasher):
+        """Тест хеширования и проверки пароля."""
+        hashed = await hasher.hash("password123")
+
+        assert hashed.startswith("$2b$04$")
+        assert "password123" not in hashed
+        assert await hasher.verify("password123", hashed)
+        assert not await hasher.verify("wrong-password", hashed)
+        assert hasher.pending == 0
+
+    @pytest.mark.asyncio
+    async def test_hash_many_keeps_order(self, hasher):
+        """Тест: hash_many возвращает хеши в порядке паролей."""
+        passwords = ["first1", "second2", "third3"]
+        hashes = await hasher.hash_many(passwords)
+
+        assert len(hashes) == 3
+        for password, hashed in zip(passwords, hashes):
+            assert await hasher.verify(password, hashed)
+
+    @pytest.mark.asyncio
+    async def test_queue_limit(self, hasher):
+        """Тест: переполнение очереди сразу отклоняет запрос."""
+        with pytest.raises(PasswordHasherBusyError):
+            await hasher.hash_many(["p"] * 5)
+        assert hasher.pending == 0
+
+        busy = asyncio.ensure_future(hasher.hash_many(["p"] * 4))
+        await asyncio.sleep(0)
+        with pytest.raises(PasswordHasherBusyError):
+            await hasher.hash("one-more")
+        await busy
+        assert hasher.pending == 0
+
+
+@pytest.mark.integration
+class TestPasswordHashingAPI:
+    """Тесты хеширования паролей в API пользователей."""
+
+    @pytest.fixture(autouse=True)
+    def clear_users(self):
+        store = user_store_for(app)
+        asyncio.run(store.clear())
+        yield
+        asyncio.run(store.clear())
+
+    def test_create_and_update_store_bcrypt_hash(self):
+        """Тест: в хранилище сохраняется bcrypt хеш, а не пароль."""
+        user_data = {
+            "email": "hash@example.com",
+            "username": "hashuser",
+            "password": "password123",
+        }
+        user_id = client.post("/api/v1/users", json=user_data).json()["id"]
+        store, hasher = user_store_for(app), password_hasher_for(app)
+
+        stored = asyncio.run(store.get(user_id))
+        assert asyncio.run(hasher.verify("password123", stored["hashed_password"]))
+
+        client.put(f"/api/v1/users/{user_id}", json={"password": "newpassword"})
+        stored = asyncio.run(store.get(user_id))
+        assert asyncio.run(hasher.verify("newpassword", stored["hashed_password"]))
+
+    def test_create_user_when_hasher_busy(self):
+        """Тест: при переполненной очереди хеширования возвращается 503."""
+        hasher = password_hasher_for(app)
+        hasher.pending = hasher.max_pending
+        try:
+            response = client.post(
+                "/api/v1/users",
+                json={
+                    "email": "busy@example.com",
+                    "username": "busyuser",
+                    "password": "password123",
+                },
+            )
+        finally:
+            hasher.pending = 0
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+    def test_duplicate_rejected_before_hashing(self):
+        """Тест: дубликат отклоняется без хеширования пароля."""
+        user_data = {
+            "email": "first@example.com",
+            "username": "firstuser",
+            "password": "password123",
+        }
+        assert client.post("/api/v1/users", json=user_data).status_code == 201
+        duplicate = {**user_data, "email": "FIRST@example.com", "username": "other"}
+
+        # Хешер занят: запрос, дошедший до хеширования, получил бы 503
+        hasher = password_hasher_for(app)
+        hasher.pending = hasher.max_pending
+        try:
+            response = client.post("/api/v1/users", json=duplicate)
+            imported = client.post(
+                "/api/v1/users/import",
+                content=json.dumps(duplicate).encode(),
+                headers={"Content-Type": "application/x-ndjson"},
+            )
+        finally:
+            hasher.pending = 0
+
+        assert response.status_code == 400
+        assert "email" in response.json()["detail"].lower()
+        assert imported.status_code == 200
+        assert (imported.json()["created"], imported.json()["failed"]) == (0, 1)
@@ -0,0 +1,46 @@
+"""
+Тесты быстрой сериализации пользователей.
+"""
+
+import json
+from datetime import datetime
+
+import pytest
+
+from app.models import UserResponse
+from app.serialization import dump_user, dump_users
+
+
+def make_record(user_id: int) -> dict:
+    """Запись хранилища, включая приватные поля."""
+    return {
+        "id": user_id,
+        "email": f"user{user_id}@example.com",
+        "username": f"user{user_id}",
+        "full_name": "Полное Имя" if user_id % 2 else None,
+        "created_at": datetime(2024, 1, 2, 3, 4, 5, 678901),
+        "is_active": True,
+        "hashed_password": "$2b$04$secret",
+    }
+
+
+@pytest.mark.unit
+def test_dump_user_matches_user_response():
+    """Тест: JSON совпадает с сериализацией через UserResponse."""
+    record = make_record(1)
+
+    expected = json.loads(UserResponse(**record).model_dump_json())
+    assert json.loads(dump_user(record)) == expected
+    assert b"hashed_password" not in dump_user(record)
+
+
+@pytest.mark.unit
+def test_dump_users():
+    """Тест сериализации списка пользователей."""
+    records = [make_record(i) for i in range(1, 4)]
+
+    data = json.loads(dump_users(records))
+    assert [user["id"] for user in data] == [1, 2, 3]
+    assert all("hashed_password" not in user for user in data)
+    assert data[0]["created_at"] == "2024-01-02T03:04:05.678901"
+    assert dump_users([]) == b"[]"
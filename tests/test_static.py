@@ -0,0 +1,109 @@
+"""
+Тесты раздачи статического UI из памяти.
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.static import (
+    IMMUTABLE_CACHE_CONTROL,
+    REVALIDATE_CACHE_CONTROL,
+    InMemoryStaticFiles,
+)
+from main import app
+
+INDEX = b"<html><body>" + b"<p>TeachMe UI</p>" * 200 + b"</body></html>"
+
+
+@pytest.fixture
+def static_client(tmp_path):
+    """Приложение с каталогом статики во временной папке."""
+    (tmp_path / "index.html").write_bytes(INDEX)
+    (tmp_path / "app.3f2a9c1b.js").write_text("console.log('ui');" * 100)
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG tiny")
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "index.html").write_text("<p>docs</p>")
+
+    test_app = FastAPI()
+    test_app.mount("/ui", InMemoryStaticFiles(directory=str(tmp_path), html=True))
+    files = test_app.routes[-1].app
+    # Файлы уже в памяти: изменения на диске не видны
+    (tmp_path / "index.html").write_bytes(b"changed")
+    assert files.assets["/index.html"].variants["identity"][0] == INDEX
+    return TestClient(test_app)
+
+
+@pytest.mark.unit
+class TestInMemoryStaticFiles:
+    """Тесты вариантов, ETag и кеширования статики."""
+
+    def test_index_gzip_variant(self, static_client):
+        response = static_client.get("/ui/", headers={"Accept-Encoding": "gzip"})
+
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.headers["content-type"].startswith("text/html")
+        assert response.content == INDEX
+
+    def test_identity_variant(self, static_client):
+        gzip_etag = static_client.get(
+            "/ui/index.html", headers={"Accept-Encoding": "gzip"}
+        ).headers["etag"]
+        response = static_client.get(
+            "/ui/index.html", headers={"Accept-Encoding": "identity"}
+        )
+
+        assert "content-encoding" not in response.headers
+        assert int(response.headers["content-length"]) == len(INDEX)
+        # У каждого представления свой сильный ETag
+        assert not response.headers["etag"].startswith("W/")
+        assert response.headers["etag"] != gzip_etag
+
+    def test_not_modified(self, static_client):
+        headers = {"Accept-Encoding": "gzip"}
+        etag = static_client.get("/ui/", headers=headers).headers["etag"]
+
+        response = static_client.get("/ui/", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+    def test_fingerprinted_asset_is_immutable(self, static_client):
+        response = static_client.get("/ui/app.3f2a9c1b.js")
+        assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+    def test_incompressible_asset(self, static_client):
+        # gzip не уменьшает крошечный файл: отдается как есть
+        response = static_client.get(
+            "/ui/logo.png", headers={"Accept-Encoding": "gzip"}
+        )
+        assert "content-encoding" not in response.headers
+        assert response.headers["content-type"] == "image/png"
+
+    def test_directory_redirect_and_index(self, static_client):
+        response = static_client.get("/ui/docs", follow_redirects=False)
+        assert response.status_code == 307
+        assert response.headers["location"].endswith("/ui/docs/")
+        assert static_client.get("/ui/docs/").text == "<p>docs</p>"
+
+    def test_head_and_errors(self, static_client):
+        response = static_client.head("/ui/", headers={"Accept-Encoding": "identity"})
+        assert response.status_code == 200
+        assert int(response.headers["content-length"]) == len(INDEX)
+
+        assert static_client.get("/ui/missing.css").status_code == 404
+        assert static_client.post("/ui/").status_code == 405
+
+
+@pytest.mark.smoke
+def test_app_serves_ui_from_memory():
+    """Тест: UI приложения отдается готовым gzip вариантом."""
+    client = TestClient(app)
+    response = client.get("/ui/", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "etag" in response.headers
@@ -0,0 +1,581 @@
+"""
+Тесты хранилищ пользователей.
+Один и тот же набор проверок для всех хранилищ пользователей.
+"""
+
+import asyncio
+import fcntl
+import multiprocessing
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import Settings
+from app.security import password_hasher_for
+from app.storage import (
+    CachedUserStore,
+    CompactUserStore,
+    DuplicateUserError,
+    DurableUserStore,
+    SharedMemoryUserStore,
+    SharedStoreCorruptedError,
+    SharedStoreFullError,
+    create_user_store,
+    get_user_store,
+    user_store_for,
+)
+from app.storage.base import BatchOperation
+from app.storage.memory import InMemoryUserStore
+from app.storage.sqlite import SCHEMA_VERSION, SQLiteUserStore
+from main import app, create_app
+from tests.helpers import make_user
+
+
+@pytest.fixture(params=["memory", "compact", "durable", "shared", "sqlite", "cached"])
+def store(request, tmp_path):
+    """Хранилище каждого поддерживаемого типа."""
+    if request.param == "memory":
+        store = InMemoryUserStore()
+    elif request.param == "compact":
+        store = CompactUserStore()
+    elif request.param == "durable":
+        store = DurableUserStore(
+            CompactUserStore(), str(tmp_path / "wal"), fsync="always", snapshot_every=5
+        )
+    elif request.param == "shared":
+        store = SharedMemoryUserStore(str(tmp_path / "users.shm"), size=2**20)
+    elif request.param == "sqlite":
+        store = SQLiteUserStore(str(tmp_path / "users.db"), pool_size=2)
+    else:
+        store = CachedUserStore(
+            SQLiteUserStore(str(tmp_path / "users.db"), pool_size=2), maxsize=8
+        )
+    yield store
+    asyncio.run(store.close())
+
+
+@pytest.mark.unit
+class TestUserStore:
+    """Общий контракт хранилищ пользователей."""
+
+    @pytest.mark.asyncio
+    async def test_create_and_get(self, store):
+        """Тест создания и получения пользователя."""
+        created = await store.create(make_user("alice"))
+
+        assert created["id"] == 1
+        assert (await store.get(1))["username"] == "alice"
+        assert (await store.get_by_username("ALICE"))["id"] == 1
+        assert await store.get(2) is None
+
+    @pytest.mark.asyncio
+    async def test_get_many(self, store):
+        """Тест чтения нескольких пользователей за одно обращение."""
+        for name in ["m1", "m2", "m3"]:
+            await store.create(make_user(name))
+        await store.delete(2)
+
+        users = await store.get_many([3, 99, 1, 2, 3])
+        assert [u and u["username"] for u in users] == ["m3", None, "m1", None, "m3"]
+        assert await store.get_many([]) == []
+
+        # Больше id, чем параметров в одном выражении SQLite
+        users = await store.get_many(list(range(1, 1201)))
+        assert [u["id"] for u in users if u] == [1, 3]
+
+    @pytest.mark.asyncio
+    async def test_duplicates(self, store):
+        """Тест уникальности email и username без учета регистра."""
+        await store.create(make_user("bob"))
+
+        with pytest.raises(DuplicateUserError) as exc_info:
+            await store.create({**make_user("other"), "email": "BOB@example.com"})
+        assert exc_info.value.field == "email"
+
+        with pytest.raises(DuplicateUserError) as exc_info:
+            await store.create(make_user("Bob") | {"email": "new@example.com"})
+        assert exc_info.value.field == "username"
+
+    @pytest.mark.asyncio
+    async def test_update(self, store):
+        """Тест обновления с проверкой уникальности."""
+        await store.create(make_user("carol"))
+        await store.create(make_user("dave"))
+
+        updated = await store.update(1, {"username": "caroline"})
+        assert updated["username"] == "caroline"
+        assert await store.get_by_username("carol") is None
+
+        with pytest.raises(DuplicateUserError):
+            await store.update(1, {"email": "dave@example.com"})
+        assert (await store.get(1))["email"] == "carol@example.com"
+
+        assert await store.update(99, {"full_name": "Nobody"}) is None
+
+    @pytest.mark.asyncio
+    async def test_delete_and_list(self, store):
+        """Тест удаления и постраничной выборки."""
+        for name in ["u1", "u2", "u3", "u4"]:
+            await store.create(make_user(name))
+
+        assert (await store.delete(2))["username"] == "u2"
+        assert await store.delete(2) is None
+
+        page = await store.list_users(limit=2)
+        assert [u["id"] for u in page] == [1, 3]
+        page = await store.list_users(after_id=3, limit=2)
+        assert [u["id"] for u in page] == [4]
+        page = await store.list_users(skip=1, limit=10)
+        assert [u["id"] for u in page] == [3, 4]
+
+        # Id не переиспользуются после удаления
+        assert (await store.create(make_user("u5")))["id"] == 5
+
+    @pytest.mark.asyncio
+    async def test_apply_batch(self, store):
+        """Тест атомарного применения пакета."""
+        await store.create(make_user("gina"))
+
+        outcomes = await store.apply_batch(
+            [
+                BatchOperation("create", data=make_user("hank")),
+                BatchOperation(
+                    "update", 1, {"username": "georgina", "email": "g@example.com"}
+                ),
+                BatchOperation("create", data=make_user("gina")),
+            ]
+        )
+        assert [o["id"] for o in outcomes] == [2, 1, 3]
+
+        outcomes = await store.apply_batch(
+            [
+                BatchOperation("delete", 2),
+                BatchOperation("update", 3, {"username": "georgina"}),
+                BatchOperation("delete", 42),
+            ]
+        )
+        assert outcomes[0]["username"] == "hank"
+        assert isinstance(outcomes[1], DuplicateUserError)
+        assert outcomes[2] is None
+
+        # Пакет откатился целиком
+        assert [u["id"] for u in await store.list_users()] == [1, 2, 3]
+        assert (await store.get_by_username("hank"))["id"] == 2
+        assert (await store.get(3))["username"] == "gina"
+
+    @pytest.mark.asyncio
+    async def test_versions_and_generation(self, store):
+        """Тест версий записей и поколения хранилища."""
+        generations = [await store.generation()]
+
+        created = await store.create(make_user("ivan"))
+        assert created["version"] == 1
+        generations.append(await store.generation())
+
+        updated = await store.update(created["id"], {"full_name": "Ivan"})
+        assert updated["version"] == 2
+        assert (await store.get(created["id"]))["version"] == 2
+        generations.append(await store.generation())
+
+        await store.delete(created["id"])
+        generations.append(await store.generation())
+
+        assert generations == sorted(set(generations))
+
+    @pytest.mark.asyncio
+    async def test_clear(self, store):
+        """Тест очистки хранилища."""
+        await store.create(make_user("erin"))
+        await store.clear()
+
+        assert await store.list_users() == []
+        assert (await store.create(make_user("erin")))["id"] == 1
+
+    @pytest.mark.asyncio
+    async def test_search(self, store):
+        """Тест поиска по началу username, full_name и слов в них."""
+
+        async def found(query, limit=10):
+            return sorted(user["username"] for user in await store.search(query, limit))
+
+        await store.create({**make_user("alice"), "full_name": "Alice Smith"})
+        await store.create({**make_user("bob_jones"), "full_name": "Robert Jones"})
+        await store.create(make_user("carol"))
+
+        assert await found("AL") == ["alice"]
+        assert await found("smi") == ["alice"]
+        assert await found("jones") == ["bob_jones"]
+        assert await found("alice sm") == ["alice"]
+        assert await found("lice") == []
+        assert len(await store.search("a", limit=1)) == 1
+
+        # Индекс обновляется при изменении и удалении
+        await store.update(3, {"full_name": "Caroline Jones"})
+        await store.delete(2)
+        assert await found("jones") == ["carol"]
+        assert await found("bob") == []
+
+
+@pytest.mark.unit
+def test_sqlite_store_persists(tmp_path):
+    """Тест: данные SQLite переживают пересоздание хранилища."""
+    path = str(tmp_path / "users.db")
+
+    async def scenario():
+        first = SQLiteUserStore(path)
+        await first.create(make_user("frank"))
+        await first.close()
+
+        second = SQLiteUserStore(path)
+        user = await second.get_by_username("frank")
+        await second.close()
+        return user
+
+    user = asyncio.run(scenario())
+    assert user["id"] == 1
+    assert isinstance(user["created_at"], datetime)
+
+
+OLD_SQLITE_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT NOT NULL,
+    email_key TEXT NOT NULL UNIQUE,
+    username TEXT NOT NULL,
+    username_key TEXT NOT NULL UNIQUE,
+    full_name TEXT,
+    created_at TEXT NOT NULL,
+    is_active INTEGER NOT NULL DEFAULT 1,
+    hashed_password TEXT NOT NULL
+);
+INSERT INTO users (email, email_key, username, username_key, created_at,
+                   hashed_password)
+VALUES ('old@example.com', 'old@example.com', 'old', 'old',
+        '2024-01-01T00:00:00', 'hash');
+"""
+
+
+@pytest.mark.unit
+def test_sqlite_store_migrates_old_schema(tmp_path):
+    """Тест: база без колонки version и индекса поиска дополняется при открытии."""
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(OLD_SQLITE_SCHEMA)
+    conn.close()
+
+    async def scenario():
+        store = SQLiteUserStore(path)
+        try:
+            assert [user["id"] for user in await store.search("ol")] == [1]
+            return await store.update(1, {"full_name": "Old"})
+        finally:
+            await store.close()
+
+    assert asyncio.run(scenario())["version"] == 2
+
+
+@pytest.mark.unit
+def test_sqlite_store_migrates_once_under_concurrent_open(tmp_path):
+    """Тест: воркеры, одновременно открывшие старую базу, не мешают миграции."""
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(OLD_SQLITE_SCHEMA)
+    conn.close()
+
+    barrier = threading.Barrier(8)
+
+    def open_store(_):
+        barrier.wait()
+        return SQLiteUserStore(path, pool_size=1)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        stores = list(executor.map(open_store, range(8)))
+
+    async def scenario():
+        try:
+            assert len({store.store_id() for store in stores}) == 1
+            return await stores[-1].search("ol")
+        finally:
+            for store in stores:
+                await store.close()
+
+    assert [user["id"] for user in asyncio.run(scenario())] == [1]
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    assert conn.execute("SELECT count(*) FROM user_search").fetchone()[0] > 0
+    conn.close()
+
+
+def create_shared_users(path: str, prefix: str, count: int) -> None:
+    """Процесс-воркер: создание пользователей в общем хранилище."""
+    store = SharedMemoryUserStore(path, size=2**20)
+    for i in range(count):
+        asyncio.run(store.create(make_user(f"{prefix}{i}")))
+
+
+@pytest.mark.unit
+def test_shared_store_between_instances(tmp_path):
+    """Тест: два экземпляра (как два воркера) видят общие данные."""
+    path = str(tmp_path / "users.shm")
+    first = SharedMemoryUserStore(path, size=2**20)
+    second = SharedMemoryUserStore(path, size=2**20)
+
+    async def scenario():
+        alice = await first.create(make_user("alice"))
+        bob = await second.create(make_user("bob"))
+        assert (alice["id"], bob["id"]) == (1, 2)
+        assert (await second.get_by_username("alice"))["id"] == 1
+
+        await second.update(1, {"full_name": "Alice"})
+        assert (await first.get(1))["full_name"] == "Alice"
+        assert (await first.get(1))["version"] == 2
+        with pytest.raises(DuplicateUserError):
+            await first.create(make_user("bob"))
+
+        await first.delete(2)
+        assert await second.get(2) is None
+        assert (await second.create(make_user("carol")))["id"] == 3
+        assert await first.generation() == await second.generation()
+        assert [user["id"] for user in await first.list_users()] == [1, 3]
+
+        await second.clear()
+        assert await first.list_users() == []
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.unit
+def test_shared_store_compaction(tmp_path):
+    """Тест: переполненный журнал переписывается снимком данных."""
+    path = str(tmp_path / "users.shm")
+    writer = SharedMemoryUserStore(path, size=4096)
+    reader = SharedMemoryUserStore(path, size=4096)
+
+    async def scenario():
+        await writer.create(make_user("alice"))
+        await reader.get(1)
+        epoch = writer._header()[0]
+        for i in range(50):
+            await writer.update(1, {"full_name": f"Name {i}"})
+        assert writer._header()[0] > epoch
+
+        user = await reader.get(1)
+        assert (user["full_name"], user["version"]) == ("Name 49", 51)
+
+        with pytest.raises(SharedStoreFullError):
+            await writer.create_many([make_user(f"bulk{i}") for i in range(100)])
+        # Неопубликованные изменения откатываются и в самом писателе
+        assert [user["id"] for user in await writer.list_users()] == [1]
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.unit
+def test_shared_store_dead_writer(tmp_path):
+    """Тест: журнал, брошенный упавшим писателем посреди сжатия, восстанавливается."""
+    path = str(tmp_path / "users.shm")
+    survivor = SharedMemoryUserStore(path, size=4096)
+
+    async def scenario():
+        await survivor.create(make_user("alice"))
+        await survivor.create(make_user("bob"))
+        epoch, end, next_id, generation = survivor._header()
+        # Писатель успел объявить сжатие и затереть начало журнала
+        survivor._write_header(epoch + 1, end, next_id, generation)
+        survivor.mm[64:80] = b"\xff" * 16
+
+        stale = SharedMemoryUserStore(path, size=4096)
+        with pytest.raises(SharedStoreCorruptedError):
+            await asyncio.wait_for(stale.get(1), timeout=5)
+
+        user = await asyncio.wait_for(survivor.get(1), timeout=5)
+        assert user["username"] == "alice"
+        assert survivor._header()[0] == epoch + 2
+        assert [user["id"] for user in await stale.list_users()] == [1, 2]
+        assert (await stale.create(make_user("carol")))["id"] == 3
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.unit
+def test_shared_store_lock_off_event_loop(tmp_path):
+    """Тест: ожидание блокировки другого процесса не останавливает event loop."""
+    path = str(tmp_path / "users.shm")
+    store = SharedMemoryUserStore(path, size=2**20)
+    other = os.open(path, os.O_RDWR)
+
+    async def scenario():
+        fcntl.flock(other, fcntl.LOCK_EX)
+        create = asyncio.create_task(store.create(make_user("alice")))
+        ticks = 0
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert ticks == 10 and not create.done()
+        fcntl.flock(other, fcntl.LOCK_UN)
+        assert (await asyncio.wait_for(create, timeout=5))["id"] == 1
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        os.close(other)
+
+
+@pytest.mark.slow
+def test_shared_store_between_processes(tmp_path):
+    """Тест: процессы создают пользователей без конфликтов id."""
+    path = str(tmp_path / "users.shm")
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=create_shared_users, args=(path, prefix, 30))
+        for prefix in ("a", "b")
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    users = asyncio.run(SharedMemoryUserStore(path, size=2**20).list_users())
+    assert [user["id"] for user in users] == list(range(1, 61))
+
+
+@pytest.mark.unit
+def test_compact_store_slots():
+    """Тест: удаленные слоты пропускаются, created_at хранится без потерь."""
+    store = CompactUserStore()
+
+    async def scenario():
+        users = [await store.create(make_user(f"user{i}")) for i in range(1, 6)]
+        await store.delete(2)
+        await store.delete(3)
+        page = await store.list_users(skip=1, limit=2)
+        after = await store.list_users(after_id=1, limit=10)
+        return users, page, after
+
+    users, page, after = asyncio.run(scenario())
+
+    assert [user["id"] for user in page] == [4, 5]
+    assert [user["id"] for user in after] == [4, 5]
+    assert after[0]["created_at"] == users[3]["created_at"]
+    assert store.count == 3
+    # Нормализованные строки не дублируются в ключах индекса
+    username_key = next(iter(store.username_index))
+    assert username_key is store.usernames[0]
+
+
+@pytest.mark.unit
+def test_store_id(tmp_path):
+    """Тест: store_id различает процессы и clear(), но общий у воркеров."""
+    assert InMemoryUserStore().store_id() != InMemoryUserStore().store_id()
+    assert CompactUserStore().store_id() != CompactUserStore().store_id()
+    path = str(tmp_path / "users.shm")
+    shared = [SharedMemoryUserStore(path, size=2**20) for _ in range(2)]
+    assert shared[0].store_id() == shared[1].store_id()
+    path = str(tmp_path / "users.db")
+    sqlite = [SQLiteUserStore(path) for _ in range(2)]
+    assert sqlite[0].store_id() == sqlite[1].store_id()
+
+    async def scenario():
+        memory = InMemoryUserStore()
+        for store, other in (shared, sqlite, (memory, memory)):
+            before = store.store_id()
+            await store.clear()
+            assert store.store_id() != before
+            await other.generation()
+            assert other.store_id() == store.store_id()
+        for store in sqlite:
+            await store.close()
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.unit
+def test_create_user_store_from_settings(tmp_path):
+    """Тест выбора хранилища по настройкам."""
+    assert isinstance(create_user_store(Settings()), InMemoryUserStore)
+    settings = Settings(user_store_backend="compact")
+    assert isinstance(create_user_store(settings), CompactUserStore)
+    settings = Settings(
+        user_store_backend="shared", shared_store_path=str(tmp_path / "users.shm")
+    )
+    assert isinstance(create_user_store(settings), SharedMemoryUserStore)
+    settings = Settings(wal_dir=str(tmp_path / "wal"))
+    store = create_user_store(settings)
+    assert isinstance(store, DurableUserStore)
+    assert isinstance(store.store, InMemoryUserStore)
+
+    settings = Settings(
+        user_store_backend="sqlite", sqlite_path=str(tmp_path / "users.db")
+    )
+    store = create_user_store(settings)
+    assert isinstance(store, CachedUserStore)
+    assert isinstance(store.store, SQLiteUserStore)
+
+    settings.user_cache_size = 0
+    assert isinstance(create_user_store(settings), SQLiteUserStore)
+
+    with pytest.raises(ValueError):
+        create_user_store(Settings(user_store_backend="redis"))
+
+
+@pytest.mark.integration
+def test_create_app_uses_its_settings(tmp_path):
+    """Тест: хранилище и хешер приложения создаются по настройкам create_app."""
+    settings = Settings(
+        user_store_backend="sqlite",
+        sqlite_path=str(tmp_path / "users.db"),
+        user_cache_size=0,
+        password_hash_rounds=5,
+    )
+    custom = create_app(settings)
+    with TestClient(custom) as client:
+        store = user_store_for(custom)
+        assert isinstance(store, SQLiteUserStore)
+        assert password_hasher_for(custom).rounds == 5
+
+        client.portal.call(store.create, make_user("sqliteonly"))
+        response = client.get("/api/v1/users/search/by-username/sqliteonly")
+        assert response.status_code == 200
+        assert user_store_for(app) is not store
+        assert (
+            TestClient(app)
+            .get("/api/v1/users/search/by-username/sqliteonly")
+            .status_code
+            == 404
+        )
+    # Lifespan закрывает ресурсы своего приложения
+    assert custom.state.user_store is None
+
+
+@pytest.mark.integration
+def test_users_api_with_sqlite_store(tmp_path):
+    """Тест API пользователей поверх SQLite хранилища."""
+    sqlite_store = SQLiteUserStore(str(tmp_path / "users.db"))
+    app.dependency_overrides[get_user_store] = lambda: sqlite_store
+    try:
+        client = TestClient(app)
+        user_data = {
+            "email": "sqlite@example.com",
+            "username": "sqliteuser",
+            "password": "password123",
+        }
+
+        response = client.post("/api/v1/users", json=user_data)
+        assert response.status_code == 201
+        user_id = response.json()["id"]
+
+        assert client.post("/api/v1/users", json=user_data).status_code == 400
+        assert client.get(f"/api/v1/users/{user_id}").json()["username"] == (
+            "sqliteuser"
+        )
+        assert len(client.get("/api/v1/users").json()) == 1
+        assert client.delete(f"/api/v1/users/{user_id}").status_code == 200
+    finally:
+        app.dependency_overrides.clear()
+        asyncio.run(sqlite_store.close())
@@ -3,9 +3,23 @@
 Проверка CRUD операций через HTTP endpoints.
 """
 
+import asyncio
+import csv
+import io
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 
+from app.importer import (
+    ENCODING_ERROR,
+    LINE_TOO_LONG,
+    RECORD_TOO_LONG,
+    MultipartUpload,
+    csv_rows,
+    iter_lines,
+)
+from app.storage import user_store_for
 from main import app
 
 client = TestClient(app)
@@ -14,12 +28,10 @@ client = TestClient(app)
 @pytest.fixture(autouse=True)
 def clear_users_db():
     """Очистка базы данных пользователей перед каждым тестом."""
-    from app.routes.users import fake_users_db
-
-    fake_users_db.clear()
-    # Сброс счетчика (не идеально, но работает для тестов)
+    store = user_store_for(app)
+    asyncio.run(store.clear())
     yield
-    fake_users_db.clear()
+    asyncio.run(store.clear())
 
 
 @pytest.mark.integration
@@ -116,6 +128,73 @@ class TestUserCRUD:
         data = response.json()
         assert len(data) == 3
 
+    def test_get_users_skip_limit(self):
+        """Тест пагинации через skip/limit."""
+        for i in range(5):
+            client.post(
+                "/api/v1/users",
+                json={
+                    "email": f"page{i}@example.com",
+                    "username": f"page{i}",
+                    "password": "password123",
+                },
+            )
+
+        response = client.get("/api/v1/users", params={"skip": 1, "limit": 2})
+
+        assert response.status_code == 200
+        assert [u["username"] for u in response.json()] == ["page1", "page2"]
+
+    def test_get_users_limit_zero(self):
+        """Тест: limit=0 - пустая страница без курсора, а не ошибка."""
+        client.post(
+            "/api/v1/users",
+            json={
+                "email": "zero@example.com",
+                "username": "zero",
+                "password": "password123",
+            },
+        )
+
+        response = client.get("/api/v1/users", params={"limit": 0})
+
+        assert response.status_code == 200
+        assert response.json() == []
+        assert "x-next-cursor" not in response.headers
+
+    def test_get_users_cursor_pagination(self):
+        """Тест курсорной пагинации через after и X-Next-Cursor."""
+        for i in range(5):
+            client.post(
+                "/api/v1/users",
+                json={
+                    "email": f"cursor{i}@example.com",
+                    "username": f"cursor{i}",
+                    "password": "password123",
+                },
+            )
+        # Удаленная запись не должна ломать продолжение с курсора
+        client.delete("/api/v1/users/3")
+
+        seen = []
+        params = {"limit": 2}
+        while True:
+            response = client.get("/api/v1/users", params=params)
+            assert response.status_code == 200
+            seen.extend(u["username"] for u in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+            params = {"limit": 2, "after": cursor}
+
+        assert seen == ["cursor0", "cursor1", "cursor3", "cursor4"]
+
+    def test_get_users_invalid_cursor(self):
+        """Тест пагинации с некорректным курсором."""
+        response = client.get("/api/v1/users", params={"after": "not-a-cursor"})
+
+        assert response.status_code == 400
+
     def test_get_user_by_id(self):
         """Тест получения пользователя по ID."""
         # Создаем пользователя
@@ -221,6 +300,480 @@ class TestUserCRUD:
         assert response.status_code == 404
 
 
+@pytest.mark.integration
+class TestUserBatch:
+    """Тесты пакетных операций над пользователями."""
+
+    def test_batch_applies_all_operations(self):
+        """Тест успешного пакета из создания, обновления и удаления."""
+        existing = client.post(
+            "/api/v1/users",
+            json={
+                "email": "old@example.com",
+                "username": "olduser",
+                "password": "password123",
+            },
+        ).json()
+
+        operations = [
+            {
+                "op": "create",
+                "user": {
+                    "email": "batch1@example.com",
+                    "username": "batch1",
+                    "password": "password123",
+                },
+            },
+            {"op": "update", "id": existing["id"], "user": {"full_name": "Renamed"}},
+            {"op": "delete", "id": existing["id"]},
+            # Username освобожден удалением выше в том же пакете
+            {
+                "op": "create",
+                "user": {
+                    "email": "batch2@example.com",
+                    "username": "olduser",
+                    "password": "password123",
+                },
+            },
+        ]
+        response = client.post("/api/v1/users:batch", json={"operations": operations})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["applied"] is True
+        assert [r["status"] for r in data["results"]] == [201, 200, 200, 201]
+        assert data["results"][1]["user"]["full_name"] == "Renamed"
+        assert len(client.get("/api/v1/users").json()) == 2
+
+    def test_batch_is_atomic(self):
+        """Тест: при ошибке в пакете не применяется ни одна операция."""
+        operations = [
+            {
+                "op": "create",
+                "user": {
+                    "email": "same@example.com",
+                    "username": "first",
+                    "password": "password123",
+                },
+            },
+            {
+                "op": "create",
+                "user": {
+                    "email": "SAME@example.com",
+                    "username": "second",
+                    "password": "password123",
+                },
+            },
+            {"op": "delete", "id": 999},
+        ]
+        response = client.post("/api/v1/users:batch", json={"operations": operations})
+
+        assert response.status_code == 400
+        data = response.json()
+        assert data["applied"] is False
+        assert [r["status"] for r in data["results"]] == [424, 400, 404]
+        assert "email" in data["results"][1]["detail"]
+        assert client.get("/api/v1/users").json() == []
+
+        # Id отклоненного пакета не расходуются
+        response = client.post(
+            "/api/v1/users",
+            json={
+                "email": "same@example.com",
+                "username": "first",
+                "password": "password123",
+            },
+        )
+        assert response.json()["id"] == 1
+
+    def test_batch_validation(self):
+        """Тест валидации пакета целиком."""
+        response = client.post("/api/v1/users:batch", json={"operations": []})
+        assert response.status_code == 422
+
+        operations = [{"op": "delete", "id": i} for i in range(1001)]
+        response = client.post("/api/v1/users:batch", json={"operations": operations})
+        assert response.status_code == 422
+
+        operations = [{"op": "create", "user": {"email": "invalid"}}]
+        response = client.post("/api/v1/users:batch", json={"operations": operations})
+        assert response.status_code == 422
+
+
+@pytest.mark.integration
+class TestUserBatchGet:
+    """Тесты чтения нескольких пользователей одним запросом."""
+
+    def test_batch_get(self):
+        """Тест: найденные в порядке запроса, отсутствующие - в missing."""
+        for name in ["first", "second", "third"]:
+            client.post(
+                "/api/v1/users",
+                json={
+                    "email": f"{name}@example.com",
+                    "username": name,
+                    "password": "password123",
+                },
+            )
+        client.delete("/api/v1/users/2")
+
+        response = client.post(
+            "/api/v1/users:batchGet", json={"ids": [3, 2, 999, 1, 3]}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [user["username"] for user in data["users"]] == ["third", "first"]
+        assert data["missing"] == [2, 999]
+        assert "hashed_password" not in data["users"][0]
+        assert data["users"][1] == client.get("/api/v1/users/1").json()
+
+    def test_batch_get_validation(self):
+        """Тест ограничений на список id."""
+        response = client.post("/api/v1/users:batchGet", json={"ids": []})
+        assert response.status_code == 422
+
+        response = client.post(
+            "/api/v1/users:batchGet", json={"ids": list(range(1, 1002))}
+        )
+        assert response.status_code == 422
+
+        response = client.post("/api/v1/users:batchGet", json={"ids": ["abc"]})
+        assert response.status_code == 422
+
+        response = client.post(
+            "/api/v1/users:batchGet", json={"ids": list(range(1, 1001))}
+        )
+        assert response.json() == {"users": [], "missing": list(range(1, 1001))}
+
+
+@pytest.mark.integration
+class TestUserExport:
+    """Тесты потоковой выгрузки пользователей."""
+
+    @pytest.fixture(autouse=True)
+    def users(self, monkeypatch):
+        """Несколько пользователей для выгрузки (больше одной страницы)."""
+        from app import export
+
+        monkeypatch.setattr(export, "EXPORT_CHUNK_SIZE", 2)
+        for i in range(5):
+            client.post(
+                "/api/v1/users",
+                json={
+                    "email": f"export{i}@example.com",
+                    "username": f"export{i}",
+                    "password": "password123",
+                    "full_name": 'Иван, "Экспорт"',
+                },
+            )
+
+    def test_export_ndjson(self):
+        """Тест выгрузки в NDJSON."""
+        response = client.get(
+            "/api/v1/users/export", headers={"Accept-Encoding": "identity"}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert "content-encoding" not in response.headers
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row["username"] for row in rows] == [f"export{i}" for i in range(5)]
+        assert rows[0]["full_name"] == 'Иван, "Экспорт"'
+        assert "hashed_password" not in rows[0]
+
+    def test_export_csv(self):
+        """Тест выгрузки в CSV по заголовку Accept."""
+        response = client.get(
+            "/api/v1/users/export",
+            headers={"Accept": "text/csv", "Accept-Encoding": "identity"},
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len(rows) == 5
+        assert rows[4]["username"] == "export4"
+        assert rows[4]["full_name"] == 'Иван, "Экспорт"'
+
+    def test_export_gzip(self):
+        """Тест сжатия выгрузки gzip на лету."""
+        response = client.get(
+            "/api/v1/users/export", headers={"Accept-Encoding": "gzip"}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        # httpx распаковывает gzip автоматически
+        assert len(response.text.splitlines()) == 5
+
+        # q=0 запрещает gzip, хотя подстрока "gzip" в заголовке есть
+        response = client.get(
+            "/api/v1/users/export", headers={"Accept-Encoding": "gzip;q=0"}
+        )
+        assert "content-encoding" not in response.headers
+        assert len(response.text.splitlines()) == 5
+
+
+@pytest.mark.integration
+class TestUserImport:
+    """Тесты потокового импорта пользователей."""
+
+    def test_import_ndjson_body(self, monkeypatch):
+        """Тест импорта NDJSON из тела запроса с отчетом об ошибках."""
+        monkeypatch.setattr("app.routes.users.IMPORT_CHUNK_SIZE", 2)
+        lines = [
+            json.dumps(
+                {"email": "imp1@example.com", "username": "imp1", "password": "pass123"}
+            ),
+            "{not json",
+            json.dumps({"email": "invalid", "username": "imp2", "password": "pass123"}),
+            "",
+            json.dumps(
+                {"email": "imp3@example.com", "username": "imp3", "password": "pass123"}
+            ),
+            json.dumps(
+                {"email": "IMP1@example.com", "username": "imp4", "password": "pass123"}
+            ),
+        ]
+
+        response = client.post(
+            "/api/v1/users/import",
+            params={"import_id": "nightly"},
+            content="\n".join(lines).encode(),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["import_id"] == "nightly"
+        assert data["status"] == "completed"
+        assert (data["processed"], data["created"], data["failed"]) == (5, 2, 3)
+        assert [e["row"] for e in data["errors"]] == [2, 3, 6]
+        assert data["errors"][0]["errors"] == ["Некорректный JSON"]
+        assert data["errors"][1]["errors"][0].startswith("email:")
+        assert "email" in data["errors"][2]["errors"][0]
+
+        assert client.get("/api/v1/users/import/nightly").json() == data
+        assert client.get("/api/v1/users/search/by-username/imp3").status_code == 200
+
+    def test_import_csv_upload(self):
+        """Тест импорта CSV, загруженного как multipart файл."""
+        content = (
+            "email,username,password,full_name\r\n"
+            "csv1@example.com,csv1,password123,\r\n"
+            'csv2@example.com,csv2,password123,"Многострочное\nимя, с запятой"\r\n'
+            "csv3@example.com,csv3\r\n"
+        )
+
+        response = client.post(
+            "/api/v1/users/import",
+            files={"file": ("users.csv", content.encode(), "text/csv")},
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["processed"], data["created"], data["failed"]) == (3, 2, 1)
+        assert data["errors"][0]["row"] == 5
+
+        user = client.get("/api/v1/users/search/by-username/csv2").json()
+        assert user["full_name"] == "Многострочное\nимя, с запятой"
+        user = client.get("/api/v1/users/search/by-username/csv1").json()
+        assert user["full_name"] is None
+
+    def test_import_invalid_utf8(self):
+        """Тест: строки с некорректной кодировкой попадают в отчет, а не в 500."""
+        body = b"\n".join(
+            [
+                json.dumps(
+                    {
+                        "email": "utf1@example.com",
+                        "username": "utf1",
+                        "password": "p123456",
+                    }
+                ).encode(),
+                b'{"email": "\xff\xfe@example.com"}',
+                json.dumps(
+                    {
+                        "email": "utf2@example.com",
+                        "username": "utf2",
+                        "password": "p123456",
+                    }
+                ).encode(),
+            ]
+        )
+
+        response = client.post(
+            "/api/v1/users/import",
+            files={"file": ("users.ndjson", body, "application/x-ndjson")},
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["processed"], data["created"], data["failed"]) == (3, 2, 1)
+        assert data["errors"][0] == {
+            "row": 2,
+            "errors": ["Некорректная кодировка UTF-8"],
+        }
+
+        content = "email,username,password\r\n".encode() + b"\xffbad,csv,p123456\r\n"
+        response = client.post(
+            "/api/v1/users/import",
+            content=content,
+            headers={"Content-Type": "text/csv"},
+        )
+        assert response.json()["errors"][0]["row"] == 2
+
+    def test_import_upload_without_file(self):
+        """Тест multipart запроса без файла."""
+        response = client.post("/api/v1/users/import", files={"other": (None, "value")})
+
+        assert response.status_code == 400
+
+    def test_import_status_not_found(self):
+        """Тест запроса прогресса неизвестного импорта."""
+        response = client.get("/api/v1/users/import/unknown")
+
+        assert response.status_code == 404
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_multipart_upload_streams_file():
+    """Тест: файл из multipart отдается кусками, остальные поля пропускаются."""
+    body = (
+        b"--XyZ\r\n"
+        b'Content-Disposition: form-data; name="note"\r\n\r\n'
+        b"skip me\r\n"
+        b"--XyZ\r\n"
+        b'Content-Disposition: form-data; name="file"; filename="u.csv"\r\n'
+        b"Content-Type: text/csv\r\n\r\n"
+        b"email,username\r\na@example.com,a\r\n"
+        b"\r\n--XyZ--\r\n"
+    )
+
+    async def chunks():
+        for i in range(0, len(body), 7):
+            yield body[i : i + 7]
+
+    upload = MultipartUpload("multipart/form-data; boundary=XyZ", chunks())
+    assert await upload.open()
+    assert (upload.filename, upload.content_type) == ("u.csv", "text/csv")
+    parts = [part async for part in upload.read()]
+    assert len(parts) > 1
+    assert b"".join(parts) == b"email,username\r\na@example.com,a\r\n"
+
+    missing = MultipartUpload(
+        "multipart/form-data; boundary=XyZ", chunks(), field="other"
+    )
+    assert not await missing.open()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_import_line_and_record_limits():
+    """Тест: длинная строка и незакрытая кавычка дают ошибку, а не весь файл в памяти."""
+
+    async def stream(*parts):
+        for part in parts:
+            yield part
+
+    chunks = stream(b"ab", b"c\nxxxx", b"xxxx", b"xx\n\xff\nok")
+    lines = [line async for line in iter_lines(chunks, max_line=5)]
+    assert lines == [
+        ("abc", None),
+        (None, LINE_TOO_LONG),
+        (None, ENCODING_ERROR),
+        ("ok", None),
+    ]
+
+    # Мегабайты без перевода строки - одна ошибка, остаток пропускается
+    body = stream(*([b"x" * 2**16] * 64), b"\n{}")
+    lines = [line async for line in iter_lines(body, max_line=2**20)]
+    assert lines == [(None, LINE_TOO_LONG), ("{}", None)]
+
+    records = [
+        "email,username",
+        '"broken@example.com,broken',
+        "y" * 30,
+        "z" * 30,
+        "b@example.com,b",
+    ]
+    rows = [row async for row in csv_rows(stream(*((r, None) for r in records)), 50)]
+    # Запись отбрасывается на третьей строке, разбор идет дальше построчно
+    assert rows == [
+        (2, None, RECORD_TOO_LONG),
+        (4, None, "Число колонок не совпадает с заголовком"),
+        (5, {"email": "b@example.com", "username": "b"}, None),
+    ]
+
+
+@pytest.mark.integration
+class TestUserETags:
+    """Тесты ETag и условных GET запросов."""
+
+    def create_user(self, name: str) -> dict:
+        response = client.post(
+            "/api/v1/users",
+            json={
+                "email": f"{name}@example.com",
+                "username": name,
+                "password": "password123",
+            },
+        )
+        assert response.status_code == 201
+        return response
+
+    def test_user_etag_changes_on_update(self):
+        """Тест: ETag пользователя меняется при обновлении."""
+        created = self.create_user("etaguser")
+        user_id = created.json()["id"]
+        etag = created.headers["ETag"]
+
+        response = client.get(f"/api/v1/users/{user_id}")
+        assert response.headers["ETag"] == etag
+
+        response = client.get(
+            f"/api/v1/users/{user_id}", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert response.content == b""
+
+        updated = client.put(f"/api/v1/users/{user_id}", json={"full_name": "New"})
+        assert updated.headers["ETag"] != etag
+
+        response = client.get(
+            f"/api/v1/users/{user_id}", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        assert response.json()["full_name"] == "New"
+
+        response = client.get(
+            "/api/v1/users/search/by-username/etaguser",
+            headers={"If-None-Match": f'"other", W/{updated.headers["ETag"]}'},
+        )
+        assert response.status_code == 304
+
+    def test_list_etag_changes_on_any_write(self):
+        """Тест: ETag списка меняется при создании, изменении и удалении."""
+        user_id = self.create_user("listetag").json()["id"]
+
+        etags = [client.get("/api/v1/users").headers["ETag"]]
+        response = client.get("/api/v1/users", headers={"If-None-Match": etags[0]})
+        assert response.status_code == 304
+
+        self.create_user("listetag2")
+        etags.append(client.get("/api/v1/users").headers["ETag"])
+        client.put(f"/api/v1/users/{user_id}", json={"full_name": "Changed"})
+        etags.append(client.get("/api/v1/users").headers["ETag"])
+        client.delete(f"/api/v1/users/{user_id}")
+        etags.append(client.get("/api/v1/users").headers["ETag"])
+
+        assert len(set(etags)) == 4
+        response = client.get("/api/v1/users", headers={"If-None-Match": etags[0]})
+        assert response.status_code == 200
+
+
 @pytest.mark.integration
 class TestUserValidation:
     """Тесты валидации данных пользователей."""
@@ -271,3 +824,117 @@ class TestUserValidation:
         response = client.post("/api/v1/users", json=user_data)
 
         assert response.status_code == 422
+
+
+@pytest.mark.integration
+class TestUserIndexes:
+    """Тесты вторичных индексов по email и username."""
+
+    def test_duplicate_check_is_case_insensitive(self):
+        """Тест: email и username уникальны без учета регистра."""
+        user_data = {
+            "email": "Case@Example.com",
+            "username": "CaseUser",
+            "password": "password123",
+        }
+        assert client.post("/api/v1/users", json=user_data).status_code == 201
+
+        response = client.post(
+            "/api/v1/users",
+            json={**user_data, "email": "case@example.com", "username": "other"},
+        )
+        assert response.status_code == 400
+
+        response = client.post(
+            "/api/v1/users",
+            json={**user_data, "email": "other@example.com", "username": "caseuser"},
+        )
+        assert response.status_code == 400
+
+    def test_search_uses_updated_username(self):
+        """Тест: индекс username обновляется при изменении пользователя."""
+        user_data = {
+            "email": "rename@example.com",
+            "username": "oldname",
+            "password": "password123",
+        }
+        user_id = client.post("/api/v1/users", json=user_data).json()["id"]
+        client.put(f"/api/v1/users/{user_id}", json={"username": "newname"})
+
+        assert client.get("/api/v1/users/search/by-username/oldname").status_code == 404
+        response = client.get("/api/v1/users/search/by-username/NewName")
+        assert response.status_code == 200
+        assert response.json()["id"] == user_id
+
+        # Старый username снова свободен
+        response = client.post(
+            "/api/v1/users",
+            json={**user_data, "email": "another@example.com"},
+        )
+        assert response.status_code == 201
+
+    def test_delete_releases_email_and_username(self):
+        """Тест: после удаления email и username можно использовать повторно."""
+        user_data = {
+            "email": "release@example.com",
+            "username": "releaseuser",
+            "password": "password123",
+        }
+        user_id = client.post("/api/v1/users", json=user_data).json()["id"]
+        client.delete(f"/api/v1/users/{user_id}")
+
+        assert client.post("/api/v1/users", json=user_data).status_code == 201
+
+
+@pytest.mark.integration
+class TestUserSearch:
+    """Тесты поиска пользователей для подсказок."""
+
+    def create(self, username, full_name=None):
+        response = client.post(
+            "/api/v1/users",
+            json={
+                "email": f"{username}@example.com",
+                "username": username,
+                "password": "password123",
+                "full_name": full_name,
+            },
+        )
+        assert response.status_code == 201
+        return response.json()["id"]
+
+    def test_search_by_username_and_full_name(self):
+        """Тест: поиск по началу username, full_name и слов в них."""
+        alice_id = self.create("alice", "Alice Smith")
+        bob_id = self.create("bob", "Robert Smithson")
+        self.create("carol")
+
+        response = client.get("/api/v1/users/search", params={"q": "smith"})
+        assert response.status_code == 200
+        assert sorted(user["id"] for user in response.json()) == [alice_id, bob_id]
+        assert "hashed_password" not in response.json()[0]
+
+        response = client.get("/api/v1/users/search", params={"q": "ROB"})
+        assert [user["username"] for user in response.json()] == ["bob"]
+
+        response = client.get("/api/v1/users/search", params={"q": "a", "limit": 1})
+        assert len(response.json()) == 1
+
+    def test_search_follows_updates(self):
+        """Тест: результаты поиска меняются после обновления и удаления."""
+        user_id = self.create("dave", "Dave Old")
+        assert len(client.get("/api/v1/users/search?q=old").json()) == 1
+
+        client.put(f"/api/v1/users/{user_id}", json={"full_name": "Dave New"})
+        assert client.get("/api/v1/users/search?q=old").json() == []
+        assert len(client.get("/api/v1/users/search?q=new").json()) == 1
+
+        client.delete(f"/api/v1/users/{user_id}")
+        assert client.get("/api/v1/users/search?q=dave").json() == []
+
+    def test_search_validation(self):
+        """Тест валидации параметров поиска."""
+        assert client.get("/api/v1/users/search").status_code == 422
+        assert client.get("/api/v1/users/search?q=").status_code == 422
+        assert client.get("/api/v1/users/search?q=a&limit=0").status_code == 422
+        assert client.get("/api/v1/users/search?q=a&limit=101").status_code == 422